@@ -1,9 +1,10 @@
 # app/ai/embed.py
 import mimetypes
 import os
+from typing import Optional, Union
 from uuid import uuid4
 
-from app.config import SECRET_KEY
+from app.config import SECRET_KEY, WATERMARK_EXTRACT_BUDGET_S, WATERMARK_FULL_SEARCH, WATERMARK_SCORE_FLOOR
 from app.ai.image_watermark import embed_image_watermark, extract_image_watermark
 
 
@@ -44,17 +45,27 @@ def embed_watermark_ai(file_path: str, user_id: str, metadata: dict):
     return output_path, watermark_id_hex, watermark_code
 
 
-def extract_watermark_ai(file_path: str) -> dict:
-    """Extract and verify a watermark from a file."""
+def extract_watermark_ai(file_path: Union[str, bytes], *, filename: Optional[str] = None) -> dict:
+    """Extract and verify a watermark from a file.
 
-    if not _is_image(file_path):
+    `file_path` may be the file's contents instead; the image check then uses `filename`.
+    """
+
+    name = filename if filename is not None else file_path
+    if not isinstance(name, str) or not _is_image(name):
         return {
             "valid": False,
             "reason": "Phase-1 supports images only",
             "confidence": 0.0,
         }
 
-    extracted = extract_image_watermark(file_path, secret=SECRET_KEY, fast=True)
+    extracted = extract_image_watermark(
+        file_path,
+        secret=SECRET_KEY,
+        fast=not WATERMARK_FULL_SEARCH,
+        score_floor=WATERMARK_SCORE_FLOOR,
+        time_budget_s=WATERMARK_EXTRACT_BUDGET_S,
+    )
     if not extracted.ok:
         return {
             "valid": False,
@@ -1,3 +1,9 @@
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import Optional, Union
+
 import cv2
 import numpy as np
 
@@ -22,8 +28,16 @@ def dhash_bgr_image(bgr: np.ndarray, *, hash_size: int = 8) -> int:
     return int(value)
 
 
-def dhash_path(path: str, *, hash_size: int = 8) -> str:
-    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+def read_image(source: Union[str, bytes], flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """cv2.imread for a path, cv2.imdecode (no copy of the buffer) for in-memory contents."""
+    if isinstance(source, str):
+        return cv2.imread(source, flags)
+    return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+
+
+def dhash_path(path: Union[str, bytes], *, hash_size: int = 8) -> str:
+    """dHash of an image file, or of its contents when `path` is bytes."""
+    bgr = read_image(path, cv2.IMREAD_COLOR)
     if bgr is None:
         raise ValueError("could not read image")
     return f"{dhash_bgr_image(bgr, hash_size=hash_size):016x}"
@@ -39,3 +53,131 @@ def hamming_distance_hex64(a_hex: str, b_hex: str) -> int:
     a = int(a_hex, 16) & 0xFFFFFFFFFFFFFFFF
     b = int(b_hex, 16) & 0xFFFFFFFFFFFFFFFF
     return (a ^ b).bit_count()
+
+
+def sha256_path(path: str, *, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in large chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_BAND_BITS = 16
+_BANDS = 64 // _BAND_BITS
+
+
+def hex64_to_int64(value: str) -> int:
+    """64-bit hex hash -> signed integer, as stored in the BIGINT `*_i64` columns."""
+    v = int(value, 16) & _MASK64
+    return v - (1 << 64) if v >= (1 << 63) else v
+
+
+@lru_cache(maxsize=None)
+def _band_masks(radius: int) -> tuple[int, ...]:
+    """All 16-bit XOR masks with popcount <= radius (probe set for one band)."""
+    masks = [0]
+    for r in range(1, min(radius, _BAND_BITS) + 1):
+        for bits in combinations(range(_BAND_BITS), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return tuple(masks)
+
+
+def hamming_band_probes(value: int | str, radius: int) -> list[list[int]]:
+    """Per-band 16-bit values to look up to find every hash within `radius` of `value`.
+
+    The hash is split into 4 bands of 16 bits. Any hash within distance `r` of
+    `value` differs from it in at most `r // 4` bits on at least one band
+    (pigeonhole), so probing every band with all masks of that weight finds all
+    neighbours; candidates are then confirmed with a full popcount (in SQL).
+    """
+    if isinstance(value, str):
+        value = int(value, 16)
+    value &= _MASK64
+    masks = _band_masks(max(0, radius) // _BANDS)
+    return [[((value >> (i * _BAND_BITS)) & 0xFFFF) ^ m for m in masks] for i in range(_BANDS)]
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _as_uint64(values) -> np.ndarray:
+    """Hash array (signed BIGINT or unsigned) -> uint64 view with the same bits."""
+    arr = np.asarray(values)
+    if arr.dtype == np.uint64:
+        return arr
+    return np.ascontiguousarray(arr, dtype=np.int64).view(np.uint64)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Per-element popcount of a uint64 array, as uint8."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.uint8, copy=False)
+    # numpy < 2.0: byte lookup table.
+    as_bytes = np.ascontiguousarray(values).view(np.uint8).reshape(*values.shape, 8)
+    return _POPCOUNT8[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+@dataclass(frozen=True)
+class PageOverlapScores:
+    matches: np.ndarray  # (N,) query pages within the threshold of some candidate page
+    avg_distance: np.ndarray  # (N,) mean over query pages of the nearest candidate-page distance
+    text_dist: np.ndarray  # (N,) text simhash distance, -1 where either side is unknown
+
+
+def score_page_overlap(
+    query_pages,
+    candidate_pages,
+    offsets,
+    *,
+    page_threshold: int,
+    query_text: Optional[int] = None,
+    candidate_text=None,
+    candidate_text_known=None,
+) -> PageOverlapScores:
+    """Score N candidate documents against the query's per-page dHashes.
+
+    Candidate pages are flattened: candidate `i` owns
+    `candidate_pages[offsets[i]:offsets[i + 1]]` (`offsets` has N + 1 entries). For
+    every query page the nearest page of each candidate is found (page order is
+    ignored, so reordered rewrites still match). Hashes may be signed int64 (as
+    stored in BIGINT columns) or uint64.
+
+    `candidate_text` / `candidate_text_known` are optional per-candidate text simhashes
+    and a mask of which are present; distances are only computed when `query_text`
+    is given.
+    """
+    queries = _as_uint64(query_pages).ravel()
+    pages = _as_uint64(candidate_pages).ravel()
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = offsets.size - 1
+    if n < 0 or (offsets.size and offsets[-1] != pages.size):
+        raise ValueError("offsets must have N + 1 entries ending at len(candidate_pages)")
+
+    # (Q, N) nearest-page distances; candidates without pages stay at 64.
+    nearest = np.full((queries.size, n), 64, dtype=np.uint8)
+    nonempty = np.diff(offsets) > 0
+    starts = offsets[:-1][nonempty]
+    if starts.size:
+        for qi, q in enumerate(queries):
+            nearest[qi, nonempty] = np.minimum.reduceat(popcount64(pages ^ q), starts)
+
+    matches = np.count_nonzero(nearest <= page_threshold, axis=0)
+    if queries.size:
+        avg_distance = nearest.mean(axis=0, dtype=np.float64)
+    else:
+        avg_distance = np.full(n, 64.0)
+
+    text_dist = np.full(n, -1, dtype=np.int64)
+    if query_text is not None and candidate_text is not None:
+        known = np.ones(n, dtype=bool) if candidate_text_known is None else np.asarray(candidate_text_known, dtype=bool)
+        texts = _as_uint64(candidate_text).ravel()
+        q = _as_uint64([query_text])[0]
+        text_dist[known] = popcount64(texts[known] ^ q)
+
+    return PageOverlapScores(matches=matches, avg_distance=avg_distance, text_dist=text_dist)
@@ -1,13 +1,17 @@
 import base64
 import hmac
 import hashlib
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import Tuple
 
 import cv2
 import numpy as np
 from reedsolo import RSCodec, ReedSolomonError
 
+from app.ai.fingerprint import read_image
+
 
 @dataclass(frozen=True)
 class ExtractResult:
@@ -16,6 +20,11 @@ class ExtractResult:
     watermark_code: str | None
     confidence: float
     reason: str | None = None
+    # Search effort: candidate configurations scored and RS decodes attempted, and the
+    # vote-margin score of the decoded candidate (the best score seen on failure).
+    candidates_scored: int = 0
+    decode_attempts: int = 0
+    score: float = 0.0
 
 
 _VERSION = 2
@@ -24,6 +33,23 @@ _TAG_BYTES = 16
 _RSC_NSYM_V1 = 16  # parity bytes (legacy)
 _RSC_NSYM_V2 = 32  # parity bytes (stronger ECC)
 
+# Mid-frequency DCT coefficients carrying each bit (DC is avoided).
+_COEFFS = ((3, 4), (4, 3), (2, 3))
+
+# Orthonormal 8-point DCT-II basis: C @ B @ C.T matches cv2.dct(B) for an 8x8 block.
+_DCT8 = np.array(
+    [[np.sqrt((1.0 if k == 0 else 2.0) / 8.0) * np.cos(np.pi * (2 * n + 1) * k / 16.0) for n in range(8)] for k in range(8)],
+    dtype=np.float64,
+)
+_BLOCK_RANGE = np.arange(8)
+
+
+@lru_cache(maxsize=None)
+def _rs_codec(nsym: int) -> RSCodec:
+    # Building the codec (generator polynomial, tables) costs about as much as encoding
+    # a payload; worker processes embed many files, so keep one per parity size.
+    return RSCodec(nsym)
+
 
 def _seed_from(secret: str, salt: str) -> int:
     digest = hashlib.sha256(_secret_bytes(secret) + b":" + salt.encode("utf-8")).digest()
@@ -90,9 +116,96 @@ def _qim_embed(value: float, bit: int, delta: float) -> float:
 
 def _qim_extract(value: float, delta: float) -> int:
     q = 2.0 * delta
-    # Map to nearest bin and return 0/1 depending on offset.
+    # Distance to the nearest bit-0 lattice point: ~0 for bit 0, ~delta for bit 1
+    # (a bit-1 value sits half-way between two bit-0 points, so either side rounds).
     r = value - np.round(value / q) * q
-    return 1 if r > (delta / 2.0) else 0
+    return 1 if abs(r) > (delta / 2.0) else 0
+
+
+def _qim_embed_array(values: np.ndarray, bits: np.ndarray, delta: float) -> np.ndarray:
+    """Array form of :func:`_qim_embed` (same quantization lattice)."""
+    q = 2.0 * delta
+    return np.round(values / q) * q + np.where(bits.astype(bool), delta, 0.0)
+
+
+def _qim_soft_array(values: np.ndarray, delta: float) -> np.ndarray:
+    """Soft QIM votes in [-1, 1]: -1 on a bit-0 lattice point, +1 on a bit-1 point."""
+    q = 2.0 * delta
+    r = values - np.round(values / q) * q
+    return np.abs(r) * (2.0 / delta) - 1.0
+
+
+def _qim_extract_array(values: np.ndarray, delta: float) -> np.ndarray:
+    """Array form of :func:`_qim_extract`."""
+    return (_qim_soft_array(values, delta) > 0).astype(np.uint8)
+
+
+def _block_pixel_index(block_indices: np.ndarray, blocks_x: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row/column index arrays addressing raster-ordered 8x8 blocks as (N, 8, 8)."""
+    by = (block_indices // blocks_x) * 8
+    bx = (block_indices % blocks_x) * 8
+    rows = (by[:, None] + _BLOCK_RANGE)[:, :, None]
+    cols = (bx[:, None] + _BLOCK_RANGE)[:, None, :]
+    return rows, cols
+
+
+def _block_dct(blocks: np.ndarray) -> np.ndarray:
+    return _DCT8 @ blocks @ _DCT8.T
+
+
+def _block_idct(coeffs: np.ndarray) -> np.ndarray:
+    return _DCT8.T @ coeffs @ _DCT8
+
+
+def _embed_blocks(plane: np.ndarray, block_indices: np.ndarray, blocks_x: int, bit_plan: np.ndarray, delta: float) -> None:
+    """Embed `bit_plan[i]` into block `block_indices[i]` of `plane` (in place).
+
+    Batched equivalent of a per-block cv2.dct -> QIM -> cv2.idct loop: all blocks are
+    gathered into one (N, 8, 8) array, transformed with a single matrix product and
+    scattered back. Block indices must be unique (a permutation slice).
+    """
+    rows, cols = _block_pixel_index(np.asarray(block_indices, dtype=np.int64), blocks_x)
+    dct = _block_dct(plane[rows, cols].astype(np.float64))
+    for uu, vv in _COEFFS:
+        dct[:, uu, vv] = _qim_embed_array(dct[:, uu, vv], bit_plan, delta)
+    plane[rows, cols] = _block_idct(dct)
+
+
+class _BlockCoefficientCache:
+    """Per-request cache of the embedding coefficients for every 8x8 block of a plane.
+
+    Coefficients are computed once per grid phase (plane origin modulo 8), so every
+    region / anchor / offset combination sharing that phase reads from the same array.
+    Trying another delta or repeat hint only re-quantizes cached values.
+    """
+
+    def __init__(self, plane: np.ndarray):
+        self._plane = plane
+        self._by_phase: dict[tuple[int, int], np.ndarray] = {}
+
+    def grid(self, py: int, px: int) -> np.ndarray:
+        """(blocks_y, blocks_x, len(_COEFFS)) coefficients of the blocks starting at (py, px)."""
+        grid = self._by_phase.get((py, px))
+        if grid is None:
+            sub = self._plane[py:, px:]
+            by, bx = sub.shape[0] // 8, sub.shape[1] // 8
+            blocks = sub[: by * 8, : bx * 8].astype(np.float64).reshape(by, 8, bx, 8)
+            # Only the embedding coefficients are needed: c[u, v] = C[u] . B . C[v]
+            grid = np.stack(
+                [np.einsum("i,aibj,j->ab", _DCT8[uu], blocks, _DCT8[vv], optimize=True) for uu, vv in _COEFFS],
+                axis=-1,
+            )
+            self._by_phase[(py, px)] = grid
+        return grid
+
+    def window(self, y0: int, x0: int, blocks_y: int, blocks_x: int) -> np.ndarray:
+        """Coefficients of the blocks_y x blocks_x block window starting at pixel (y0, x0).
+
+        Returned as (blocks_y * blocks_x, len(_COEFFS)) in raster block order.
+        """
+        grid = self.grid(y0 % 8, x0 % 8)
+        gy, gx = y0 // 8, x0 // 8
+        return grid[gy : gy + blocks_y, gx : gx + blocks_x].reshape(-1, len(_COEFFS))
 
 
 def embed_image_watermark(
@@ -130,7 +243,7 @@ def embed_image_watermark(
 
     # Prepare message (payload + RS parity)
     payload = _pack_payload(watermark_id_hex, secret)
-    rsc = RSCodec(_RSC_NSYM_V2)
+    rsc = _rs_codec(_RSC_NSYM_V2)
     encoded = bytes(rsc.encode(payload))
     bits = _bytes_to_bits(encoded)
 
@@ -141,10 +254,6 @@ def embed_image_watermark(
     # Work on 8x8 blocks
     out = y_cropped.copy()
 
-    # Multi-coefficient embedding improves robustness under recompression.
-    # Avoid DC, use a few mid-frequencies.
-    coeffs = [(3, 4), (4, 3), (2, 3)]
-
     def _embed_region(y_plane: np.ndarray, y0: int, x0: int, rh: int, rw: int, *, salt: str, region_repeats: int) -> None:
         region = y_plane[y0 : y0 + rh, x0 : x0 + rw]
         blocks_y = rh // 8
@@ -166,19 +275,8 @@ def embed_image_watermark(
         total_positions = bits.size * local_repeats
         chosen = perm[:total_positions]
 
-        idx = 0
-        for _ in range(local_repeats):
-            for bit in bits:
-                block_index = int(chosen[idx])
-                idx += 1
-                by = (block_index // blocks_x) * 8
-                bx = (block_index % blocks_x) * 8
-                block = region[by : by + 8, bx : bx + 8]
-                dct = cv2.dct(block)
-                for uu, vv in coeffs:
-                    original = float(dct[uu, vv])
-                    dct[uu, vv] = _qim_embed(original, int(bit), strength)
-                region[by : by + 8, bx : bx + 8] = cv2.idct(dct)
+        # Block chosen[r * len(bits) + i] carries bits[i] for repeat r.
+        _embed_blocks(region, chosen, blocks_x, np.tile(bits, local_repeats), strength)
 
     # Crop-resilience strategy (v1): embed the same payload into multiple anchored regions.
     # This improves typical user crops (trimming edges / center crops) without heavy compute.
@@ -237,15 +335,150 @@ def embed_image_watermark(
         cv2.imwrite(output_path, out_img)
 
 
+@dataclass(frozen=True)
+class _Candidate:
+    """One extraction attempt: window, block-grid offset, permutation seed, QIM step, repeats and ECC size."""
+
+    y0: int
+    x0: int
+    height: int
+    width: int
+    dy: int
+    dx: int
+    seed: int
+    delta: float
+    repeats_hint: int
+    nsym: int
+
+
+# Candidates scoring at least this are RS-decoded as soon as they are scored. Aligned
+# windows of marked images score >= 0.5 (even after JPEG q75); unmarked content and
+# off-lattice windows stay below ~0.15.
+_DECODE_NOW_SCORE = 0.5
+
+
+def _chance_margin(n: int) -> float:
+    # E|mean of n standardized votes| when they carry no payload: sqrt(2 / (pi * n)).
+    return float(np.sqrt(2.0 / (np.pi * max(1, n))))
+
+
+def _vote_score(soft: np.ndarray) -> float:
+    """Cheap decodability estimate from (repeats, bits, coeffs) soft votes, ~0 for noise.
+
+    Votes are standardized first: unmarked smooth content reads as a steady run of
+    0 bits, which must not look like a confident payload. The score is how far each
+    bit's votes (all repeats and coefficients together) lean to one side, beyond
+    what chance gives, scaled so a clean payload scores ~1. Off-lattice windows
+    score ~0; with several repeats a wrong seed scores low too, since its repeats
+    disagree.
+    """
+    spread = float(soft.std())
+    if spread < 1e-6:
+        return 0.0
+    per_bit = np.abs((soft - soft.mean()).mean(axis=(0, 2))) / spread
+    chance = _chance_margin(soft.shape[0] * soft.shape[2])
+    return (float(per_bit.mean()) - chance) / (1.0 - chance)
+
+
+# Grid registration: how many ranked block phases to try, the evidence below which a
+# phase is not worth a fast-mode search (unmarked images peak around 0.04), the side
+# of the central window the phase is estimated on, and the block-pattern match below
+# which fast mode ignores a located region (a wrong anchor or phase matches < 0.2, a
+# region that survived a crop and JPEG q85 > 0.35).
+_GRID_PHASES = 3
+_GRID_MIN_EVIDENCE = 0.1
+_GRID_WINDOW = 512
+_REGION_MIN_MATCH = 0.25
+
+
+def _estimate_grid_phases(plane: np.ndarray, deltas, *, top: int = _GRID_PHASES) -> list[tuple[float, int, int]]:
+    """Rank the 64 possible 8x8 block phases of `plane` in one pass: [(evidence, py, px)].
+
+    Every payload block carries the same bit in all of its coefficients, so on the
+    embedding grid the soft QIM votes of different coefficients agree block after
+    block; on any other phase they are unrelated. One correlation per coefficient
+    over a central window gives every block's coefficients at all 64 phases at once;
+    the evidence for a phase is the mean correlation between the votes of different
+    coefficients (best over `deltas`), ~0 when nothing is embedded. (py, px) is the
+    row/column, modulo 8, where grid blocks start.
+    """
+    h, w = plane.shape
+    wy0, wx0 = max(0, (h - _GRID_WINDOW) // 2), max(0, (w - _GRID_WINDOW) // 2)
+    sub = plane[wy0 : wy0 + _GRID_WINDOW, wx0 : wx0 + _GRID_WINDOW]
+    by, bx = (sub.shape[0] - 7) // 8, (sub.shape[1] - 7) // 8
+    if by * bx < 64:
+        return []
+
+    # maps[..., k][y, x] is coefficient k of the 8x8 block whose top-left pixel is (y, x).
+    maps = np.stack(
+        [
+            cv2.filter2D(sub, cv2.CV_32F, np.outer(_DCT8[uu], _DCT8[vv]).astype(np.float32), anchor=(0, 0))
+            for uu, vv in _COEFFS
+        ],
+        axis=-1,
+    )[: by * 8, : bx * 8]
+    # -> (phase y, phase x, coeff, block)
+    coeffs = maps.reshape(by, 8, bx, 8, len(_COEFFS)).transpose(1, 3, 4, 0, 2).reshape(8, 8, len(_COEFFS), -1)
+
+    evidence = np.full((8, 8), -1.0)
+    pairs = np.triu_indices(len(_COEFFS), 1)
+    for delta in deltas:
+        soft = _qim_soft_array(coeffs, float(delta))
+        soft -= soft.mean(axis=-1, keepdims=True)
+        cov = np.einsum("abin,abjn->abij", soft, soft, optimize=True)
+        var = np.sqrt(np.maximum(np.diagonal(cov, axis1=2, axis2=3), 1e-12))
+        corr = cov / (var[..., :, None] * var[..., None, :])
+        evidence = np.maximum(evidence, corr[..., pairs[0], pairs[1]].mean(axis=-1))
+
+    ranked = np.argsort(-evidence, axis=None, kind="stable")[: max(0, top)]
+    return [
+        (float(evidence.flat[i]), (wy0 + int(i) // 8) % 8, (wx0 + int(i) % 8) % 8)
+        for i in ranked
+    ]
+
+
+def _embedding_map(grid: np.ndarray, delta: float) -> np.ndarray:
+    """Per-block agreement of the coefficients' soft votes, (blocks_y, blocks_x): high where a bit was embedded."""
+    soft = _qim_soft_array(grid, delta)
+    soft = (soft - soft.mean(axis=(0, 1))) / (soft.std(axis=(0, 1)) + 1e-9)
+    pairs = np.triu_indices(len(_COEFFS), 1)
+    return (soft[..., pairs[0]] * soft[..., pairs[1]]).mean(axis=-1).astype(np.float32)
+
+
+@lru_cache(maxsize=64)
+def _region_mask(seed: int, blocks: int, bits: int) -> np.ndarray:
+    """(blocks, blocks) 0/1 map of the blocks a region embeds one payload copy into."""
+    mask = np.zeros(blocks * blocks, dtype=np.float32)
+    mask[np.random.default_rng(seed).permutation(blocks * blocks)[:bits]] = 1.0
+    return mask.reshape(blocks, blocks)
+
+
 def extract_image_watermark(
-    image_path: str,
+    image_path: str | bytes,
     secret: str,
     *,
     strength: float = 10.0,
     repeats: int = 8,
     fast: bool = True,
+    score_floor: float | None = None,
+    time_budget_s: float | None = None,
 ) -> ExtractResult:
-    img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    """Blind extraction of a watermark written by `embed_image_watermark`.
+
+    Candidate configurations (anchor window, grid offset, delta, repeat hint, ECC
+    size) are searched in tiers: the current region embeds at the grid origin,
+    then each anchor's region wherever its block pattern matches on the block
+    phases ranked by `_estimate_grid_phases` (fast mode stops here, and skips
+    phases without evidence), then every region size/anchor/ECC size on those
+    phases, then the legacy whole-image scheme.
+    Each candidate first gets a cheap vote-margin score from
+    its soft QIM votes; within a tier candidates are RS-decoded best score first,
+    those scoring below `score_floor` are never decoded, and the search stops at
+    the first valid payload or once `time_budget_s` is spent (the first tier's
+    best candidate is always tried).
+    `image_path` may also be the encoded image itself (bytes).
+    """
+    img = read_image(image_path, cv2.IMREAD_UNCHANGED)
     if img is None:
         return ExtractResult(ok=False, watermark_id_hex=None, watermark_code=None, confidence=0.0, reason="could not read image")
 
@@ -256,170 +489,258 @@ def extract_image_watermark(
     else:
         return ExtractResult(ok=False, watermark_id_hex=None, watermark_code=None, confidence=0.0, reason="unsupported image format")
 
+    started = time.perf_counter()
     ycrcb = cv2.cvtColor(bgr, cv2.COLOR_BGR2YCrCb)
     y_full = ycrcb[:, :, 0].astype(np.float32)
 
     expected_payload_len = 1 + _ID_BYTES + _TAG_BYTES
-    # Try both ECC sizes (v1/v2) unless we're in fast mode.
-    # New embeds use v2; probing v1 adds CPU without helping current uploads.
-    ecc_options = [(2, _RSC_NSYM_V2)] if fast else [(1, _RSC_NSYM_V1), (2, _RSC_NSYM_V2)]
-
-    coeffs = [(3, 4), (4, 3), (2, 3)]
-
-    # Cropping in Preview often shifts the origin by non-multiples of 8.
-    # Full search over 64 offsets is very expensive; default to a fast path.
-    if fast:
-        offsets = [(0, 0)]
-    else:
-        offsets = [(dy, dx) for dy in range(8) for dx in range(8)]
-        offsets.sort(key=lambda t: (t[0] + t[1], t[0], t[1]))
-
-    def _decode_from_plane(y_plane: np.ndarray, *, seed: int, delta: float, repeats_hint: int, nsym: int) -> ExtractResult:
-        best_fail: ExtractResult | None = None
-        h, w = y_plane.shape
-        if h < 32 or w < 32:
-            return ExtractResult(ok=False, watermark_id_hex=None, watermark_code=None, confidence=0.0, reason="image too small")
-
-        for dy, dx in offsets:
-            yy = y_plane[dy:, dx:]
-            hh, ww = yy.shape
-            h8, w8 = (hh // 8) * 8, (ww // 8) * 8
-            if h8 < 64 or w8 < 64:
-                continue
-            y = yy[:h8, :w8]
 
-            blocks_y = h8 // 8
-            blocks_x = w8 // 8
-            num_blocks = blocks_y * blocks_x
-            rsc = RSCodec(nsym)
-            expected_encoded_len = expected_payload_len + nsym
-            expected_bits = expected_encoded_len * 8
+    # Every candidate below reads block coefficients from this cache instead of
+    # re-running the DCT on the same pixels.
+    coeff_cache = _BlockCoefficientCache(y_full)
+
+    # Candidates differing only in delta read the same blocks; tiers list deltas
+    # innermost, so remembering the last gather is enough.
+    last_gather: dict = {}
+
+    def _geometry(c: _Candidate):
+        """(window, blocks, seed, payload bits, repeats) a candidate reads, or None if the window is too small.
+
+        Candidates with the same geometry read the same blocks in the same order
+        (e.g. a repeat hint the window is too small for).
+        """
+        # The window starts dy/dx into the anchor; it keeps its full size while the image allows.
+        y0, x0 = c.y0 + c.dy, c.x0 + c.dx
+        if y0 < 0 or x0 < 0:
+            return None
+        h8 = (min(c.height, y_full.shape[0] - y0) // 8) * 8
+        w8 = (min(c.width, y_full.shape[1] - x0) // 8) * 8
+        if h8 < 64 or w8 < 64:
+            return None
+
+        blocks_y = h8 // 8
+        blocks_x = w8 // 8
+        num_blocks = blocks_y * blocks_x
+        expected_bits = (expected_payload_len + c.nsym) * 8
 
-            # We only need enough blocks for one full payload. Repeats are handled below.
-            if num_blocks < expected_bits:
-                continue
+        # We only need enough blocks for one full payload. Repeats are handled below.
+        if num_blocks < expected_bits:
+            return None
 
-            local_repeats = max(1, int(repeats_hint))
-            total_positions = expected_bits * local_repeats
-            if num_blocks < total_positions:
-                local_repeats = max(1, num_blocks // expected_bits)
-                total_positions = expected_bits * local_repeats
-
-            rng = np.random.default_rng(seed)
-            # Avoid generating a full permutation of *all* blocks for large images.
-            # In fast mode we prefer speed; sampling with replacement is acceptable.
-            if fast and num_blocks > (total_positions * 8):
-                chosen = rng.integers(0, num_blocks, size=total_positions, dtype=np.int64)
-            else:
-                perm = rng.permutation(num_blocks)
-                chosen = perm[:total_positions]
-            votes = np.zeros((expected_bits, 2), dtype=np.int32)
-            idx = 0
-            for _ in range(local_repeats):
-                for i in range(expected_bits):
-                    block_index = int(chosen[idx])
-                    idx += 1
-                    by = (block_index // blocks_x) * 8
-                    bx = (block_index % blocks_x) * 8
-                    block = y[by : by + 8, bx : bx + 8]
-                    dct = cv2.dct(block)
-                    # Majority vote across multiple coefficients
-                    ones = 0
-                    for uu, vv in coeffs:
-                        ones += _qim_extract(float(dct[uu, vv]), delta)
-                    bit = 1 if ones >= (len(coeffs) // 2 + 1) else 0
-                    votes[i, bit] += 1
-
-            decided = (votes[:, 1] > votes[:, 0]).astype(np.uint8)
-            margins = np.abs(votes[:, 1] - votes[:, 0]) / max(1, local_repeats)
-            confidence = float(np.clip(np.mean(margins), 0.0, 1.0))
-
-            data = _bits_to_bytes(decided)
-            try:
-                decoded = bytes(rsc.decode(bytearray(data))[0])
-                watermark_id_hex, watermark_code = _unpack_payload(decoded, secret)
-                return ExtractResult(ok=True, watermark_id_hex=watermark_id_hex, watermark_code=watermark_code, confidence=confidence)
-            except (ReedSolomonError, ValueError):
-                fail = ExtractResult(ok=False, watermark_id_hex=None, watermark_code=None, confidence=confidence, reason="watermark decode failed")
-                if best_fail is None or fail.confidence > best_fail.confidence:
-                    best_fail = fail
-
-        return best_fail or ExtractResult(ok=False, watermark_id_hex=None, watermark_code=None, confidence=0.0, reason="watermark decode failed")
-
-    # Strength sweep to tolerate JPEG/resize variance.
-    if fast:
-        deltas = [14.0, 16.0, float(strength)]
-        repeat_hints = [2, 1]
-    else:
-        deltas = [float(strength), 12.0, 14.0, 16.0, 18.0]
-        repeat_hints = [max(1, repeats), max(1, repeats // 2), 1]
+        local_repeats = max(1, int(c.repeats_hint))
+        if num_blocks < expected_bits * local_repeats:
+            local_repeats = max(1, num_blocks // expected_bits)
+        return y0, x0, blocks_y, blocks_x, c.seed, expected_bits, local_repeats
 
-    deltas = list(dict.fromkeys([float(d) for d in deltas]))
-    repeat_hints = list(dict.fromkeys([int(r) for r in repeat_hints if int(r) >= 1]))
+    def _gather(geometry):
+        """Coefficients of the chosen blocks as (repeats, bits, coeffs)."""
+        if geometry in last_gather:
+            return last_gather[geometry]
+        last_gather.clear()
 
-    best_fail: ExtractResult | None = None
+        y0, x0, blocks_y, blocks_x, seed, expected_bits, local_repeats = geometry
+        num_blocks = blocks_y * blocks_x
+        total_positions = expected_bits * local_repeats
 
-    # Decode strategy:
-    # - Fast mode: try region-based first (current embed) and skip legacy sweep.
-    # - Slow mode: try legacy first for backwards compatibility.
+        rng = np.random.default_rng(seed)
+        # Avoid generating a full permutation of *all* blocks for large images.
+        # In fast mode we prefer speed; sampling with replacement is acceptable.
+        if fast and num_blocks > (total_positions * 8):
+            chosen = rng.integers(0, num_blocks, size=total_positions, dtype=np.int64)
+        else:
+            perm = rng.permutation(num_blocks)
+            chosen = perm[:total_positions]
+
+        window = coeff_cache.window(y0, x0, blocks_y, blocks_x)
+        last_gather[geometry] = window[chosen].reshape(local_repeats, expected_bits, len(_COEFFS))
+        return last_gather[geometry]
+
+    def _votes(geometry, delta: float):
+        """(decided bits, repeat-vote confidence, scheduling score)."""
+        values = _gather(geometry)
+        local_repeats = values.shape[0]
+        soft = _qim_soft_array(values, delta)
+
+        # Majority vote across multiple coefficients, then across repeats.
+        ones = (soft > 0).sum(axis=2)
+        bits = (ones >= (len(_COEFFS) // 2 + 1)).astype(np.int32)
+        votes_one = bits.sum(axis=0)
+        votes_zero = local_repeats - votes_one
+
+        decided = (votes_one > votes_zero).astype(np.uint8)
+        margins = np.abs(votes_one - votes_zero) / max(1, local_repeats)
+        confidence = float(np.clip(np.mean(margins), 0.0, 1.0))
+
+        score = _vote_score(soft)
+        return decided, confidence, score
+
+    def _decode(c: _Candidate, decided: np.ndarray, confidence: float) -> ExtractResult | None:
+        try:
+            decoded = bytes(_rs_codec(c.nsym).decode(bytearray(_bits_to_bytes(decided)))[0])
+            watermark_id_hex, watermark_code = _unpack_payload(decoded, secret)
+        except (ReedSolomonError, ValueError):
+            return None
+        return ExtractResult(ok=True, watermark_id_hex=watermark_id_hex, watermark_code=watermark_code, confidence=confidence)
 
-    # 1) Region-based scheme (current uploads)
     h, w = y_full.shape
     h8, w8 = (h // 8) * 8, (w // 8) * 8
     min_dim = min(h8, w8)
-    if fast:
-        region_sizes = [256]
-        if min_dim < 256:
-            region_sizes = [max(64, (min_dim // 8) * 8)]
-    else:
+    anchor_pos = {
+        "tl": lambda rs: (0, 0),
+        "tr": lambda rs: (0, max(0, w8 - rs)),
+        "bl": lambda rs: (max(0, h8 - rs), 0),
+        "br": lambda rs: (max(0, h8 - rs), max(0, w8 - rs)),
+        "c": lambda rs: (max(0, (h8 - rs) // 2), max(0, (w8 - rs) // 2)),
+    }
+    all_anchors = ("tl", "tr", "bl", "br", "c")
+
+    def _region_candidates(region_sizes, anchors, nsyms, deltas, *, phases=None):
+        """Region windows at each anchor: at the grid origin, or moved onto each of `phases`."""
+        for rs in region_sizes:
+            for phase in phases or [None]:
+                for name in anchors:
+                    y0, x0 = anchor_pos[name](rs)
+                    seed = _seed_from(secret, f"region:{name}")
+                    # Offsets in 0..7 put the anchor's window on the phase.
+                    dy, dx = (0, 0) if phase is None else ((phase[0] - y0) % 8, (phase[1] - x0) % 8)
+                    for nsym in nsyms:
+                        # Region embedding may have 1-2 repeats.
+                        for rh in (2, 1):
+                            for delta in deltas:
+                                yield _Candidate(y0, x0, rs, rs, dy, dx, seed, delta, rh, nsym)
+
+    def _located_candidates(rs, phases, deltas, *, min_match):
+        """Region windows wherever each anchor's block pattern matches on `phases`, best match first.
+
+        Crops move regions away from the anchors computed on the cropped image; the
+        embedded blocks of a region form a pattern fixed by its seed, so matching that
+        pattern against the per-block embedding map of a phase finds the region
+        anywhere in the image in one pass.
+        """
+        blocks = rs // 8
+        bits = (expected_payload_len + _RSC_NSYM_V2) * 8
+        if blocks * blocks < bits:
+            return
+        seeds = [_seed_from(secret, f"region:{name}") for name in all_anchors]
+        hits = []
+        for py, px in phases:
+            grid = coeff_cache.grid(py, px)
+            if grid.shape[0] < blocks or grid.shape[1] < blocks:
+                continue
+            for delta in deltas:
+                emap = _embedding_map(grid, delta)
+                for seed in seeds:
+                    match = cv2.matchTemplate(emap, _region_mask(seed, blocks, bits), cv2.TM_CCOEFF_NORMED)
+                    _, peak, _, (gx, gy) = cv2.minMaxLoc(match)
+                    hits.append((peak, py + 8 * gy, px + 8 * gx, seed, delta))
+        # Stable sort: ties keep phase order.
+        hits.sort(key=lambda t: -t[0])
+        for peak, y0, x0, seed, delta in hits:
+            if peak < min_match:
+                break
+            for rh in (2, 1):
+                for d in dict.fromkeys([delta, *deltas]):
+                    yield _Candidate(y0, x0, rs, rs, 0, 0, seed, d, rh, _RSC_NSYM_V2)
+
+    # Strength sweep to tolerate JPEG/resize variance; uploads embed at 14.
+    fast_deltas = list(dict.fromkeys([14.0, 16.0, float(strength)]))
+
+    def _tiers():
+        # 1) Region-based scheme (current uploads) at the grid origin, v2 ECC.
+        region_size = 256 if min_dim >= 256 else max(64, (min_dim // 8) * 8)
+        yield _region_candidates([region_size], ("c", "tl"), (_RSC_NSYM_V2,), fast_deltas)
+
+        # 2) Crops (Preview often shifts the origin by non-multiples of 8) move the
+        # block grid and the regions: estimate the grid phase once, then locate each
+        # anchor's region on the likeliest phases. Fast mode skips phases without real
+        # evidence (unmarked images) and regions that barely match.
+        ranked = _estimate_grid_phases(y_full, fast_deltas)
+        likely = [(py, px) for evidence, py, px in ranked if evidence >= _GRID_MIN_EVIDENCE or not fast]
+        if likely:
+            yield _located_candidates(region_size, likely, fast_deltas, min_match=_REGION_MIN_MATCH if fast else -1.0)
+        if fast:
+            return
+
+        # 3) Every region size / anchor / ECC size on the ranked phases (and the origin).
+        deltas = list(dict.fromkeys([*fast_deltas, 12.0, 18.0]))
+        ecc = (_RSC_NSYM_V2, _RSC_NSYM_V1)
+        phases = list(dict.fromkeys([*((py, px) for _, py, px in ranked), (0, 0)]))
         # Try a few region sizes so slight crops don't break decoding.
         region_sizes = [256, 320, 384, 512]
         if min_dim < 256:
             region_sizes.append(max(64, (min_dim // 8) * 8))
-        region_sizes = [rs for rs in region_sizes if rs >= 64 and rs <= min_dim]
-        region_sizes = list(dict.fromkeys(region_sizes))
-
-    anchors = [
-        ("c", lambda rs: (max(0, (h8 - rs) // 2), max(0, (w8 - rs) // 2))),
-        ("tl", lambda rs: (0, 0)),
-    ] if fast else [
-        ("tl", lambda rs: (0, 0)),
-        ("tr", lambda rs: (0, max(0, w8 - rs))),
-        ("bl", lambda rs: (max(0, h8 - rs), 0)),
-        ("br", lambda rs: (max(0, h8 - rs), max(0, w8 - rs))),
-        ("c", lambda rs: (max(0, (h8 - rs) // 2), max(0, (w8 - rs) // 2))),
-    ]
+        region_sizes = list(dict.fromkeys(rs for rs in region_sizes if 64 <= rs <= min_dim))
+        yield _region_candidates(region_sizes, all_anchors, ecc, deltas, phases=phases)
 
-    for delta in deltas:
-        for rs in region_sizes:
-            for name, pos_fn in anchors:
-                y0, x0 = pos_fn(rs)
-                region = y_full[y0 : y0 + rs, x0 : x0 + rs]
-                seed = _seed_from(secret, f"region:{name}")
-                for _ver, nsym in ecc_options:
-                    # Try a couple repeat hints; region embedding may have 1-2 repeats.
-                    for rh in (2, 1):
-                        res = _decode_from_plane(region, seed=seed, delta=delta, repeats_hint=rh, nsym=nsym)
-                        if res.ok:
-                            return res
-                        best_fail = res if best_fail is None or res.confidence > best_fail.confidence else best_fail
-
-    # 2) Legacy whole-image scheme (older uploads)
-    if not fast:
+        # 4) Legacy whole-image scheme (older uploads).
         legacy_seed = _legacy_seed(secret)
-        for delta in deltas:
-            for rh in repeat_hints:
-                for _ver, nsym in ecc_options:
-                    res = _decode_from_plane(y_full, seed=legacy_seed, delta=delta, repeats_hint=rh, nsym=nsym)
-                    if res.ok:
-                        return res
-                    best_fail = res if best_fail is None or res.confidence > best_fail.confidence else best_fail
-
-    confidence = float((best_fail.confidence if best_fail is not None else 0.0) or 0.0)
+        repeat_hints = list(dict.fromkeys(r for r in (max(1, repeats), max(1, repeats // 2), 1)))
+        yield (
+            _Candidate(0, 0, h, w, dy, dx, legacy_seed, delta, rh, nsym)
+            for dy, dx in phases
+            for rh in repeat_hints
+            for nsym in ecc
+            for delta in deltas
+        )
+
+    deadline = None if time_budget_s is None else started + max(0.0, float(time_budget_s))
+    seen: set = set()
+    best_confidence = 0.0
+    best_score = -1.0
+    scored = attempts = 0
+
+    def _out_of_time(first_tier: bool) -> bool:
+        # The first tier is always scored and its best candidate always decoded.
+        return deadline is not None and (attempts > 0 or not first_tier) and time.perf_counter() > deadline
+
+    def _attempt(score: float, c: _Candidate, decided: np.ndarray, confidence: float) -> ExtractResult | None:
+        nonlocal attempts
+        attempts += 1
+        res = _decode(c, decided, confidence)
+        if res is None:
+            return None
+        return replace(res, candidates_scored=scored, decode_attempts=attempts, score=score)
+
+    for tier_index, tier in enumerate(_tiers()):
+        first_tier = tier_index == 0
+        ranked = []
+        for c in tier:
+            if _out_of_time(first_tier):
+                break
+            geometry = _geometry(c)
+            if geometry is None or (geometry, c.delta) in seen:
+                continue
+            seen.add((geometry, c.delta))
+            scored += 1
+            decided, confidence, score = _votes(geometry, c.delta)
+            best_confidence = max(best_confidence, confidence)
+            best_score = max(best_score, score)
+            if score >= _DECODE_NOW_SCORE:
+                # Clearly a payload on the lattice: no need to score the rest of the tier first.
+                res = _attempt(score, c, decided, confidence)
+                if res is not None:
+                    return res
+            elif score_floor is None or score >= score_floor:
+                ranked.append((score, c, decided, confidence))
+
+        # Stable sort: equal scores keep the tier's nested order.
+        ranked.sort(key=lambda t: -t[0])
+        for score, c, decided, confidence in ranked:
+            if _out_of_time(first_tier):
+                break
+            res = _attempt(score, c, decided, confidence)
+            if res is not None:
+                return res
+        if _out_of_time(first_tier):
+            break
+
     return ExtractResult(
         ok=False,
         watermark_id_hex=None,
         watermark_code=None,
-        confidence=confidence,
+        confidence=best_confidence,
         reason="watermark not detected (file may be original or heavily altered)",
+        candidates_scored=scored,
+        decode_attempts=attempts,
+        score=max(0.0, best_score),
     )
@@ -4,12 +4,44 @@ from PIL import Image
 import io
 import pytesseract
 
+from app.ai.ocr_cache import ocr_cache
 
-def _render_page_to_pil(page, dpi: int = 150) -> Image.Image:
-    mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    return img
+_tesseract_config: Optional[str] = None
+
+
+def _pixmap_to_pil(pix) -> Image.Image:
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+
+
+def _ocr_config() -> str:
+    """Tesseract version and options; part of the OCR cache key."""
+    global _tesseract_config
+    if _tesseract_config is None:
+        try:
+            version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            return "tesseract unknown"
+        _tesseract_config = f"tesseract {version}; lang=default; config="
+    return _tesseract_config
+
+
+def ocr_pixmap(pix, dpi: Optional[int] = None) -> str:
+    """Tesseract OCR of an already rendered page (alpha-free PyMuPDF pixmap).
+
+    Results are kept in the persistent OCR cache (app/ai/ocr_cache.py), keyed by the
+    page pixels, `dpi` and the Tesseract config.
+    """
+    key = None
+    if ocr_cache is not None:
+        key = ocr_cache.key(pix.samples, width=pix.width, height=pix.height, channels=pix.n, dpi=dpi, config=_ocr_config())
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            return cached
+    text = pytesseract.image_to_string(_pixmap_to_pil(pix))
+    if key is not None:
+        ocr_cache.put(key, text)
+    return text
 
 
 def extract_text_from_pdf(path: str, dpi: int = 150, max_pages: Optional[int] = 10) -> List[str]:
@@ -24,9 +56,8 @@ def extract_text_from_pdf(path: str, dpi: int = 150, max_pages: Optional[int] =
         for i in range(total):
             page = doc.load_page(i)
             try:
-                img = _render_page_to_pil(page, dpi=dpi)
-                txt = pytesseract.image_to_string(img)
-                texts.append(txt)
+                mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+                texts.append(ocr_pixmap(page.get_pixmap(matrix=mat, alpha=False), dpi=dpi))
             except Exception:
                 texts.append("")
     finally:
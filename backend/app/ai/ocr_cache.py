@@ -0,0 +1,197 @@
+# app/ai/ocr_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.config import OCR_CACHE_MAX_BYTES, OCR_CACHE_PATH
+
+
+class OcrCache:
+    """Tesseract results on disk, keyed by a digest of the rendered page pixels.
+
+    One SQLite file (WAL mode) is shared by the API process and every pool worker,
+    so a page OCR'd during an upload is a hit when the same file is verified later.
+    Each process opens its own connection on first use.
+
+    A hit is a read only: its `last_used` touch and the hit/miss counters are kept
+    in memory and written in one transaction every `_FLUSH_EVERY` lookups or
+    `_FLUSH_INTERVAL_S` seconds (and with every store), so lookups from the pool
+    workers do not contend for the write lock. Entries record their size; the least
+    recently used are evicted every `_EVICT_EVERY` stores once the total exceeds
+    `max_bytes`. Counters live in the same file, so `stats()` covers all processes
+    (other processes' latest unflushed counts excepted).
+
+    Cache failures (locked or unwritable file) never fail OCR: `get` returns None
+    and `put` does nothing.
+    """
+
+    _EVICT_EVERY = 64
+    _FLUSH_EVERY = 64
+    _FLUSH_INTERVAL_S = 30.0
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max(1, int(max_bytes))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stores = 0
+        self._reset_pending()
+
+    def _reset_pending(self) -> None:
+        self._touched: dict[str, float] = {}
+        self._pending = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lookups = 0
+        self._flushed_at = time.monotonic()
+
+    @staticmethod
+    def key(samples: bytes, *, width: int, height: int, channels: int, dpi: Optional[int], config: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"{width}x{height}x{channels}@{dpi or 0}|{config}|".encode("utf-8"))
+        h.update(samples)
+        return h.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Pool workers are forked; a connection (and pending counts) inherited from the
+        # parent must not be used.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_text (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_text)")}
+            if "size" not in columns:
+                # Files written before entries carried their size.
+                conn.execute("ALTER TABLE ocr_text ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE ocr_text SET size = length(CAST(key AS BLOB)) + length(CAST(text AS BLOB))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_text_last_used ON ocr_text (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS ocr_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            if self._pid != os.getpid():
+                self._reset_pending()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        """Write pending touches and counters; callers hold `_lock` and an open transaction."""
+        if self._touched:
+            conn.executemany(
+                "UPDATE ocr_text SET last_used=? WHERE key=?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+        conn.executemany(
+            "INSERT INTO ocr_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, n) for name, n in self._pending.items() if n],
+        )
+        self._touched.clear()
+        self._pending = dict.fromkeys(self._pending, 0)
+        self._lookups = 0
+        self._flushed_at = time.monotonic()
+
+    def _write(self, conn: sqlite3.Connection, fn=None) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if fn is not None:
+                fn(conn)
+            self._flush(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT text FROM ocr_text WHERE key=?", (key,)).fetchone()
+                if row is not None:
+                    self._touched[key] = time.time()
+                self._pending["hits" if row is not None else "misses"] += 1
+                self._lookups += 1
+                if self._lookups >= self._FLUSH_EVERY or time.monotonic() - self._flushed_at >= self._FLUSH_INTERVAL_S:
+                    try:
+                        self._write(conn)
+                    except sqlite3.Error:
+                        # Busy: keep the pending writes for the next flush.
+                        pass
+        except (sqlite3.Error, OSError):
+            return None
+        return row[0] if row is not None else None
+
+    def put(self, key: str, text: str) -> None:
+        def store(conn: sqlite3.Connection) -> None:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_text (key, text, created_at, last_used, size) VALUES (?, ?, ?, ?, ?)",
+                (key, text, now, now, len(key) + len(text.encode("utf-8"))),
+            )
+            self._pending["stores"] += 1
+            self._stores += 1
+            if self._stores % self._EVICT_EVERY == 0:
+                self._evict(conn)
+
+        try:
+            with self._lock:
+                self._write(self._connect(), store)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT coalesce(sum(size), 0) FROM ocr_text").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cur = conn.execute(
+            """
+            DELETE FROM ocr_text WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, sum(size) OVER (ORDER BY last_used DESC, key) AS running FROM ocr_text
+                ) WHERE running > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+        if cur.rowcount > 0:
+            self._pending["evictions"] += cur.rowcount
+
+    def stats(self) -> dict:
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    self._write(conn)
+                except sqlite3.Error:
+                    pass
+                counts = dict(conn.execute("SELECT name, value FROM ocr_counters").fetchall())
+                entries, size = conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM ocr_text").fetchone()
+        except (sqlite3.Error, OSError):
+            return {"path": self.path, "error": True}
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "stores": counts.get("stores", 0),
+            "evictions": counts.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+
+
+# OCR_CACHE_PATH="" disables the cache.
+ocr_cache = OcrCache(OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES) if OCR_CACHE_PATH else None
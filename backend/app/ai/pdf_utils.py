@@ -1,13 +1,18 @@
+import asyncio
 import hashlib
+import io
 import json
-from typing import List, Tuple, Optional
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Tuple, Optional
 
 import fitz
 import numpy as np
 from PIL import Image
 
 from app.ai.fingerprint import dhash_bgr_image
-from app.config import SECRET_KEY
+from app.ai.ocr import ocr_pixmap
+from app.ai.text_fingerprint import simhash64_hex
+from app.config import PDF_PAGE_CONCURRENCY, PDF_PAGE_TIMEOUT_S, SECRET_KEY
 
 
 def canonicalize_pdf_text_xmp(pdf_path: str) -> bytes:
@@ -56,23 +61,405 @@ def _pixmap_to_bgr_array(pix) -> np.ndarray:
     return bgr
 
 
-def rasterize_pages_and_hashes(pdf_path: str, dpi: int = 150, max_pages: Optional[int] = None) -> List[str]:
-    """Render pages deterministically and compute dHash hex strings per page."""
+@dataclass(frozen=True)
+class PdfAnalysis:
+    page_count: int
+    page_hashes: List[str]  # dHash hex of the first `hash_pages` pages
+    embedded_text: List[str]  # PyMuPDF text layer of the first `text_pages` pages
+    ocr_text: List[str]  # Tesseract text of the OCR'd pages (see `analyze_pdf`)
+    text_simhash: Optional[str]  # 64-bit simhash hex of the page text, None if too little text
+    thumbnail_png: Optional[bytes] = None  # first page, if requested (`thumbnail_max_side`)
+
+
+def _embedded_text(doc, text_pages: int) -> List[str]:
+    embedded = []
+    for i in range(min(len(doc), text_pages)):
+        try:
+            embedded.append(doc.load_page(i).get_text("text") or "")
+        except Exception:
+            continue
+    return embedded
+
+
+def _plan_pages(page_count: int, embedded: List[str], hash_pages: Optional[int], text_pages: int, ocr_pages: int):
+    """(pages to hash, pages to OCR, whether OCR replaces the missing text layer)."""
+    n_hash = page_count if hash_pages is None else min(page_count, hash_pages)
+    ocr_fallback = text_pages > 0 and not "\n".join(embedded).strip()
+    n_ocr = min(page_count, max(ocr_pages, text_pages if ocr_fallback else 0))
+    return n_hash, n_ocr, ocr_fallback
+
+
+def _assemble(page_count, embedded, hashes, ocr_text, ocr_fallback, text_pages, thumbnail_png=None) -> PdfAnalysis:
+    text = "\n".join(embedded)
+    if ocr_fallback:
+        text = "\n".join([t for t in ocr_text[:text_pages] if t])
+    return PdfAnalysis(
+        page_count=page_count,
+        page_hashes=hashes,
+        embedded_text=embedded,
+        ocr_text=ocr_text,
+        text_simhash=simhash64_hex(text),
+        thumbnail_png=thumbnail_png,
+    )
+
+
+def _thumbnail_image(pix, max_side: int) -> Image.Image:
+    img = Image.fromarray(np.ascontiguousarray(_pixmap_to_bgr_array(pix)[:, :, ::-1]))
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    return img
+
+
+def _thumbnail_png(pix, max_side: int) -> bytes:
+    buf = io.BytesIO()
+    _thumbnail_image(pix, max_side).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _ocr_or_empty(pix, dpi: int) -> str:
+    try:
+        return ocr_pixmap(pix, dpi=dpi)
+    except Exception:
+        return ""
+
+
+def analyze_pdf(
+    pdf_path: str,
+    *,
+    dpi: int = 150,
+    hash_pages: Optional[int] = 10,
+    text_pages: int = 3,
+    ocr_pages: int = 0,
+    thumbnail_max_side: Optional[int] = None,
+) -> PdfAnalysis:
+    """Open a PDF once and render each needed page once.
+
+    dHash, OCR input and the thumbnail all come from the same pixmap. The text simhash
+    uses the embedded text of the first `text_pages` pages; when there is none
+    (scanned PDFs), those pages are OCR'd instead. `ocr_pages` forces OCR of the first
+    N pages regardless. `hash_pages=None` hashes every page. With `thumbnail_max_side`,
+    the first page is also returned as a PNG thumbnail no larger than that.
+    """
     doc = fitz.open(pdf_path)
-    hashes = []
-    total = len(doc)
-    if max_pages is not None:
-        total = min(total, max_pages)
+    try:
+        page_count = len(doc)
+        embedded = _embedded_text(doc, text_pages)
+        n_hash, n_ocr, ocr_fallback = _plan_pages(page_count, embedded, hash_pages, text_pages, ocr_pages)
+        n_render = max(n_hash, n_ocr, 1 if thumbnail_max_side and page_count else 0)
 
-    mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
-    for i in range(total):
-        page = doc[i]
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        bgr = _pixmap_to_bgr_array(pix)
-        h = dhash_bgr_image(bgr)
-        hashes.append(f"{h:016x}")
+        mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+        hashes = []
+        ocr_text = []
+        thumbnail_png = None
+        for i in range(n_render):
+            pix = doc.load_page(i).get_pixmap(matrix=mat, alpha=False)
+            if i < n_hash:
+                hashes.append(f"{dhash_bgr_image(_pixmap_to_bgr_array(pix)):016x}")
+            if i < n_ocr:
+                ocr_text.append(_ocr_or_empty(pix, dpi))
+            if i == 0 and thumbnail_max_side:
+                thumbnail_png = _thumbnail_png(pix, thumbnail_max_side)
+    finally:
+        doc.close()
+
+    return _assemble(page_count, embedded, hashes, ocr_text, ocr_fallback, text_pages, thumbnail_png)
+
+
+# Page text acquisition: a page with at least PAGE_TEXT_MIN_CHARS characters of
+# embedded text is "text", or "mixed" when raster images also cover at least
+# PAGE_IMAGE_MIXED_FRACTION of it; anything else is "scanned". Image regions
+# smaller than PAGE_IMAGE_MIN_SIDE points are ignored.
+PAGE_TEXT_MIN_CHARS = 16
+PAGE_IMAGE_MIXED_FRACTION = 0.15
+PAGE_IMAGE_MIN_SIDE = 36.0
+
+
+@dataclass(frozen=True)
+class PageLayout:
+    index: int
+    kind: str  # "text" | "scanned" | "mixed"
+    embedded_text: str
+    image_rects: Tuple[Tuple[float, float, float, float], ...]  # page coordinates (points)
+
+
+@dataclass(frozen=True)
+class PageText:
+    index: int
+    kind: str  # see PageLayout
+    source: str  # "embedded" | "ocr" | "embedded+ocr"
+    text: str
+
+
+def _image_rects(page) -> List[Tuple[float, float, float, float]]:
+    rects = []
+    for info in page.get_image_info():
+        r = fitz.Rect(info["bbox"]) & page.rect
+        if r.width >= PAGE_IMAGE_MIN_SIDE and r.height >= PAGE_IMAGE_MIN_SIDE:
+            rects.append((r.x0, r.y0, r.x1, r.y1))
+    return rects
 
-    return hashes
+
+def _classify_page(page, index: int) -> PageLayout:
+    try:
+        text = page.get_text("text") or ""
+    except Exception:
+        text = ""
+    try:
+        rects = _image_rects(page)
+    except Exception:
+        rects = []
+    if len("".join(text.split())) < PAGE_TEXT_MIN_CHARS:
+        return PageLayout(index, "scanned", text, tuple(rects))
+    page_area = abs(page.rect) or 1.0
+    # Overlapping images are counted twice; good enough for a threshold.
+    coverage = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects) / page_area
+    return PageLayout(index, "mixed" if coverage >= PAGE_IMAGE_MIXED_FRACTION else "text", text, tuple(rects))
+
+
+def classify_pdf_pages(pdf_path: str, max_pages: int) -> Tuple[int, List[PageLayout]]:
+    """(page count, layout of the first `max_pages` pages); reads the text layer only."""
+    doc = fitz.open(pdf_path)
+    try:
+        return len(doc), [_classify_page(doc.load_page(i), i) for i in range(min(len(doc), max_pages))]
+    finally:
+        doc.close()
+
+
+def ocr_pdf_regions(pdf_path: str, index: int, rects, *, dpi: int = 150) -> str:
+    """OCR text of the given regions of one page, top to bottom ("" for regions that fail)."""
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc.load_page(index)
+        mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+        texts = []
+        for rect in sorted(rects, key=lambda r: (r[1], r[0])):
+            pix = page.get_pixmap(matrix=mat, clip=fitz.Rect(rect), alpha=False)
+            texts.append(_ocr_or_empty(pix, dpi).strip())
+    finally:
+        doc.close()
+    return "\n".join(t for t in texts if t)
+
+
+def analyze_pdf_page(
+    pdf_path: str,
+    index: int,
+    *,
+    dpi: int = 150,
+    dhash: bool = True,
+    ocr: bool = False,
+    thumbnail_max_side: Optional[int] = None,
+) -> Tuple[Optional[str], Optional[str], Optional[bytes]]:
+    """Render one page and return (dHash hex, OCR text, PNG thumbnail), each None if not requested.
+
+    Opens its own document handle: PyMuPDF documents must not be shared between
+    threads, and this runs as an independent task in page-parallel mode.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+        pix = doc.load_page(index).get_pixmap(matrix=mat, alpha=False)
+    finally:
+        doc.close()
+    page_hash = f"{dhash_bgr_image(_pixmap_to_bgr_array(pix)):016x}" if dhash else None
+    thumbnail_png = _thumbnail_png(pix, thumbnail_max_side) if thumbnail_max_side else None
+    return page_hash, (_ocr_or_empty(pix, dpi) if ocr else None), thumbnail_png
+
+
+class PdfPageText:
+    """Per-request page store for one PDF: each page is rendered and OCR'd at most once.
+
+    Work is done lazily, one `run(analyze_pdf_page, ...)` task per page (default run:
+    `app.workers.worker_pool.run`), with at most `concurrency` pages in flight. The
+    dHash, text fingerprint and OCR comparisons of a verify request all read from the
+    same instance, so a page OCR'd for the simhash is not OCR'd again for the semantic
+    check. A page that fails or exceeds `page_timeout` seconds is recorded as having
+    no dHash and empty OCR text, and is not retried.
+
+    `page_text` is the embedded-text-first view used for text comparisons: text
+    pages are never rendered, scanned pages are OCR'd, and on mixed pages only the
+    image regions are OCR'd.
+    """
+
+    def __init__(
+        self,
+        pdf_path: str,
+        *,
+        dpi: int = 150,
+        concurrency: int = PDF_PAGE_CONCURRENCY,
+        page_timeout: Optional[float] = PDF_PAGE_TIMEOUT_S,
+        run: Optional[Callable[..., Awaitable]] = None,
+    ):
+        if run is None:
+            from app.workers import worker_pool
+
+            run = worker_pool.run
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.page_timeout = page_timeout
+        self._run = run
+        self._slots = asyncio.Semaphore(max(1, int(concurrency)))
+        self._page_count: Optional[int] = None
+        self._layouts: List[PageLayout] = []
+        self._region_ocr: Dict[int, str] = {}
+        self._hashes: Dict[int, Optional[str]] = {}
+        self._ocr: Dict[int, str] = {}
+        self._thumbnails: Dict[int, Optional[bytes]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.renders = 0
+        self.ocr_runs = 0
+
+    async def layouts(self, max_pages: int) -> List[PageLayout]:
+        """Classification of the first `max_pages` pages (text layer only, no rendering)."""
+        if self._page_count is None or (len(self._layouts) < max_pages and len(self._layouts) < self._page_count):
+            self._page_count, self._layouts = await self._run(classify_pdf_pages, self.pdf_path, max_pages)
+        return self._layouts[:max_pages]
+
+    async def text_layer(self, text_pages: int = 3) -> Tuple[int, List[str]]:
+        """(page count, embedded text of the first `text_pages` pages)."""
+        layouts = await self.layouts(text_pages)
+        return self._page_count, [layout.embedded_text for layout in layouts]
+
+    async def _page(self, i: int, dhash: bool, ocr: bool, thumbnail_max_side: Optional[int] = None) -> None:
+        async with self._locks.setdefault(i, asyncio.Lock()):
+            dhash = dhash and i not in self._hashes
+            ocr = ocr and i not in self._ocr
+            thumbnail_max_side = thumbnail_max_side if i not in self._thumbnails else None
+            if not (dhash or ocr or thumbnail_max_side):
+                return
+            async with self._slots:
+                self.renders += 1
+                self.ocr_runs += int(ocr)
+                try:
+                    page_hash, text, thumbnail_png = await asyncio.wait_for(
+                        self._run(
+                            analyze_pdf_page,
+                            self.pdf_path,
+                            i,
+                            dpi=self.dpi,
+                            dhash=dhash,
+                            ocr=ocr,
+                            thumbnail_max_side=thumbnail_max_side,
+                        ),
+                        timeout=self.page_timeout,
+                    )
+                except Exception:
+                    page_hash, text, thumbnail_png = None, "", None
+            if dhash:
+                self._hashes[i] = page_hash
+            if ocr:
+                self._ocr[i] = text or ""
+            if thumbnail_max_side:
+                self._thumbnails[i] = thumbnail_png
+
+    async def _ensure(self, n_hash: int, n_ocr: int, thumbnail_max_side: Optional[int] = None) -> None:
+        n_render = max(n_hash, n_ocr, 1 if thumbnail_max_side and self._page_count else 0)
+        await asyncio.gather(
+            *(self._page(i, i < n_hash, i < n_ocr, thumbnail_max_side if i == 0 else None) for i in range(n_render))
+        )
+
+    async def _mixed_page(self, layout: PageLayout) -> None:
+        async with self._locks.setdefault(layout.index, asyncio.Lock()):
+            if layout.index in self._region_ocr:
+                return
+            async with self._slots:
+                self.ocr_runs += 1
+                try:
+                    text = await asyncio.wait_for(
+                        self._run(ocr_pdf_regions, self.pdf_path, layout.index, layout.image_rects, dpi=self.dpi),
+                        timeout=self.page_timeout,
+                    )
+                except Exception:
+                    text = ""
+            self._region_ocr[layout.index] = text or ""
+
+    async def page_text(self, max_pages: int = 5) -> List[PageText]:
+        """Text of the first `max_pages` pages, OCR'ing only what has no text layer."""
+        layouts = await self.layouts(max_pages)
+        await asyncio.gather(
+            *(self._page(layout.index, False, True) for layout in layouts if layout.kind == "scanned"),
+            *(self._mixed_page(layout) for layout in layouts if layout.kind == "mixed"),
+        )
+        out = []
+        for layout in layouts:
+            i, kind = layout.index, layout.kind
+            if kind == "scanned":
+                out.append(PageText(i, kind, "ocr", self._ocr[i]))
+            elif kind == "mixed":
+                text = "\n".join(t for t in (layout.embedded_text.strip(), self._region_ocr[i].strip()) if t)
+                out.append(PageText(i, kind, "embedded+ocr", text))
+            else:
+                out.append(PageText(i, kind, "embedded", layout.embedded_text))
+        return out
+
+    async def analysis(
+        self,
+        *,
+        hash_pages: Optional[int] = 10,
+        text_pages: int = 3,
+        ocr_pages: int = 0,
+        thumbnail_max_side: Optional[int] = None,
+    ) -> PdfAnalysis:
+        """Same result as `analyze_pdf` with these arguments, reusing pages already done.
+
+        The thumbnail is rendered with the first page's dHash/OCR task when both are
+        needed; a page already done for another purpose is rendered again for it.
+        """
+        page_count, embedded = await self.text_layer(text_pages)
+        n_hash, n_ocr, ocr_fallback = _plan_pages(page_count, embedded, hash_pages, text_pages, ocr_pages)
+        await self._ensure(n_hash, n_ocr, thumbnail_max_side)
+        hashes = [self._hashes[i] for i in range(n_hash) if self._hashes[i] is not None]
+        ocr_text = [self._ocr[i] for i in range(n_ocr)]
+        thumbnail_png = self._thumbnails.get(0) if thumbnail_max_side else None
+        return _assemble(page_count, embedded, hashes, ocr_text, ocr_fallback, text_pages, thumbnail_png)
+
+    def stats(self) -> dict:
+        return {"pages_rendered": self.renders, "pages_ocrd": self.ocr_runs}
+
+
+async def analyze_pdf_parallel(
+    pdf_path: str,
+    *,
+    dpi: int = 150,
+    hash_pages: Optional[int] = 10,
+    text_pages: int = 3,
+    ocr_pages: int = 0,
+    thumbnail_max_side: Optional[int] = None,
+    concurrency: int = PDF_PAGE_CONCURRENCY,
+    page_timeout: Optional[float] = PDF_PAGE_TIMEOUT_S,
+    run: Optional[Callable[..., Awaitable]] = None,
+) -> PdfAnalysis:
+    """Page-parallel `analyze_pdf`: each page is a separate `run(analyze_pdf_page, ...)` task.
+
+    `run` submits a picklable call to a pool (default: `app.workers.worker_pool.run`).
+    At most `concurrency` pages of this document are in flight; `concurrency <= 1`
+    falls back to one sequential `analyze_pdf` call. Results keep page order. A page
+    that fails or exceeds `page_timeout` seconds contributes no dHash and empty OCR
+    text (a timed-out task may still finish in the background, holding its worker).
+    """
+    if run is None:
+        from app.workers import worker_pool
+
+        run = worker_pool.run
+
+    if concurrency <= 1:
+        return await run(
+            analyze_pdf,
+            pdf_path,
+            dpi=dpi,
+            hash_pages=hash_pages,
+            text_pages=text_pages,
+            ocr_pages=ocr_pages,
+            thumbnail_max_side=thumbnail_max_side,
+        )
+
+    pages = PdfPageText(pdf_path, dpi=dpi, concurrency=concurrency, page_timeout=page_timeout, run=run)
+    return await pages.analysis(
+        hash_pages=hash_pages, text_pages=text_pages, ocr_pages=ocr_pages, thumbnail_max_side=thumbnail_max_side
+    )
+
+
+def rasterize_pages_and_hashes(pdf_path: str, dpi: int = 150, max_pages: Optional[int] = None) -> List[str]:
+    """Render pages deterministically and compute dHash hex strings per page."""
+    return analyze_pdf(pdf_path, dpi=dpi, hash_pages=max_pages, text_pages=0).page_hashes
 
 
 def render_page_thumbnail(pdf_path: str, page_number: int, dpi: int = 150, max_side: int = 512) -> Image.Image:
@@ -80,9 +467,16 @@ def render_page_thumbnail(pdf_path: str, page_number: int, dpi: int = 150, max_s
     page = doc[page_number]
     mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
     pix = page.get_pixmap(matrix=mat, alpha=False)
-    bgr = _pixmap_to_bgr_array(pix)
-    # Convert BGR -> RGB for PIL
-    rgb = bgr[:, :, ::-1]
-    img = Image.fromarray(rgb)
-    img.thumbnail((max_side, max_side), Image.LANCZOS)
-    return img
+    return _thumbnail_image(pix, max_side)
+
+
+def pdf_text_simhash(pdf_path: str, max_pages: int = 3) -> Optional[str]:
+    """Best-effort text fingerprint for a PDF file.
+
+    Prefer embedded text via PyMuPDF; fallback to OCR for scanned PDFs.
+    Returns 16-hex string (64-bit simhash) or None if insufficient text.
+    """
+    try:
+        return analyze_pdf(pdf_path, hash_pages=0, text_pages=max_pages).text_simhash
+    except Exception:
+        return None
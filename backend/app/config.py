@@ -10,3 +10,68 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 SECRET_KEY = os.getenv("SECRET_KEY") or "supersecret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+# CPU-bound watermark/hashing/OCR work is offloaded to a process pool (app/workers.py).
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE") or (os.cpu_count() or 2))
+# Calls allowed to queue inside the pool beyond the running ones; the rest wait in the event loop.
+WORKER_QUEUE_DEPTH = int(os.getenv("WORKER_QUEUE_DEPTH") or 16)
+
+# Uploads larger than this are rejected with 413 while streaming (app/ingest.py).
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES") or 50 * 1024 * 1024)
+# /verify keeps image uploads up to this size in memory and decodes them from the
+# buffer; larger ones and all PDFs go to a temp file (0 always writes to disk). Each
+# worker-pool call gets its own copy of the bytes, which costs more per MB than
+# re-opening a freshly written file, so keep this small.
+VERIFY_MEMORY_MAX_BYTES = int(os.getenv("VERIFY_MEMORY_MAX_BYTES") or 2 * 1024 * 1024)
+
+# /verify result cache (app/verify_cache.py): "memory" (per process), "postgres" (shared), or "off".
+VERIFY_CACHE_BACKEND = os.getenv("VERIFY_CACHE_BACKEND") or "memory"
+VERIFY_CACHE_MAX_ENTRIES = int(os.getenv("VERIFY_CACHE_MAX_ENTRIES") or 1024)
+VERIFY_CACHE_TTL_S = float(os.getenv("VERIFY_CACHE_TTL_S") or 3600)
+# Perceptual/no-match results can change with any new upload; keep them briefly.
+VERIFY_CACHE_VOLATILE_TTL_S = float(os.getenv("VERIFY_CACHE_VOLATILE_TTL_S") or 60)
+
+# Page-parallel PDF rasterization/OCR (app/ai/pdf_utils.analyze_pdf_parallel): pages of one
+# document in flight at once (<= 1 renders sequentially in one task) and per-page timeout.
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY") or WORKER_POOL_SIZE)
+PDF_PAGE_TIMEOUT_S = float(os.getenv("PDF_PAGE_TIMEOUT_S") or 30)
+
+# Tesseract results keyed by page raster digest (app/ai/ocr_cache.py); "" disables.
+# Bounded by the total size of the cached text (keys included), least recently used first.
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "/tmp/snappy_ocr_cache/ocr.sqlite3")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES") or 256 * 1024 * 1024)
+
+# Background jobs (app/jobs.py): concurrent jobs per API process, idle poll interval,
+# how long a claimed job stays leased without progress before another worker may
+# take it over, and attempts before a job is marked failed.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS") or 2)
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S") or 1.0)
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S") or 300)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS") or 3)
+
+# /upload/batch pipeline (app/routes/upload_batch.py): files buffered between stages,
+# rows per INSERT transaction, and files accepted per request.
+BATCH_PIPELINE_DEPTH = int(os.getenv("BATCH_PIPELINE_DEPTH") or 2 * WORKER_POOL_SIZE)
+BATCH_INSERT_SIZE = int(os.getenv("BATCH_INSERT_SIZE") or 64)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES") or 5000)
+
+# Image watermark extraction (app/ai/image_watermark.extract_image_watermark): candidates
+# whose vote-margin score is below the floor are never RS-decoded (unmarked images score
+# ~0-0.15, decodable ones >= 0.5); the full search (every region size and ECC size on
+# the ranked grid phases, and the legacy scheme) stops after the time budget.
+WATERMARK_SCORE_FLOOR = float(os.getenv("WATERMARK_SCORE_FLOOR") or 0.2)
+WATERMARK_FULL_SEARCH = (os.getenv("WATERMARK_FULL_SEARCH") or "0").lower() in ("1", "true", "yes")
+WATERMARK_EXTRACT_BUDGET_S = float(os.getenv("WATERMARK_EXTRACT_BUDGET_S") or 1.0)
+
+# PAdES validation (app/pades.py): results memoized per process by file SHA-256 and trust
+# roots (0 entries disables), how long a memoized result is served, and the time allowed
+# for each embedded signature's validation (counted from when it starts).
+PADES_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("PADES_RESULT_CACHE_MAX_ENTRIES") or 512)
+PADES_RESULT_CACHE_TTL_S = float(os.getenv("PADES_RESULT_CACHE_TTL_S") or 3600)
+PADES_SIGNATURE_TIMEOUT_S = float(os.getenv("PADES_SIGNATURE_TIMEOUT_S") or 10)
+# Validations run on a dedicated pool of this many threads per process. A signature that
+# waits longer than PADES_QUEUE_TIMEOUT_S for a thread, and any beyond the first
+# PADES_MAX_SIGNATURES of a document, are reported as skipped.
+PADES_VALIDATION_THREADS = int(os.getenv("PADES_VALIDATION_THREADS") or 4)
+PADES_QUEUE_TIMEOUT_S = float(os.getenv("PADES_QUEUE_TIMEOUT_S") or 10)
+PADES_MAX_SIGNATURES = int(os.getenv("PADES_MAX_SIGNATURES") or 16)
@@ -1,6 +1,7 @@
 # app/database.py
 import asyncpg
 import asyncio
+from contextlib import asynccontextmanager
 
 class Database:
     def __init__(self):
@@ -24,4 +25,11 @@ class Database:
         async with self.pool.acquire() as conn:
             return await conn.execute(query, *args)
 
+    @asynccontextmanager
+    async def transaction(self):
+        """Connection with an open transaction; commits on exit, rolls back on error."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
 db = Database()
@@ -70,6 +70,76 @@ async def ensure_schema() -> None:
     await db.execute('ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS signer_name TEXT;')
     await db.execute('ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS per_page_hashes JSONB;')
     await db.execute('ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS algo_version INT;')
+    # SHA-256 of the file we handed back (watermarked image / signed PDF), for the
+    # exact-hash fast path in /verify. For PDFs original_file_hash already holds it.
+    await db.execute('ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS issued_file_hash TEXT;')
+    await db.execute(
+        """
+        UPDATE watermarked_files
+        SET issued_file_hash = original_file_hash
+        WHERE issued_file_hash IS NULL
+          AND (mime_type = 'application/pdf' OR lower(original_filename) LIKE '%.pdf');
+        """
+    )
+
+    # BIGINT copies of the 64-bit fingerprints (two's complement of the hex value)
+    # plus 16-bit band columns, so Hamming searches can run in SQL: candidates come
+    # from B-tree lookups on any band (`band_i = ANY(...)`), ranking uses bit_count(a # b).
+    for col in ("perceptual_hash", "pdf_text_simhash"):
+        await db.execute(f'ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS {col}_i64 BIGINT;')
+        await db.execute(
+            f"""
+            UPDATE watermarked_files
+            SET {col}_i64 = ('x' || lpad({col}, 16, '0'))::bit(64)::bigint
+            WHERE {col}_i64 IS NULL AND {col} ~ '^[0-9a-fA-F]{{1,16}}$';
+            """
+        )
+        for band in range(4):
+            await db.execute(
+                f"""
+                ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS {col}_b{band} INT
+                GENERATED ALWAYS AS ((({col}_i64 >> {16 * band}) & 65535)::int) STORED;
+                """
+            )
+            await db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_watermarked_files_{col}_b{band} ON watermarked_files({col}_b{band});"
+            )
+
+    # Per-page dHashes of uploaded PDFs, one row per page (BIGINT, same encoding as
+    # the *_i64 columns). Replaces the per_page_hashes JSONB blob for matching; the
+    # legacy column is kept for compatibility but no longer written.
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS watermarked_file_pages (
+            file_id UUID NOT NULL REFERENCES watermarked_files(id) ON DELETE CASCADE,
+            page_no INT NOT NULL,
+            dhash BIGINT NOT NULL,
+            PRIMARY KEY (file_id, page_no)
+        );
+        """
+    )
+
+    # Move legacy per_page_hashes (array of hex strings, or {"dhash": hex} objects)
+    # into the page table. Files that already have page rows are skipped.
+    await db.execute(
+        """
+        INSERT INTO watermarked_file_pages (file_id, page_no, dhash)
+        SELECT wf.id, e.ord - 1, ('x' || lpad(e.hex, 16, '0'))::bit(64)::bigint
+        FROM watermarked_files wf
+        CROSS JOIN LATERAL (
+            SELECT a.ord,
+                   CASE jsonb_typeof(a.elem)
+                       WHEN 'string' THEN a.elem #>> '{}'
+                       WHEN 'object' THEN a.elem ->> 'dhash'
+                   END AS hex
+            FROM jsonb_array_elements(wf.per_page_hashes) WITH ORDINALITY AS a(elem, ord)
+        ) e
+        WHERE jsonb_typeof(wf.per_page_hashes) = 'array'
+          AND e.hex ~ '^[0-9a-fA-F]{1,16}$'
+          AND NOT EXISTS (SELECT 1 FROM watermarked_file_pages p WHERE p.file_id = wf.id)
+        ON CONFLICT DO NOTHING;
+        """
+    )
 
     # Backfill from legacy columns if present.
     # Older schema used file_hash; copy to original_file_hash if needed.
@@ -198,6 +268,63 @@ async def ensure_schema() -> None:
         """
     )
 
+    # Fingerprinting of new uploads runs as a background job (app/jobs.py); rows are
+    # 'processing' until it finishes, then 'ready' (or 'failed').
+    await db.execute(
+        "ALTER TABLE watermarked_files ADD COLUMN IF NOT EXISTS processing_status TEXT NOT NULL DEFAULT 'ready';"
+    )
+
+    # Background job queue. Workers claim rows with FOR UPDATE SKIP LOCKED; a claimed
+    # job keeps a lease (lease_expires_at) and is picked up again if it runs out.
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            kind TEXT NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            stage TEXT,
+            result JSONB,
+            error TEXT,
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 3,
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            file_id UUID REFERENCES watermarked_files(id) ON DELETE CASCADE,
+            run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+            lease_expires_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(created_at) WHERE status IN ('queued', 'running');"
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_file_id ON jobs(file_id);")
+
+    # Shared /verify result cache (VERIFY_CACHE_BACKEND=postgres). UNLOGGED: losing it
+    # on a crash only costs recomputation.
+    await db.execute(
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS verify_cache (
+            key TEXT PRIMARY KEY,
+            entry JSONB NOT NULL,
+            volatile BOOLEAN NOT NULL DEFAULT false,
+            expires_at TIMESTAMPTZ NOT NULL,
+            last_used_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_verify_cache_last_used_at ON verify_cache(last_used_at);"
+    )
+    # Bumped on every upload; volatile cache entries from an older generation are
+    # stale in every process (see VerifyCache).
+    await db.execute("CREATE SEQUENCE IF NOT EXISTS verify_cache_generation;")
+
     await db.execute(
         "CREATE INDEX IF NOT EXISTS idx_watermarked_files_user_id ON watermarked_files(user_id);"
     )
@@ -207,6 +334,12 @@ async def ensure_schema() -> None:
     await db.execute(
         "CREATE INDEX IF NOT EXISTS idx_watermarked_files_perceptual_hash ON watermarked_files(perceptual_hash);"
     )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_watermarked_files_original_file_hash ON watermarked_files(original_file_hash);"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_watermarked_files_issued_file_hash ON watermarked_files(issued_file_hash);"
+    )
 
     # Unique indexes are safer than constraints for incremental upgrades.
     await db.execute(
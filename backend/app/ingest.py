@@ -0,0 +1,161 @@
+# app/ingest.py
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import MAX_UPLOAD_BYTES
+
+_CHUNK_SIZE = 1024 * 1024
+# PDF allows junk before the header; readers look for it within the first 1 KiB.
+_SNIFF_BYTES = 1024
+
+_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"PK\x03\x04", "application/zip"),
+)
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    """MIME type from the first bytes of a file, or None if unrecognised.
+
+    Fixed offset-0 signatures are checked first; the "%PDF-" search is only a
+    fallback, since image metadata (e.g. a PNG tEXt chunk) may contain that string.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    if b"%PDF-" in head[:_SNIFF_BYTES]:
+        return "application/pdf"
+    return None
+
+
+@dataclass(frozen=True)
+class IngestedFile:
+    path: Optional[str]  # None when the file was kept in memory (see `data`)
+    sha256: str
+    size: int
+    mime_type: Optional[str]  # sniffed from magic bytes, not the client's Content-Type
+    data: Optional[bytes] = None
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.mime_type == "application/pdf"
+
+    @property
+    def source(self) -> Union[str, bytes]:
+        """The contents when held in memory, else the path; what the decoders accept."""
+        return self.data if self.data is not None else self.path
+
+
+def _stream_to_disk(
+    src: BinaryIO, dst_path: str, max_bytes: int, memory_bytes: int = 0
+) -> Optional[tuple[str, int, bytes, Optional[bytes]]]:
+    """Copy `src` to `dst_path` in large chunks, hashing as it goes.
+
+    With `memory_bytes` > 0 the chunks of an image (sniffed from the first chunk) are
+    held in memory instead, and `dst_path` is only created (with the held part
+    written first) once the total exceeds it. Anything else goes to disk: PDFs are
+    read by several worker-pool tasks, and each would get its own copy of the bytes.
+    Returns (sha256 hex, size, head bytes, contents or None if written to disk), or
+    None as soon as `max_bytes` is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    held: list[bytes] = []
+    out = open(dst_path, "wb") if memory_bytes <= 0 else None
+    try:
+        while True:
+            chunk = src.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                return None
+            if len(head) < _SNIFF_BYTES:
+                head += chunk[: _SNIFF_BYTES - len(head)]
+            digest.update(chunk)
+            if out is None:
+                if size <= memory_bytes and (held or (sniff_mime(head) or "").startswith("image/")):
+                    held.append(chunk)
+                    continue
+                out = open(dst_path, "wb")
+                out.writelines(held)
+                held = []
+            out.write(chunk)
+        if out is None and not held:
+            # Empty upload: nothing was sniffed, so it goes to disk like any non-image.
+            out = open(dst_path, "wb")
+    finally:
+        if out is not None:
+            out.close()
+    return digest.hexdigest(), size, head, (b"".join(held) if out is None else None)
+
+
+def ingest_stream(src: BinaryIO, dst_path: str, *, max_bytes: int = MAX_UPLOAD_BYTES) -> Optional[IngestedFile]:
+    """Blocking `ingest_upload` for any readable stream (e.g. a zip member).
+
+    Returns None (and removes the partial file) when `src` exceeds `max_bytes`.
+    """
+    try:
+        result = _stream_to_disk(src, dst_path, max_bytes)
+    except Exception:
+        _remove_quietly(dst_path)
+        raise
+    if result is None:
+        _remove_quietly(dst_path)
+        return None
+    sha256, size, head, _ = result
+    return IngestedFile(path=dst_path, sha256=sha256, size=size, mime_type=sniff_mime(head))
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (limit {max_bytes} bytes)")
+
+
+async def ingest_upload(
+    file: UploadFile, dst_path: str, *, max_bytes: int = MAX_UPLOAD_BYTES, memory_bytes: int = 0
+) -> IngestedFile:
+    """Write an upload to `dst_path` in a single pass.
+
+    SHA-256, byte count and the sniffed MIME type are computed while writing, so later
+    steps never re-read the file for them. Raises 413 (and removes the partial file)
+    once the upload exceeds `max_bytes`. Images of at most `memory_bytes` are not
+    written at all: they come back with `data` set and `path` None.
+    """
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise _too_large(max_bytes)
+
+    try:
+        result = await run_in_threadpool(_stream_to_disk, file.file, dst_path, max_bytes, memory_bytes)
+    except Exception:
+        _remove_quietly(dst_path)
+        raise
+    if result is None:
+        _remove_quietly(dst_path)
+        raise _too_large(max_bytes)
+
+    sha256, size, head, data = result
+    if data is not None:
+        return IngestedFile(path=None, sha256=sha256, size=size, mime_type=sniff_mime(head), data=data)
+    return IngestedFile(path=dst_path, sha256=sha256, size=size, mime_type=sniff_mime(head))
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except Exception:
+        pass
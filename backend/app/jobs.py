@@ -0,0 +1,240 @@
+# app/jobs.py
+import asyncio
+import json
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+
+from app.config import JOB_MAX_ATTEMPTS
+from app.database import db
+
+# kind -> async handler(job: JobContext) -> JSON-able result
+_HANDLERS: dict[str, Callable[["JobContext"], Awaitable]] = {}
+
+
+def job_handler(kind: str):
+    """Register the coroutine that runs jobs of `kind`."""
+
+    def register(fn):
+        _HANDLERS[kind] = fn
+        return fn
+
+    return register
+
+
+async def enqueue_job(
+    kind: str,
+    payload: dict,
+    *,
+    user_id: Optional[str] = None,
+    file_id: Optional[str] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    conn=None,
+) -> str:
+    """Insert a queued job and return its id.
+
+    Pass `conn` to enqueue inside the caller's transaction; the caller should then
+    `job_runner.notify()` after committing.
+    """
+    query = """
+        INSERT INTO jobs (kind, payload, user_id, file_id, max_attempts)
+        VALUES ($1, $2::jsonb, $3, $4, $5)
+        RETURNING id
+    """
+    args = (kind, json.dumps(payload), user_id, file_id, max(1, int(max_attempts)))
+    row = await (conn.fetchrow(query, *args) if conn is not None else db.fetch_one(query, *args))
+    if conn is None:
+        job_runner.notify()
+    return str(row["id"])
+
+
+async def enqueue_jobs(kind: str, items: list, *, conn, max_attempts: int = JOB_MAX_ATTEMPTS) -> list[str]:
+    """Bulk `enqueue_job` in the caller's transaction (one executemany).
+
+    `items` are (payload, user_id, file_id) tuples; returns the job ids in order.
+    Call `job_runner.notify()` after committing.
+    """
+    ids = [str(uuid4()) for _ in items]
+    await conn.executemany(
+        """
+        INSERT INTO jobs (id, kind, payload, user_id, file_id, max_attempts)
+        VALUES ($1, $2, $3::jsonb, $4, $5, $6)
+        """,
+        [
+            (job_id, kind, json.dumps(payload), user_id, file_id, max(1, int(max_attempts)))
+            for job_id, (payload, user_id, file_id) in zip(ids, items)
+        ],
+    )
+    return ids
+
+
+class JobContext:
+    """What a handler gets: the job's payload, attempt number and a progress reporter."""
+
+    def __init__(self, record, lease_s: float):
+        self.id = str(record["id"])
+        self.kind = record["kind"]
+        payload = record["payload"]
+        self.payload = json.loads(payload) if isinstance(payload, str) else (payload or {})
+        self.attempt = int(record["attempts"])
+        self.max_attempts = int(record["max_attempts"])
+        self._lease_s = lease_s
+
+    @property
+    def final_attempt(self) -> bool:
+        return self.attempt >= self.max_attempts
+
+    async def progress(self, fraction: float, stage: Optional[str] = None) -> None:
+        """Record progress (0..1) and the current stage; also renews the lease."""
+        await db.execute(
+            """
+            UPDATE jobs SET progress=$2, stage=$3, updated_at=now(),
+                lease_expires_at = now() + make_interval(secs => $4)
+            WHERE id=$1
+            """,
+            self.id,
+            float(min(1.0, max(0.0, fraction))),
+            stage,
+            float(self._lease_s),
+        )
+
+
+class JobRunner:
+    """Runs queued `jobs` rows inside the API process.
+
+    The queue lives in Postgres, so jobs survive restarts and any number of processes
+    or instances can run them: each loop claims one row with
+    `SELECT ... FOR UPDATE SKIP LOCKED`, which hands every job to exactly one worker.
+    A claimed job holds a lease; if its worker dies, the job is claimed again once
+    the lease expires. Failed jobs are retried with a linear backoff until
+    `max_attempts`, then marked `failed`.
+
+    Loops sleep `poll_interval` seconds when the queue is empty; `notify()` wakes
+    them early for jobs enqueued by this process.
+    """
+
+    def __init__(self):
+        self._tasks: list[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.concurrency = 0
+        self.poll_interval = 1.0
+        self.lease_s = 300.0
+        self._counts = {"claimed": 0, "done": 0, "retried": 0, "failed": 0}
+
+    def start(self, concurrency: int, *, poll_interval: float, lease_s: float) -> None:
+        self.concurrency = max(0, int(concurrency))
+        self.poll_interval = float(poll_interval)
+        self.lease_s = float(lease_s)
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self):
+        return await db.fetch_one(
+            """
+            UPDATE jobs
+            SET status='running', attempts = attempts + 1, error = NULL,
+                started_at = now(), updated_at = now(),
+                lease_expires_at = now() + make_interval(secs => $1)
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND run_after <= now())
+                   OR (status = 'running' AND lease_expires_at < now())
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+            """,
+            self.lease_s,
+        )
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                record = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[jobs] claim failed: {e}")
+                record = None
+            if record is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._counts["claimed"] += 1
+            await self._run_one(JobContext(record, self.lease_s))
+
+    async def _run_one(self, job: JobContext) -> None:
+        handler = _HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise RuntimeError(f"no handler for job kind {job.kind!r}")
+            if job.attempt > job.max_attempts:
+                raise RuntimeError("lease expired on the last attempt")
+            result = await handler(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without charging the attempt.
+            await db.execute(
+                "UPDATE jobs SET status='queued', attempts = attempts - 1, lease_expires_at = NULL, updated_at = now() WHERE id=$1",
+                job.id,
+            )
+            raise
+        except Exception as e:
+            if job.attempt < job.max_attempts and handler is not None:
+                self._counts["retried"] += 1
+                await db.execute(
+                    """
+                    UPDATE jobs SET status='queued', error=$2, lease_expires_at = NULL, updated_at = now(),
+                        run_after = now() + make_interval(secs => $3)
+                    WHERE id=$1
+                    """,
+                    job.id,
+                    str(e) or type(e).__name__,
+                    5.0 * job.attempt,
+                )
+            else:
+                self._counts["failed"] += 1
+                await db.execute(
+                    "UPDATE jobs SET status='failed', error=$2, finished_at = now(), updated_at = now() WHERE id=$1",
+                    job.id,
+                    str(e) or type(e).__name__,
+                )
+            return
+
+        self._counts["done"] += 1
+        await db.execute(
+            """
+            UPDATE jobs SET status='done', progress=1, stage=NULL, result=$2::jsonb,
+                finished_at = now(), updated_at = now()
+            WHERE id=$1
+            """,
+            job.id,
+            json.dumps(result) if result is not None else None,
+        )
+
+    async def stats(self) -> dict:
+        try:
+            rows = await db.fetch_all("SELECT status, count(*) AS n FROM jobs GROUP BY status")
+            by_status = {row["status"]: int(row["n"]) for row in rows}
+        except Exception:
+            by_status = None
+        return {
+            "workers": len(self._tasks),
+            "by_status": by_status,
+            **self._counts,
+        }
+
+
+job_runner = JobRunner()
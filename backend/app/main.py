@@ -1,12 +1,30 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import DATABASE_URL
+from app.config import (
+    DATABASE_URL,
+    JOB_LEASE_S,
+    JOB_POLL_INTERVAL_S,
+    JOB_WORKERS,
+    VERIFY_CACHE_BACKEND,
+    VERIFY_CACHE_MAX_ENTRIES,
+    VERIFY_CACHE_TTL_S,
+    VERIFY_CACHE_VOLATILE_TTL_S,
+    WORKER_POOL_SIZE,
+    WORKER_QUEUE_DEPTH,
+)
 from app.database import db
 from app.db_schema import ensure_schema
 from app.auth.routes import router as auth_router
 from app.routes.upload import router as upload_router
+from app.routes.upload_batch import router as upload_batch_router
 from app.routes.verify import router as verify_router
+from app.routes.verify_batch import router as verify_batch_router
 from app.routes.files import router as files_router
+from app.routes.metrics import router as metrics_router
+from app.routes.jobs import router as jobs_router
+from app.jobs import job_runner
+from app.workers import worker_pool
+from app.verify_cache import build_cache_backend, verify_cache
 from fastapi.staticfiles import StaticFiles
 import asyncio
 import logging
@@ -50,9 +68,18 @@ async def startup():
     if last_exc is not None:
         raise last_exc
     await ensure_schema()
+    worker_pool.start(WORKER_POOL_SIZE, WORKER_QUEUE_DEPTH)
+    verify_cache.configure(
+        build_cache_backend(VERIFY_CACHE_BACKEND, VERIFY_CACHE_MAX_ENTRIES),
+        ttl=VERIFY_CACHE_TTL_S,
+        volatile_ttl=VERIFY_CACHE_VOLATILE_TTL_S,
+    )
+    job_runner.start(JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL_S, lease_s=JOB_LEASE_S)
 
 @app.on_event("shutdown")
 async def shutdown():
+    await job_runner.stop()
+    worker_pool.shutdown()
     await db.disconnect()
 
 app.include_router(auth_router, prefix="/auth")
@@ -62,6 +89,10 @@ def ping():
     return {"message": "pong"}
 
 app.include_router(upload_router)
+app.include_router(upload_batch_router)
 app.include_router(verify_router)
+app.include_router(verify_batch_router)
 app.include_router(files_router)
+app.include_router(metrics_router)
+app.include_router(jobs_router)
 app.mount("/files", StaticFiles(directory="/tmp/snappy_uploads"), name="files")
\ No newline at end of file
@@ -1,12 +1,29 @@
+import copy
 import hashlib
 import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from io import BytesIO
+from typing import Any, Optional
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import pkcs12
 
+from app.config import (
+    PADES_MAX_SIGNATURES,
+    PADES_QUEUE_TIMEOUT_S,
+    PADES_RESULT_CACHE_MAX_ENTRIES,
+    PADES_RESULT_CACHE_TTL_S,
+    PADES_SIGNATURE_TIMEOUT_S,
+    PADES_VALIDATION_THREADS,
+)
+from app.pdf_structure import map_pdf, probe_pdf_structure
+
 try:
     from pyhanko.sign import signers
     from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
@@ -29,20 +46,203 @@ def _thumbprint_from_cert(cert) -> str:
     return hashlib.sha256(der).hexdigest()
 
 
+@dataclass(frozen=True)
+class SigningIdentity:
+    """One loaded PKCS#12: the pyHanko signer and its certificate's SHA-256 thumbprint."""
+
+    path: str
+    signer: Any
+    thumbprint: str
+
+    def validation_context(self) -> Optional["ValidationContext"]:
+        """A ValidationContext trusting this certificate.
+
+        Built per call (tens of microseconds): a context fixes its validation time
+        when constructed, so a long-lived one would judge expiry against a stale clock.
+        """
+        if ValidationContext is None:
+            return None
+        return ValidationContext(trust_roots=[self.signer.signing_cert], allow_fetching=False)
+
+
+class SigningMaterialRegistry:
+    """PKCS#12 keystores loaded once per process, keyed by path and passphrase.
+
+    Parsing a keystore (and decrypting its key, ~0.2 s for the demo certificate)
+    used to happen on every signature and every /verify. An entry is reused while
+    the file's mtime and size are unchanged, so a keystore replaced on disk is
+    picked up on the next call. Each signing identity (e.g. a per-user
+    certificate) is loaded once; a keystore that fails to load keeps failing fast
+    until the file changes.
+    """
+
+    def __init__(self):
+        # (realpath, passphrase) -> ((mtime_ns, size), SigningIdentity or the load error)
+        self._entries: dict[tuple[str, Optional[str]], tuple[tuple[int, int], Any]] = {}
+        self._counts = {"hits": 0, "loads": 0, "reloads": 0, "errors": 0}
+
+    def identity(self, p12_path: str, p12_pass: Optional[str]) -> SigningIdentity:
+        """The loaded identity for a keystore; raises if it cannot be loaded."""
+        if signers is None:
+            raise RuntimeError("pyhanko is not available")
+        path = os.path.realpath(p12_path)
+        st = os.stat(path)
+        version = (st.st_mtime_ns, st.st_size)
+        key = (path, p12_pass)
+
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == version:
+            self._counts["hits"] += 1
+            entry = cached[1]
+        else:
+            self._counts["reloads" if cached is not None else "loads"] += 1
+            try:
+                entry = self._load(path, p12_pass)
+            except Exception as e:
+                self._counts["errors"] += 1
+                entry = e
+            self._entries[key] = (version, entry)
+        if isinstance(entry, Exception):
+            raise entry
+        return entry
+
+    @staticmethod
+    def _load(path: str, p12_pass: Optional[str]) -> SigningIdentity:
+        with open(path, "rb") as f:
+            data = f.read()
+        signer = signers.SimpleSigner.load_pkcs12_data(
+            data,
+            other_certs=[],
+            passphrase=p12_pass.encode("utf-8") if p12_pass else None,
+        )
+        signing_cert = getattr(signer, "signing_cert", None)
+        if signing_cert is None:
+            raise ValueError("PKCS12 does not contain a certificate")
+        # asn1crypto's dump() is the DER encoding, as in _thumbprint_from_cert.
+        return SigningIdentity(path, signer, hashlib.sha256(signing_cert.dump()).hexdigest())
+
+    def validation_context(self) -> Optional["ValidationContext"]:
+        """The ValidationContext /verify uses: trusts the default signing certificate.
+
+        If the backend is configured with a signing PKCS#12 (demo cert), treat it as
+        a trust root. This avoids noisy self-signed path-building errors in logs.
+        """
+        if ValidationContext is None:
+            return None
+
+        p12_path, p12_pass = _resolve_default_p12_config()
+        if signers is not None and p12_path:
+            try:
+                vc = self.identity(p12_path, p12_pass).validation_context()
+                if vc is not None:
+                    return vc
+            except Exception:
+                pass
+
+        # Default: no trust roots. We'll still validate cryptographic integrity.
+        try:
+            return ValidationContext(allow_fetching=False)
+        except Exception:
+            return None
+
+    def trust_fingerprint(self) -> str:
+        """Identifies the trust roots `validation_context()` uses (cache key material)."""
+        p12_path, p12_pass = _resolve_default_p12_config()
+        if signers is not None and p12_path:
+            try:
+                return self.identity(p12_path, p12_pass).thumbprint
+            except Exception:
+                pass
+        return "none"
+
+    def stats(self) -> dict:
+        return {"identities": len(self._entries), **self._counts}
+
+
+signing_material = SigningMaterialRegistry()
+
+
+class SignatureResultCache:
+    """Per-process memo of `verify_pdf_signature_async` results.
+
+    Keyed by the file's SHA-256 and the trust-root fingerprint, so re-verifying a
+    known signed download skips pyHanko entirely, and a new keystore never serves
+    results judged against the old one. Entries expire after `ttl` seconds so
+    certificate expiry is re-checked. Also counts hits and pyHanko time for /metrics.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl)
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._counts = {"hits": 0, "misses": 0, "validations": 0, "timeouts": 0, "skipped": 0}
+        self._validation_s = 0.0
+
+    @staticmethod
+    def key(sha256: str, trust: str) -> str:
+        return f"pades:{sha256}:{trust}"
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is not None and item[0] <= time.time():
+            del self._entries[key]
+            item = None
+        if item is None:
+            self._counts["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._counts["hits"] += 1
+        return copy.deepcopy(item[1])
+
+    def put(self, key: str, result: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time() + self.ttl, copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record(self, seconds: float) -> None:
+        self._counts["validations"] += 1
+        self._validation_s += seconds
+
+    def record_timeout(self) -> None:
+        self._counts["timeouts"] += 1
+
+    def record_skipped(self, n: int = 1) -> None:
+        self._counts["skipped"] += n
+
+    def stats(self) -> dict:
+        lookups = self._counts["hits"] + self._counts["misses"]
+        validations = self._counts["validations"]
+        return {
+            "size": len(self._entries),
+            **self._counts,
+            "hit_rate": round(self._counts["hits"] / lookups, 3) if lookups else None,
+            "validation_s": round(self._validation_s, 3),
+            "mean_validation_ms": round(1000 * self._validation_s / validations, 1) if validations else None,
+        }
+
+
+pades_results = SignatureResultCache(PADES_RESULT_CACHE_MAX_ENTRIES, PADES_RESULT_CACHE_TTL_S)
+
+
 def load_pkcs12_thumbprint(p12_path: str, p12_pass: Optional[str]) -> str:
     """Load a PKCS#12 and return the certificate SHA-256 thumbprint."""
-    with open(p12_path, "rb") as f:
-        data = f.read()
-    key, cert, add_certs = pkcs12.load_key_and_certificates(data, p12_pass.encode() if p12_pass else None)
-    if cert is None:
-        raise ValueError("PKCS12 does not contain a certificate")
-    return _thumbprint_from_cert(cert)
+    if signers is None:
+        with open(p12_path, "rb") as f:
+            data = f.read()
+        key, cert, add_certs = pkcs12.load_key_and_certificates(data, p12_pass.encode() if p12_pass else None)
+        if cert is None:
+            raise ValueError("PKCS12 does not contain a certificate")
+        return _thumbprint_from_cert(cert)
+    return signing_material.identity(p12_path, p12_pass).thumbprint
 
 
 def sign_pdf_with_pkcs12(p12_path: str, p12_pass: Optional[str], in_path: str, out_path: str) -> dict:
     """
     Sign `in_path` producing `out_path` using PKCS#12 keystore.
-    Returns dict with `signer_cert_thumbprint` and `signed_at`.
+    Returns dict with `signer_cert_thumbprint`, `signed_at` and the `sha256` of `out_path`.
     """
     # NOTE: In newer pyHanko versions, PdfSigner.sign_pdf() may call asyncio.run()
     # internally, which cannot be used inside FastAPI's running event loop.
@@ -78,35 +278,6 @@ def _resolve_default_p12_config() -> tuple[Optional[str], Optional[str]]:
     return None, p12_pass
 
 
-def _build_validation_context() -> Optional["ValidationContext"]:
-    """Build a ValidationContext for signature validation.
-
-    If the backend is configured with a signing PKCS#12 (demo cert), treat it as
-    a trust root. This avoids noisy self-signed path-building errors in logs.
-    """
-    if ValidationContext is None:
-        return None
-
-    p12_path, p12_pass = _resolve_default_p12_config()
-    if signers is not None and p12_path and os.path.exists(p12_path):
-        try:
-            signer = signers.SimpleSigner.load_pkcs12(
-                p12_path,
-                passphrase=p12_pass.encode("utf-8") if p12_pass else None,
-            )
-            signing_cert = getattr(signer, "signing_cert", None)
-            if signing_cert is not None:
-                return ValidationContext(trust_roots=[signing_cert], allow_fetching=False)
-        except Exception:
-            pass
-
-    # Default: no trust roots. We'll still validate cryptographic integrity.
-    try:
-        return ValidationContext(allow_fetching=False)
-    except Exception:
-        return None
-
-
 async def sign_pdf_with_pkcs12_async(
     p12_path: str, p12_pass: Optional[str], in_path: str, out_path: str
 ) -> dict:
@@ -114,33 +285,31 @@ async def sign_pdf_with_pkcs12_async(
     if signers is None:
         raise RuntimeError("pyhanko is not available")
 
-    signer = signers.SimpleSigner.load_pkcs12(
-        p12_path,
-        passphrase=p12_pass.encode("utf-8") if p12_pass else None,
-    )
-    if signer is None:
-        raise FileNotFoundError(f"Could not load PKCS#12 from '{p12_path}'")
+    try:
+        identity = signing_material.identity(p12_path, p12_pass)
+    except Exception as e:
+        raise FileNotFoundError(f"Could not load PKCS#12 from '{p12_path}': {e}") from e
 
     meta = signers.PdfSignatureMetadata(field_name="Signature1")
-    pdf_signer = signers.PdfSigner(meta, signer=signer)
+    pdf_signer = signers.PdfSigner(meta, signer=identity.signer)
 
+    # Sign into memory: pyhanko seeks back to fill in the signature, so the output can
+    # only be hashed once complete. Hashing the buffer saves re-reading the file.
+    signed = BytesIO()
     with open(in_path, "rb") as inf:
         w = IncrementalPdfFileWriter(inf)
-        with open(out_path, "wb") as outf:
-            async_sign = getattr(pdf_signer, "async_sign_pdf", None)
-            if callable(async_sign):
-                await async_sign(w, output=outf)
-            else:
-                pdf_signer.sign_pdf(w, output=outf)
-
-    # Extract thumbprint from PKCS#12 in a robust way
-    with open(p12_path, "rb") as f:
-        data = f.read()
-    key, cert, add_certs = pkcs12.load_key_and_certificates(
-        data, p12_pass.encode() if p12_pass else None
-    )
-    thumb = _thumbprint_from_cert(cert)
-    return {"signer_cert_thumbprint": thumb, "signed_at": datetime.utcnow()}
+        async_sign = getattr(pdf_signer, "async_sign_pdf", None)
+        if callable(async_sign):
+            await async_sign(w, output=signed)
+        else:
+            pdf_signer.sign_pdf(w, output=signed)
+    signed_bytes = signed.getbuffer()
+    with open(out_path, "wb") as outf:
+        outf.write(signed_bytes)
+    signed_sha256 = hashlib.sha256(signed_bytes).hexdigest()
+    signed_bytes.release()
+
+    return {"signer_cert_thumbprint": identity.thumbprint, "signed_at": datetime.utcnow(), "sha256": signed_sha256}
 
 
 def verify_pdf_signature(pdf_path: str) -> dict:
@@ -162,99 +331,218 @@ def verify_pdf_signature(pdf_path: str) -> dict:
     return asyncio.run(verify_pdf_signature_async(pdf_path))
 
 
-async def verify_pdf_signature_async(pdf_path: str) -> dict:
+async def verify_pdf_signature_async(pdf_path: str, *, sha256: Optional[str] = None) -> dict:
     """Verify signatures on a PDF (async).
 
     Returns a dict:
       {valid: bool, signer_cert_thumbprint: Optional[str], signer_name: Optional[str], details: ...}
+
+    The file is memory-mapped rather than read: the signature probe and pyHanko
+    (including its digest of the signed byte ranges) read pages on demand, so a
+    large scan never becomes one in-memory buffer. Results are memoized by the
+    file's SHA-256 (pass `sha256` when already known) and the trust roots.
     """
     result = {"valid": False, "signer_cert_thumbprint": None, "signer_name": None, "details": None}
 
-    # Always do a quick heuristic check for embedded signature markers.
+    trust = signing_material.trust_fingerprint()
+    if sha256:
+        cached = pades_results.get(pades_results.key(sha256, trust))
+        if cached is not None:
+            return cached
+
     try:
-        with open(pdf_path, "rb") as f:
-            blob = f.read()
-        has_byte_range = b"/ByteRange" in blob
+        with map_pdf(pdf_path) as mm:
+            # Always do a quick structural check for signature dictionaries.
+            structure = probe_pdf_structure(mm)
+            if validate_pdf_signature is None or PdfFileReader is None:
+                result["details"] = "signature-like contents present" if structure.signature_count else "no signature found"
+                return result
+
+            if not structure.signature_count:
+                result["details"] = "no signature found"
+                return result
+
+            if not sha256:
+                sha256 = hashlib.sha256(mm).hexdigest()
+                cached = pades_results.get(pades_results.key(sha256, trust))
+                if cached is not None:
+                    return cached
+
+            started = time.perf_counter()
+            complete = await _validate_signatures(pdf_path, mm, result)
+            pades_results.record(time.perf_counter() - started)
+            if isinstance(result["details"], dict):
+                result["details"]["structure"] = structure.info()
+            if complete:
+                pades_results.put(pades_results.key(sha256, trust), result)
+            return result
     except Exception as e:
         result["details"] = str(e)
         return result
 
-    if validate_pdf_signature is None or PdfFileReader is None:
-        result["details"] = "signature-like contents present" if has_byte_range else "no signature found"
-        return result
-
-    if not has_byte_range:
-        result["details"] = "no signature found"
-        return result
 
+async def _validate_embedded(emb, vc) -> dict:
+    """Validate one embedded signature: {intact, valid, trusted, thumbprint, name}."""
+    # In pyHanko 0.9+, the underlying validator is async.
+    if async_validate_pdf_signature is not None:
+        status = await async_validate_pdf_signature(emb, signer_validation_context=vc)
+    else:
+        status = validate_pdf_signature(emb, signer_validation_context=vc)
+        if asyncio.iscoroutine(status):
+            status = await status
+    intact = bool(getattr(status, "intact", False))
+    valid = bool(getattr(status, "valid", False))
+    trusted = bool(getattr(status, "trusted", False))
+
+    # pyHanko exposes the signer's end-entity cert as `signer_cert`
+    signing_cert = getattr(emb, "signer_cert", None)
+    thumb = None
+    name = None
     try:
-        # We primarily care about cryptographic integrity here; trust can be enforced separately.
-        # However, trusting our configured demo signing cert avoids noisy self-signed warnings.
-        vc = _build_validation_context()
+        # signing_cert is typically an asn1crypto.x509.Certificate
+        if signing_cert is not None and hasattr(signing_cert, "dump"):
+            thumb = hashlib.sha256(signing_cert.dump()).hexdigest()
+            subj = getattr(signing_cert, "subject", None)
+            if subj is not None and hasattr(subj, "native"):
+                name = subj.native.get("common_name")
+    except Exception:
+        pass
 
-        sigs = []
-        all_good = True
+    return {"intact": intact, "valid": valid, "trusted": trusted, "thumbprint": thumb, "name": name}
 
-        # Keep the file handle open while validating; embedded signature objects
-        # may read/seek on the underlying stream.
-        with open(pdf_path, "rb") as f:
-            r = PdfFileReader(f)
-            embedded = list(getattr(r, "embedded_signatures", []) or [])
 
-            if not embedded:
-                result["details"] = "no embedded signatures"
-                return result
+# pyHanko validation runs on its own bounded pool rather than the loop's default
+# executor: a validation that times out keeps its thread until pyHanko returns, and
+# must not starve unrelated `to_thread` users.
+_validation_threads = ThreadPoolExecutor(max_workers=max(1, PADES_VALIDATION_THREADS), thread_name_prefix="pades")
 
-            for emb in embedded:
-                try:
-                    # In pyHanko 0.9+, the underlying validator is async.
-                    if async_validate_pdf_signature is not None:
-                        status = await async_validate_pdf_signature(
-                            emb, signer_validation_context=vc
-                        )
-                    else:
-                        status = validate_pdf_signature(emb, signer_validation_context=vc)
-                        if asyncio.iscoroutine(status):
-                            status = await status
-                    intact = bool(getattr(status, "intact", False))
-                    valid = bool(getattr(status, "valid", False))
-                    trusted = bool(getattr(status, "trusted", False))
-                    all_good = all_good and intact and valid
-
-                    # pyHanko exposes the signer's end-entity cert as `signer_cert`
-                    signing_cert = getattr(emb, "signer_cert", None)
-                    thumb = None
-                    name = None
+
+def _validate_group(pdf_path: str, indices: list, contexts: list, notify, abandoned: threading.Event) -> None:
+    """Validate embedded signatures `indices` of `pdf_path` in order (on a validation thread).
+
+    The file is mapped and parsed once per group: embedded signature objects seek
+    and read on their reader's stream while digesting the signed byte ranges, so a
+    reader is never shared between threads. `notify(i, "start" | "done", value)`
+    reports each signature; "done" carries the result dict or the exception. Stops
+    before the next signature once `abandoned` is set.
+    """
+
+    async def run(embedded) -> None:
+        for i, vc in zip(indices, contexts):
+            if abandoned.is_set():
+                return
+            notify(i, "start", None)
+            try:
+                value = await _validate_embedded(embedded[i], vc)
+            except Exception as e:
+                value = e
+            notify(i, "done", value)
+
+    if abandoned.is_set():
+        return  # gave up while queued
+    try:
+        with map_pdf(pdf_path) as mm:
+            # pyHanko's validator is async; this thread gets a private event loop.
+            asyncio.run(run(list(PdfFileReader(mm).embedded_signatures)))
+    except Exception as e:
+        # Reader setup failed: every signature not reported yet gets the error.
+        for i in indices:
+            notify(i, "start", None)
+            notify(i, "done", e)
+
+
+async def _validate_signatures(pdf_path: str, stream, result: dict) -> bool:
+    """Validate every embedded signature of `pdf_path`; fills in `result`.
+
+    `stream` (the caller's map of the file) is only used to count the signatures.
+    The first PADES_MAX_SIGNATURES are split over at most PADES_VALIDATION_THREADS
+    threads of a dedicated pool, each parsing the file once; the rest are reported
+    as skipped. A signature's PADES_SIGNATURE_TIMEOUT_S starts when its validation
+    does, not while it waits for a thread; one that cannot get a thread within
+    PADES_QUEUE_TIMEOUT_S is skipped, and so are those queued behind a timed-out
+    one on the same thread. A timed-out thread is left to finish in the background.
+    Digests and signature checks in hashlib/cryptography release the GIL, so
+    signatures on different threads do overlap.
+
+    Returns True when every signature got a verdict or was skipped by the
+    per-document cap (worth memoizing).
+    """
+    try:
+        count = len(getattr(PdfFileReader(stream), "embedded_signatures", []) or [])
+
+        if not count:
+            result["details"] = "no embedded signatures"
+            return False
+
+        checked = min(count, max(0, PADES_MAX_SIGNATURES))
+        n_threads = min(checked, max(1, PADES_VALIDATION_THREADS))
+        loop = asyncio.get_running_loop()
+        started = {i: loop.create_future() for i in range(checked)}
+        finished = {i: loop.create_future() for i in range(checked)}
+
+        def settle(fut, value) -> None:
+            if not fut.done():
+                fut.set_result(value)
+
+        def notify(i: int, event: str, value) -> None:
+            try:
+                loop.call_soon_threadsafe(settle, (started if event == "start" else finished)[i], value)
+            except RuntimeError:
+                pass  # the loop is closed: nobody is waiting any more
+
+        outcomes: dict[int, dict] = {}
+        complete = True
+
+        async def follow(indices: list) -> None:
+            nonlocal complete
+            abandoned = threading.Event()
+            # We primarily care about cryptographic integrity here; trust can be enforced separately.
+            # However, trusting our configured demo signing cert avoids noisy self-signed warnings.
+            # One context per signature: a context keeps caches and is not shared across threads.
+            contexts = [signing_material.validation_context() for _ in indices]
+            try:
+                _validation_threads.submit(_validate_group, pdf_path, indices, contexts, notify, abandoned)
+                for n, i in enumerate(indices):
                     try:
-                        # signing_cert is typically an asn1crypto.x509.Certificate
-                        if signing_cert is not None and hasattr(signing_cert, "dump"):
-                            thumb = hashlib.sha256(signing_cert.dump()).hexdigest()
-                            subj = getattr(signing_cert, "subject", None)
-                            if subj is not None and hasattr(subj, "native"):
-                                name = subj.native.get("common_name")
-                    except Exception:
-                        pass
-
-                    sigs.append(
-                        {
-                            "intact": intact,
-                            "valid": valid,
-                            "trusted": trusted,
-                            "thumbprint": thumb,
-                            "name": name,
-                        }
-                    )
-                except Exception as e:
-                    all_good = False
-                    sigs.append({"error": str(e)})
+                        await asyncio.wait_for(asyncio.shield(started[i]), PADES_QUEUE_TIMEOUT_S)
+                    except asyncio.TimeoutError:
+                        skipped = indices[n:]
+                        reason = f"not validated: no validation thread free within {PADES_QUEUE_TIMEOUT_S:g}s"
+                    else:
+                        try:
+                            value = await asyncio.wait_for(asyncio.shield(finished[i]), PADES_SIGNATURE_TIMEOUT_S)
+                        except asyncio.TimeoutError:
+                            pades_results.record_timeout()
+                            outcomes[i] = {"error": f"validation timed out after {PADES_SIGNATURE_TIMEOUT_S:g}s"}
+                            skipped = indices[n + 1:]
+                            reason = "not validated: an earlier signature on its thread timed out"
+                        else:
+                            if isinstance(value, Exception):
+                                complete = False
+                                value = {"error": str(value)}
+                            outcomes[i] = value
+                            continue
+                    complete = False
+                    pades_results.record_skipped(len(skipped))
+                    outcomes.update((j, {"skipped": reason}) for j in skipped)
+                    return
+            finally:
+                abandoned.set()
+
+        await asyncio.gather(*(follow(list(range(t, checked, n_threads))) for t in range(n_threads)))
+        sigs = [outcomes[i] for i in range(checked)]
+        if count > checked:
+            pades_results.record_skipped(count - checked)
+            sigs.extend({"skipped": f"not validated: more than {checked} signatures"} for _ in range(count - checked))
+        all_good = all(sig.get("intact") and sig.get("valid") for sig in sigs)
 
         result["valid"] = bool(all_good)
         result["details"] = {"signatures": sigs}
         result["signer_cert_thumbprint"] = sigs[0].get("thumbprint") if sigs else None
         result["signer_name"] = sigs[0].get("name") if sigs else None
+        return complete
 
     except Exception as e:
         # If pyhanko fails unexpectedly, don't break the pipeline; fall back to heuristic.
         result["details"] = f"signature-like contents present but validation failed: {e}"
-
-    return result
+        return False
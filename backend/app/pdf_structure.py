@@ -0,0 +1,613 @@
+# app/pdf_structure.py
+import mmap
+import os
+import re
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+# startxref sits in the last few hundred bytes; allow for trailing junk after %%EOF.
+_TAIL_BYTES = 4096
+# Trailer / xref-stream dictionaries are small; cap how far a dictionary is read.
+_DICT_BYTES = 16384
+# Guards against /Prev loops in broken files.
+_MAX_SECTIONS = 4096
+
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_PREV_RE = re.compile(rb"/Prev\s+(\d+)")
+_XREF_STREAM_RE = re.compile(rb"\d+\s+\d+\s+obj\s*<<")
+_BYTE_RANGE_RE = re.compile(rb"/ByteRange\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\]")
+# Guards for the object resolver: indirect objects looked up per probe, nesting of
+# arrays/dictionaries, and the decoded size of one xref or object stream.
+_MAX_OBJECTS = 10000
+_MAX_DEPTH = 64
+_MAX_STREAM_BYTES = 64 * 1024 * 1024
+
+
+class PdfMap(mmap.mmap):
+    """Read-only mapping of a PDF that also works as a binary stream for pyHanko.
+
+    mmap already has read/seek/tell; pyHanko's digest loop also wants `readinto`.
+    """
+
+    def readinto(self, buf) -> int:
+        data = self.read(len(buf))
+        buf[: len(data)] = data
+        return len(data)
+
+
+@contextmanager
+def map_pdf(path: str) -> Iterator[PdfMap]:
+    """Map `path` read-only; pages are read on demand instead of into one buffer."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("empty file")
+        with PdfMap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+@dataclass(frozen=True)
+class XrefSection:
+    """One cross-reference section of the xref/trailer chain; each closes a revision."""
+
+    offset: int
+    kind: str  # "table" or "stream"
+    end: Optional[int]  # just past the revision's %%EOF (and end-of-line), if found
+    # A table whose trailer also points at an xref stream (/XRefStm); strict pyHanko
+    # refuses to sign or validate such hybrid-reference files.
+    hybrid: bool = False
+
+
+@dataclass(frozen=True)
+class PdfStructure:
+    size: int
+    # Newest first, following startxref and /Prev; empty when the chain is unreadable.
+    sections: tuple[XrefSection, ...]
+    # /ByteRange [a b c d] of each signature dictionary, in file order.
+    byte_ranges: tuple[tuple[int, int, int, int], ...]
+    # "acroform": the signature fields' values, resolved from the catalog through the
+    # xref chain. "scan": the chain or catalog was unreadable, so the ranges come from
+    # a raw search of the file (may include stray or superseded /ByteRange arrays).
+    signature_source: str = "acroform"
+
+    @property
+    def revisions(self) -> int:
+        return len(self.sections)
+
+    @property
+    def incremental_updates(self) -> int:
+        return max(0, len(self.sections) - 1)
+
+    @property
+    def hybrid_xref(self) -> bool:
+        return any(s.hybrid for s in self.sections)
+
+    @property
+    def signature_count(self) -> int:
+        return len(self.byte_ranges)
+
+    @property
+    def signed_to_end(self) -> bool:
+        """True when a signature covers every byte of the file (nothing appended after signing)."""
+        return any(c + d == self.size for _, _, c, d in self.byte_ranges)
+
+    def info(self) -> dict:
+        return {
+            "size": self.size,
+            "revisions": self.revisions,
+            "xref": [s.kind for s in self.sections],
+            "hybrid_xref": self.hybrid_xref,
+            "signatures": self.signature_count,
+            "signature_source": self.signature_source,
+            "byte_ranges": [list(r) for r in self.byte_ranges],
+            "signed_to_end": self.signed_to_end,
+        }
+
+
+def _revision_end(mm: mmap.mmap, start: int) -> Optional[int]:
+    eof = mm.find(b"%%EOF", start)
+    if eof < 0:
+        return None
+    end = eof + 5
+    if mm[end : end + 2] == b"\r\n":
+        return end + 2
+    if mm[end : end + 1] in (b"\r", b"\n"):
+        return end + 1
+    return end
+
+
+def _xref_chain(mm: mmap.mmap) -> list[XrefSection]:
+    size = len(mm)
+    tail_start = max(0, size - _TAIL_BYTES)
+    at = mm.rfind(b"startxref", tail_start)
+    if at < 0:
+        return []
+    m = _STARTXREF_RE.match(mm[at : at + 64])
+    offset = int(m.group(1)) if m else -1
+
+    sections: list[XrefSection] = []
+    seen: set[int] = set()
+    while 0 <= offset < size and offset not in seen and len(sections) < _MAX_SECTIONS:
+        seen.add(offset)
+        head = mm[offset : offset + 64].lstrip()
+        if head.startswith(b"xref"):
+            trailer = mm.find(b"trailer", offset)
+            if trailer < 0:
+                break
+            kind, dict_start = "table", trailer
+        elif _XREF_STREAM_RE.match(head):
+            kind, dict_start = "stream", offset
+        else:
+            break
+        window = mm[dict_start : dict_start + _DICT_BYTES]
+        # A stream's dictionary ends where its data starts; a trailer's at startxref.
+        stop = window.find(b"stream" if kind == "stream" else b"startxref")
+        dictionary = window[: stop if stop >= 0 else len(window)]
+        hybrid = kind == "table" and b"/XRefStm" in dictionary
+        sections.append(XrefSection(offset, kind, _revision_end(mm, dict_start), hybrid))
+        prev = _PREV_RE.search(dictionary)
+        offset = int(prev.group(1)) if prev else -1
+    return sections
+
+
+def _valid_byte_range(values, size: int) -> Optional[tuple[int, int, int, int]]:
+    """Only well-formed ranges count: starting at 0, with the gap (the /Contents
+    string) inside the file."""
+    if not isinstance(values, list) or len(values) != 4 or not all(type(v) is int for v in values):
+        return None
+    a, b, c, d = values
+    return (a, b, c, d) if a == 0 and 0 < b < c and c + d <= size else None
+
+
+def _scan_byte_ranges(mm: mmap.mmap) -> list[tuple[int, int, int, int]]:
+    """Fallback for unreadable files: every well-formed /ByteRange array in the file,
+    found with mmap.find (no copy of the file). Also matches arrays in content
+    streams and superseded revisions, and misses compressed object streams."""
+    size = len(mm)
+    out = []
+    pos = mm.find(b"/ByteRange")
+    while pos >= 0:
+        m = _BYTE_RANGE_RE.match(mm[pos : pos + 128])
+        if m:
+            byte_range = _valid_byte_range([int(v) for v in m.groups()], size)
+            if byte_range:
+                out.append(byte_range)
+        pos = mm.find(b"/ByteRange", pos + 10)
+    return out
+
+
+# Minimal PDF object syntax, enough to follow the catalog to the signature fields.
+# Names parse to str, strings to (undecoded) bytes, indirect references to _Ref.
+_REGULAR = rb"[^\s\x00()<>\[\]{}/%]"
+_WS_RE = re.compile(rb"(?:[\s\x00]+|%[^\r\n]*)*")
+_NAME_RE = re.compile(rb"/(" + _REGULAR + rb"*)")
+_NAME_ESCAPE_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_NUMBER_RE = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_REF_TAIL_RE = re.compile(rb"\s+(\d+)\s+R(?!" + _REGULAR + rb")")
+_KEYWORDS = {b"true": True, b"false": False, b"null": None}
+_KEYWORD_RE = re.compile(rb"[a-z]+")
+_STRING_SPECIAL_RE = re.compile(rb"[()\\]")
+_OBJ_HEADER_RE = re.compile(rb"[\s\x00]*(\d+)\s+(\d+)\s+obj(?!" + _REGULAR + rb")")
+_STREAM_RE = re.compile(rb"[\s\x00]*stream(?:\r\n|\n|\r)")
+_XREF_SUBSECTION_RE = re.compile(rb"(\d+)\s+(\d+)")
+_XREF_ENTRY_RE = re.compile(rb"(\d{10})\s(\d{5})\s([nf])")
+
+
+class _Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+def _skip_ws(buf, pos: int) -> int:
+    return _WS_RE.match(buf, pos).end()
+
+
+def _literal_string(buf, pos: int) -> tuple[bytes, int]:
+    depth = 0
+    i = pos
+    while True:
+        m = _STRING_SPECIAL_RE.search(buf, i)
+        if m is None:
+            raise ValueError(f"unterminated string at {pos}")
+        i = m.end()
+        ch = m.group(0)
+        if ch == b"\\":
+            i += 1
+        elif ch == b"(":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return bytes(buf[pos + 1 : i - 1]), i
+
+
+def _parse_object(buf, pos: int, depth: int = 0):
+    """Parse one direct object (or reference) at `pos`; returns (value, end)."""
+    if depth > _MAX_DEPTH:
+        raise ValueError("objects nested too deeply")
+    pos = _skip_ws(buf, pos)
+    head = buf[pos : pos + 2]
+    if head == b"<<":
+        out = {}
+        pos += 2
+        while True:
+            pos = _skip_ws(buf, pos)
+            if buf[pos : pos + 2] == b">>":
+                return out, pos + 2
+            m = _NAME_RE.match(buf, pos)
+            if m is None:
+                raise ValueError(f"bad dictionary key at {pos}")
+            out[_name(m.group(1))], pos = _parse_object(buf, m.end(), depth + 1)
+    if head[:1] == b"<":
+        end = buf.find(b">", pos)
+        if end < 0:
+            raise ValueError(f"unterminated hex string at {pos}")
+        return bytes(buf[pos + 1 : end]), end + 1
+    if head[:1] == b"[":
+        out = []
+        pos += 1
+        while True:
+            pos = _skip_ws(buf, pos)
+            if buf[pos : pos + 1] == b"]":
+                return out, pos + 1
+            value, pos = _parse_object(buf, pos, depth + 1)
+            out.append(value)
+    if head[:1] == b"(":
+        return _literal_string(buf, pos)
+    if head[:1] == b"/":
+        m = _NAME_RE.match(buf, pos)
+        return _name(m.group(1)), m.end()
+    m = _NUMBER_RE.match(buf, pos)
+    if m:
+        text = m.group(0)
+        if b"." in text:
+            return float(text), m.end()
+        ref = _REF_TAIL_RE.match(buf, m.end())
+        if ref:
+            return _Ref(int(text), int(ref.group(1))), ref.end()
+        return int(text), m.end()
+    m = _KEYWORD_RE.match(buf, pos)
+    if m and m.group(0) in _KEYWORDS:
+        return _KEYWORDS[m.group(0)], m.end()
+    raise ValueError(f"unexpected token at {pos}")
+
+
+def _name(raw: bytes) -> str:
+    return _NAME_ESCAPE_RE.sub(lambda m: bytes([int(m.group(1), 16)]), raw).decode("latin-1")
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _png_unpredict(data: bytes, columns: int, colors: int, bits: int) -> bytes:
+    """Undo PNG row predictors (/Predictor >= 10), as used by xref and object streams."""
+    bpp = max(1, colors * bits // 8)
+    row_len = (columns * colors * bits + 7) // 8
+    rows = len(data) // (row_len + 1)
+    table = np.frombuffer(data, dtype=np.uint8, count=rows * (row_len + 1)).reshape(rows, row_len + 1)
+    kinds = table[:, 0]
+    if not kinds.any():
+        return table[:, 1:].tobytes()
+    if (kinds == 2).all():
+        # "Up" on every row: each byte is the running sum of its column (mod 256).
+        return np.cumsum(table[:, 1:], axis=0, dtype=np.uint8).tobytes()
+    out = bytearray()
+    prev = bytearray(row_len)
+    for kind, row in zip(kinds.tolist(), table[:, 1:]):
+        row = bytearray(row.tobytes())
+        for i in range(row_len):
+            left = row[i - bpp] if i >= bpp else 0
+            up = prev[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + ((left + up) >> 1)) & 0xFF
+            elif kind == 4:
+                up_left = prev[i - bpp] if i >= bpp else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else up_left)) & 0xFF
+            elif kind != 0:
+                raise ValueError(f"unknown PNG predictor {kind}")
+        out += row
+        prev = row
+    return bytes(out)
+
+
+class _ObjectResolver:
+    """Looks up indirect objects of a mapped PDF through its xref chain.
+
+    Reads xref tables (lazily, by entry position), xref streams and object
+    streams (FlateDecode only); the newest section that lists an object wins, as
+    in a PDF reader. Raises ValueError (or zlib.error) on anything it cannot read.
+    """
+
+    def __init__(self, mm: mmap.mmap, sections: tuple[XrefSection, ...]):
+        self.mm = mm
+        self._objects: dict[int, object] = {}
+        self._object_streams: dict[int, tuple[bytes, dict[int, int]]] = {}
+        self._lookups = []  # newest first: callables num -> entry or None
+        self.root = None
+        for section in sections:
+            trailer = self._add_section(section.offset, section.kind)
+            if self.root is None and isinstance(trailer.get("Root"), _Ref):
+                self.root = trailer["Root"]
+        if self.root is None:
+            raise ValueError("no /Root in the trailer")
+
+    def _add_section(self, offset: int, kind: str) -> dict:
+        if kind == "stream":
+            trailer, data = self._stream_object(offset, None)
+            self._lookups.append(self._stream_lookup(trailer, data))
+            return trailer
+        pos = _skip_ws(self.mm, self.mm.find(b"xref", offset) + 4)
+        subsections = []
+        while not self.mm[pos : pos + 7] == b"trailer":
+            m = _XREF_SUBSECTION_RE.match(self.mm, pos)
+            if m is None:
+                raise ValueError(f"bad xref subsection at {pos}")
+            first, count = int(m.group(1)), int(m.group(2))
+            start = _skip_ws(self.mm, m.end())
+            subsections.append((first, count, start))
+            pos = _skip_ws(self.mm, start + 20 * count)
+        trailer, _ = _parse_object(self.mm, pos + 7)
+        table = self._table_lookup(subsections)
+        if isinstance(trailer.get("XRefStm"), int):
+            # Hybrid file: objects the table omits or marks free (those in object
+            # streams) are listed in this xref stream.
+            stream = self._stream_lookup(*self._stream_object(trailer["XRefStm"], None))
+
+            def lookup(num: int):
+                entry = table(num)
+                return stream(num) if entry is None or entry[0] == "free" else entry
+
+            self._lookups.append(lookup)
+        else:
+            self._lookups.append(table)
+        return trailer
+
+    def _table_lookup(self, subsections):
+        def lookup(num: int):
+            for first, count, start in subsections:
+                if first <= num < first + count:
+                    m = _XREF_ENTRY_RE.match(self.mm, start + 20 * (num - first))
+                    if m is None:
+                        raise ValueError(f"bad xref entry for object {num}")
+                    return ("offset", int(m.group(1))) if m.group(3) == b"n" else ("free",)
+            return None
+
+        return lookup
+
+    def _stream_lookup(self, trailer: dict, data: bytes):
+        widths = trailer.get("W")
+        if not isinstance(widths, list) or len(widths) != 3 or not all(type(w) is int and w >= 0 for w in widths):
+            raise ValueError("bad /W in xref stream")
+        index = trailer.get("Index") or [0, trailer.get("Size", 0)]
+        ranges = list(zip(index[::2], index[1::2]))
+        entry_len = sum(widths)
+
+        def field(entry: bytes, start: int, width: int, default: int) -> int:
+            return int.from_bytes(entry[start : start + width], "big") if width else default
+
+        def lookup(num: int):
+            row = 0
+            for first, count in ranges:
+                if first <= num < first + count:
+                    at = (row + num - first) * entry_len
+                    entry = data[at : at + entry_len]
+                    if len(entry) < entry_len:
+                        raise ValueError(f"xref stream too short for object {num}")
+                    kind = field(entry, 0, widths[0], 1)
+                    a = field(entry, widths[0], widths[1], 0)
+                    b = field(entry, widths[0] + widths[1], widths[2], 0)
+                    if kind == 1:
+                        return ("offset", a)
+                    if kind == 2:
+                        return ("compressed", a, b)
+                    return ("free",)
+                row += count
+            return None
+
+        return lookup
+
+    def _stream_object(self, offset: int, num: Optional[int]) -> tuple[dict, bytes]:
+        """(dictionary, decoded data) of the stream object at `offset`."""
+        value, pos = self._object_at(offset, num)
+        if not isinstance(value, dict):
+            raise ValueError(f"no stream dictionary at {offset}")
+        m = _STREAM_RE.match(self.mm, pos)
+        if m is None:
+            raise ValueError(f"no stream data at {offset}")
+        start = m.end()
+        length = value.get("Length")
+        if isinstance(length, _Ref):
+            length = self.get(length)
+        if type(length) is not int or length < 0 or start + length > len(self.mm):
+            end = self.mm.find(b"endstream", start)
+            if end < 0:
+                raise ValueError(f"unterminated stream at {offset}")
+            length = end - start
+        return value, self._decode(value, self.mm[start : start + length])
+
+    @staticmethod
+    def _decode(stream: dict, data: bytes) -> bytes:
+        filters = _as_list(stream.get("Filter"))
+        parms = _as_list(stream.get("DecodeParms")) or [None] * len(filters)
+        for name, parm in zip(filters, parms):
+            if name not in ("FlateDecode", "Fl"):
+                raise ValueError(f"unsupported stream filter {name!r}")
+            data = zlib.decompressobj().decompress(data, _MAX_STREAM_BYTES)
+            predictor = parm.get("Predictor", 1) if isinstance(parm, dict) else 1
+            if predictor >= 10:
+                data = _png_unpredict(data, parm.get("Columns", 1), parm.get("Colors", 1), parm.get("BitsPerComponent", 8))
+            elif predictor != 1:
+                raise ValueError(f"unsupported predictor {predictor}")
+        return data
+
+    def _object_at(self, offset: int, num: Optional[int]):
+        m = _OBJ_HEADER_RE.match(self.mm, offset)
+        if m is None or (num is not None and int(m.group(1)) != num):
+            raise ValueError(f"object {num} not found at offset {offset}")
+        return _parse_object(self.mm, m.end())
+
+    def _compressed(self, stream_num: int, index: int, num: int):
+        if stream_num not in self._object_streams:
+            entry = self._entry(stream_num)
+            if entry is None or entry[0] != "offset":
+                raise ValueError(f"object stream {stream_num} not found")
+            stream, data = self._stream_object(entry[1], stream_num)
+            n, first = stream.get("N"), stream.get("First")
+            if type(n) is not int or type(first) is not int:
+                raise ValueError(f"bad object stream {stream_num}")
+            pairs = [int(v) for v in re.findall(rb"\d+", data[:first])[: 2 * n]]
+            self._object_streams[stream_num] = (data, {obj: first + at for obj, at in zip(pairs[::2], pairs[1::2])})
+        data, offsets = self._object_streams[stream_num]
+        if num not in offsets:
+            raise ValueError(f"object {num} not in object stream {stream_num} (index {index})")
+        return _parse_object(data, offsets[num])[0]
+
+    def _entry(self, num: int):
+        for lookup in self._lookups:
+            entry = lookup(num)
+            if entry is not None:
+                return entry
+        return None
+
+    def get(self, ref: _Ref):
+        """The object `ref` points to; None for free or unlisted objects."""
+        if ref.num in self._objects:
+            return self._objects[ref.num]
+        if len(self._objects) >= _MAX_OBJECTS:
+            raise ValueError("too many objects resolved")
+        entry = self._entry(ref.num)
+        if entry is None or entry[0] == "free":
+            value = None
+        elif entry[0] == "offset":
+            value = self._object_at(entry[1], ref.num)[0]
+        else:
+            value = self._compressed(entry[1], entry[2], ref.num)
+        self._objects[ref.num] = value
+        return value
+
+    def resolve(self, value):
+        return self.get(value) if isinstance(value, _Ref) else value
+
+
+def _signature_byte_ranges(resolver: _ObjectResolver, size: int) -> list[tuple[int, int, int, int]]:
+    """/ByteRange of every filled signature field: catalog -> /AcroForm -> /Fields (and
+    /Kids) -> /V. Field types are inherited from parent fields; values are not."""
+    catalog = resolver.resolve(resolver.root)
+    if not isinstance(catalog, dict):
+        raise ValueError("document catalog is not a dictionary")
+    acroform = resolver.resolve(catalog.get("AcroForm"))
+    fields = resolver.resolve(acroform.get("Fields")) if isinstance(acroform, dict) else None
+    out = []
+    seen = set()
+    stack = [(field, None) for field in reversed(_as_list(fields))]
+    while stack:
+        item, inherited_type = stack.pop()
+        if isinstance(item, _Ref):
+            if item in seen:
+                continue
+            seen.add(item)
+        field = resolver.resolve(item)
+        if not isinstance(field, dict):
+            continue
+        field_type = field.get("FT", inherited_type)
+        kids = resolver.resolve(field.get("Kids"))
+        stack.extend((kid, field_type) for kid in reversed(_as_list(kids)))
+        if field_type != "Sig":
+            continue
+        value = resolver.resolve(field.get("V"))
+        if isinstance(value, dict):
+            byte_range = _valid_byte_range(resolver.resolve(value.get("ByteRange")), size)
+            if byte_range:
+                out.append(byte_range)
+    return sorted(dict.fromkeys(out), key=lambda r: r[1])
+
+
+def probe_pdf_structure(mm: mmap.mmap) -> PdfStructure:
+    """xref/trailer chain (revisions and incremental updates) and signature byte ranges of a mapped PDF.
+
+    Signatures are the values of the document's signature fields, resolved through
+    the xref chain (object streams included); only the objects on that path are
+    read. When the chain or catalog cannot be read, every well-formed /ByteRange in
+    the file is reported instead, with `signature_source="scan"`.
+    """
+    sections = tuple(_xref_chain(mm))
+    try:
+        if not sections:
+            raise ValueError("unreadable xref chain")
+        byte_ranges, source = _signature_byte_ranges(_ObjectResolver(mm, sections), len(mm)), "acroform"
+    except Exception:
+        # Malformed in a way the resolver does not handle (ValueError, zlib.error, ...).
+        byte_ranges, source = _scan_byte_ranges(mm), "scan"
+    return PdfStructure(size=len(mm), sections=sections, byte_ranges=tuple(byte_ranges), signature_source=source)
+
+
+def read_xref_chain(path: str) -> tuple[XrefSection, ...]:
+    """Only the xref/trailer chain of the PDF at `path`: reads its tail and each section's dictionary."""
+    with map_pdf(path) as mm:
+        return tuple(_xref_chain(mm))
+
+
+def normalization_reason(sections: tuple[XrefSection, ...]) -> Optional[str]:
+    """Why a PDF should be rewritten before strict pyHanko signs it, or None.
+
+    "hybrid_xref": pyHanko rejects hybrid-reference files outright.
+    "unreadable_xref": startxref/Prev does not lead to xref sections; pyHanko does
+    not reconstruct a broken chain, while a rewrite regenerates it.
+    """
+    if not sections:
+        return "unreadable_xref"
+    if any(s.hybrid for s in sections):
+        return "hybrid_xref"
+    return None
+
+
+class NormalizationStats:
+    """Counters of the upload pre-flight check and the rewrites it triggers, for /metrics.
+
+    `record_check` counts every probed PDF; `record` one rewrite, keyed by its
+    reason ("signer_rejected" when pyHanko refused a file the probe let through).
+    """
+
+    def __init__(self):
+        self._counts = {"checked": 0, "with_incremental_updates": 0, "normalized": 0, "failed": 0}
+        self._reasons: dict[str, int] = {}
+        self._normalize_s = 0.0
+        self._max_s = 0.0
+
+    def record_check(self, sections: tuple[XrefSection, ...]) -> None:
+        self._counts["checked"] += 1
+        if len(sections) > 1:
+            self._counts["with_incremental_updates"] += 1
+
+    def record(self, reason: str, seconds: float, *, ok: bool) -> None:
+        self._counts["normalized" if ok else "failed"] += 1
+        self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        self._normalize_s += seconds
+        self._max_s = max(self._max_s, seconds)
+
+    def stats(self) -> dict:
+        runs = self._counts["normalized"] + self._counts["failed"]
+        checked = self._counts["checked"]
+        return {
+            **self._counts,
+            "reasons": dict(self._reasons),
+            "trigger_rate": round(runs / checked, 3) if checked else None,
+            "normalize_s": round(self._normalize_s, 3),
+            "mean_normalize_ms": round(1000 * self._normalize_s / runs, 1) if runs else None,
+            "max_normalize_ms": round(1000 * self._max_s, 1),
+        }
+
+
+pdf_normalization = NormalizationStats()
@@ -0,0 +1,130 @@
+# app/perceptual_index.py
+import asyncio
+from dataclasses import dataclass
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+
+from app.ai.fingerprint import hamming_band_probes, hex64_to_int64
+from app.database import db
+
+# Fingerprint columns that have BIGINT + banded copies (see ensure_schema).
+_SQL_HASH_COLUMNS = ("perceptual_hash", "pdf_text_simhash")
+
+
+async def hamming_search_sql(column: str, value: str, *, radius: int, limit: int) -> list:
+    """Exact Hamming-radius search in Postgres over a banded fingerprint column.
+
+    Returns records `(id, distance)`, nearest first (newest first on ties).
+    """
+    if column not in _SQL_HASH_COLUMNS:
+        raise ValueError(f"no banded index for column {column!r}")
+    b0, b1, b2, b3 = hamming_band_probes(value, radius)
+    return await db.fetch_all(
+        f"""
+        SELECT id, bit_count(({column}_i64 # $1)::bit(64)) AS distance
+        FROM watermarked_files
+        WHERE ({column}_b0 = ANY($2::int[]) OR {column}_b1 = ANY($3::int[])
+               OR {column}_b2 = ANY($4::int[]) OR {column}_b3 = ANY($5::int[]))
+          AND bit_count(({column}_i64 # $1)::bit(64)) <= $6
+        ORDER BY distance, issued_at DESC
+        LIMIT $7
+        """,
+        hex64_to_int64(value), b0, b1, b2, b3, int(radius), int(limit),
+    )
+
+
+
+@dataclass(frozen=True)
+class PdfPageCandidates:
+    ids: list  # row ids, newest first
+    pages: np.ndarray  # flattened BIGINT page dHashes; candidate i owns pages[offsets[i]:offsets[i + 1]]
+    offsets: np.ndarray  # (N + 1,)
+    text_simhash: np.ndarray  # (N,) BIGINT text fingerprint, 0 where not text_known
+    text_known: np.ndarray  # (N,) pdf_text_simhash_i64 is set
+    text_stored: np.ndarray  # (N,) pdf_text_simhash (hex) is set, even if malformed
+
+
+async def fetch_pdf_page_candidates(extra_ids: list, *, window: int) -> PdfPageCandidates:
+    """Load per-page dHashes for PDF matching as flat arrays.
+
+    Candidates are the newest `window` files with page rows plus `extra_ids` (files
+    without pages are dropped), newest first.
+    """
+    rows = await db.fetch_all(
+        """
+        SELECT wf.id, wf.pdf_text_simhash_i64,
+               wf.pdf_text_simhash IS NOT NULL AS has_text_simhash,
+               array_agg(p.dhash ORDER BY p.page_no) AS pages
+        FROM watermarked_files wf
+        JOIN watermarked_file_pages p ON p.file_id = wf.id
+        WHERE wf.id = ANY($1::uuid[])
+           OR wf.id IN (
+               SELECT f.id FROM watermarked_files f
+               WHERE EXISTS (SELECT 1 FROM watermarked_file_pages fp WHERE fp.file_id = f.id)
+               ORDER BY f.issued_at DESC
+               LIMIT $2
+           )
+        GROUP BY wf.id
+        ORDER BY wf.issued_at DESC
+        """,
+        list(extra_ids),
+        int(window),
+    )
+    ids = [row["id"] for row in rows]
+    counts = np.fromiter((len(row["pages"]) for row in rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    pages = np.fromiter(chain.from_iterable(row["pages"] for row in rows), dtype=np.int64, count=int(offsets[-1]))
+    text_known = np.fromiter((row["pdf_text_simhash_i64"] is not None for row in rows), dtype=bool, count=len(rows))
+    text_simhash = np.fromiter((row["pdf_text_simhash_i64"] or 0 for row in rows), dtype=np.int64, count=len(rows))
+    text_stored = np.fromiter((row["has_text_simhash"] for row in rows), dtype=bool, count=len(rows))
+    return PdfPageCandidates(
+        ids=ids,
+        pages=pages,
+        offsets=offsets,
+        text_simhash=text_simhash,
+        text_known=text_known,
+        text_stored=text_stored,
+    )
+
+
+class PdfCandidateIndex:
+    """`fetch_pdf_page_candidates` for many queries against one snapshot.
+
+    The newest `window` page sets are loaded once, on first use; each query then
+    only fetches its `extra_ids` that fall outside that window. Files outside the
+    window are older than every file in it, so appending them keeps the
+    newest-first order a single fetch would give.
+    """
+
+    def __init__(self, window: int):
+        self.window = int(window)
+        self._base: Optional[PdfPageCandidates] = None
+        self._base_ids: set = set()
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> PdfPageCandidates:
+        async with self._lock:
+            if self._base is None:
+                self._base = await fetch_pdf_page_candidates([], window=self.window)
+                self._base_ids = set(self._base.ids)
+        return self._base
+
+    async def candidates(self, extra_ids: list) -> PdfPageCandidates:
+        base = await self._load()
+        missing = [i for i in dict.fromkeys(extra_ids) if i not in self._base_ids]
+        if not missing:
+            return base
+        extra = await fetch_pdf_page_candidates(missing, window=0)
+        if not extra.ids:
+            return base
+        return PdfPageCandidates(
+            ids=base.ids + extra.ids,
+            pages=np.concatenate([base.pages, extra.pages]),
+            offsets=np.concatenate([base.offsets, extra.offsets[1:] + base.offsets[-1]]),
+            text_simhash=np.concatenate([base.text_simhash, extra.text_simhash]),
+            text_known=np.concatenate([base.text_known, extra.text_known]),
+            text_stored=np.concatenate([base.text_stored, extra.text_stored]),
+        )
@@ -0,0 +1,54 @@
+import json
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.auth.jwt import get_current_user
+from app.database import db
+
+router = APIRouter()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, user=Depends(get_current_user)):
+    """Status and progress of a background job owned by the caller."""
+    try:
+        UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    row = await db.fetch_one(
+        """
+        SELECT j.*, wf.watermark_code, wf.processing_status
+        FROM jobs j
+        LEFT JOIN watermarked_files wf ON wf.id = j.file_id
+        WHERE j.id=$1 AND j.user_id=$2
+        """,
+        job_id,
+        str(user["id"]),
+    )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = row["result"]
+    return {
+        "job_id": str(row["id"]),
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": float(row["progress"]),
+        "stage": row["stage"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "error": row["error"],
+        "result": json.loads(result) if isinstance(result, str) else result,
+        "file_id": str(row["file_id"]) if row["file_id"] else None,
+        "watermark_code": row["watermark_code"],
+        "processing_status": row["processing_status"],
+        "created_at": _iso(row["created_at"]),
+        "started_at": _iso(row["started_at"]),
+        "finished_at": _iso(row["finished_at"]),
+    }
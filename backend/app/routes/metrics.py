@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from app.ai.ocr_cache import ocr_cache
+from app.jobs import job_runner
+from app.pades import pades_results, signing_material
+from app.pdf_structure import pdf_normalization
+from app.verify_cache import verify_cache
+from app.workers import worker_pool
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    """Runtime counters for capacity planning (JSON)."""
+    return {
+        "worker_pool": worker_pool.stats(),
+        "verify_cache": await verify_cache.stats(),
+        "jobs": await job_runner.stats(),
+        "ocr_cache": ocr_cache.stats() if ocr_cache is not None else None,
+        "signing_material": signing_material.stats(),
+        "pades": pades_results.stats(),
+        "pdf_normalization": pdf_normalization.stats(),
+    }
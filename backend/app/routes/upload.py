@@ -1,8 +1,9 @@
 # app/routes/upload.py
 
-import os, shutil, json, hashlib
+import os, json, time
 from uuid import uuid4
 from datetime import datetime
+from dataclasses import dataclass
 from typing import Optional, Tuple
 
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
@@ -14,26 +15,31 @@ try:
     import fitz
 except Exception:
     fitz = None
-from app.ai.fingerprint import dhash_path
+from app.ai.fingerprint import dhash_path, hex64_to_int64, sha256_path
 from app.pades import sign_pdf_with_pkcs12_async
-from app.ai.pdf_utils import rasterize_pages_and_hashes
-from app.ai.text_fingerprint import simhash64_hex
-from app.ai.ocr import extract_text_from_pdf
-import os
+from app.pdf_structure import normalization_reason, pdf_normalization, read_xref_chain
+from app.ai.pdf_utils import analyze_pdf_parallel
 from app.database import db
+from app.verify_cache import verify_cache
 from app.db_schema import canonical_metadata_hash
+from app.ingest import IngestedFile, ingest_upload
+from app.jobs import JobContext, enqueue_job, job_handler, job_runner
+from app.workers import worker_pool
 
 router = APIRouter()
 
 UPLOAD_DIR = "/tmp/snappy_uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def compute_sha256(file_path):
-    hash_sha256 = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
+FINGERPRINT_JOB = "upload_fingerprints"
+
+def _sanitize_pdf(src_path: str, dst_path: str) -> None:
+    """Rewrite a PDF without incremental updates (drops hybrid xref sections)."""
+    doc = fitz.open(src_path)
+    try:
+        doc.save(dst_path, incremental=False)
+    finally:
+        doc.close()
 
 
 def _resolve_pdf_signing_config() -> Tuple[Optional[str], Optional[str]]:
@@ -79,6 +85,180 @@ def _resolve_pdf_signing_config() -> Tuple[Optional[str], Optional[str]]:
 
     return chosen_path, chosen_pass
 
+@dataclass(frozen=True)
+class IssuedFile:
+    """The file handed back to the user (signed PDF / watermarked image) and its ids."""
+
+    path: str
+    watermark_id: str
+    watermark_code: str
+    sha256: Optional[str]
+    signer_cert_thumbprint: Optional[str] = None
+    signed_at: Optional[datetime] = None
+
+
+def _preflight_pdf(path: str) -> Optional[str]:
+    """Structural check before signing: why the PDF needs a rewrite, or None.
+
+    Reads only the file's tail and xref dictionaries, so problem files (hybrid
+    xref, broken chain) go straight to normalization instead of failing a signing
+    attempt first.
+    """
+    try:
+        sections = read_xref_chain(path)
+    except Exception:
+        # Unreadable/empty file: let the signer report it.
+        return None
+    pdf_normalization.record_check(sections)
+    return normalization_reason(sections)
+
+
+async def _normalize_pdf(src_path: str, original_filename: str, reason: str) -> str:
+    """Rewrite `src_path` into a SAN_ file on the worker pool, recording how long it took."""
+    sanitized = os.path.join(UPLOAD_DIR, f"SAN_{uuid4().hex}_{original_filename}")
+    started = time.perf_counter()
+    try:
+        await worker_pool.run(_sanitize_pdf, src_path, sanitized)
+    except Exception:
+        pdf_normalization.record(reason, time.perf_counter() - started, ok=False)
+        raise
+    elapsed = time.perf_counter() - started
+    pdf_normalization.record(reason, elapsed, ok=True)
+    print(f"PDF normalized before signing ({reason}) for {original_filename} in {elapsed * 1000:.0f} ms")
+    return sanitized
+
+
+async def _sign_pdf(temp_path: str, original_filename: str) -> dict:
+    """PAdES-sign an uploaded PDF; returns the signer result plus `path`, or {} when
+    no PKCS#12 is configured or signing failed."""
+    p12_path, p12_pass = _resolve_pdf_signing_config()
+    if not p12_path:
+        return {}
+    source = temp_path
+    if fitz is not None:
+        reason = _preflight_pdf(temp_path)
+        if reason:
+            try:
+                source = await _normalize_pdf(temp_path, original_filename, reason)
+            except Exception as e:
+                print(f"PDF normalization failed for {original_filename} ({reason}): {e}")
+    try:
+        signed_path = os.path.join(UPLOAD_DIR, f"SIGNED_{uuid4().hex}_{original_filename}")
+        try:
+            res = await sign_pdf_with_pkcs12_async(p12_path, p12_pass, source, signed_path)
+        except Exception as e:
+            err = str(e) or ""
+            # The pre-flight check missed it (or was skipped): if the error looks like
+            # hybrid xref issues, try to sanitize using PyMuPDF
+            if fitz is not None and source == temp_path and "hybrid" in err.lower():
+                try:
+                    sanitized = await _normalize_pdf(temp_path, original_filename, "signer_rejected")
+                    res = await sign_pdf_with_pkcs12_async(p12_path, p12_pass, sanitized, signed_path)
+                except Exception as e2:
+                    print(f"PDF signing failed after sanitization for {original_filename}: {e2}")
+                    raise
+            else:
+                print(f"PDF signing failed for {original_filename}: {e}")
+                raise
+    except Exception:
+        # Don't silently swallow signing failures: it makes PAdES "randomly" fail.
+        # We continue without a signature, but log so it's diagnosable.
+        return {}
+
+    signed_at = res.get("signed_at")
+    # Defensive: older signer implementations returned ISO strings.
+    if isinstance(signed_at, str):
+        try:
+            signed_at = datetime.fromisoformat(signed_at)
+        except Exception:
+            signed_at = None
+    return {**res, "signed_at": signed_at, "path": signed_path}
+
+
+async def issue_file(ingested: IngestedFile, original_filename: str, *, is_pdf: bool, user_id: str, metadata: dict) -> IssuedFile:
+    """Produce the downloadable file for an ingested upload.
+
+    PDFs are PAdES-signed when a PKCS#12 is configured (otherwise issued unchanged);
+    images get the invisible watermark. Both run on the worker pool.
+    """
+    if is_pdf:
+        # For PDFs we do NOT embed an image watermark. Optionally sign if PKCS#12 configured.
+        watermark_id = uuid4().hex
+        watermark_code = "WMK-" + watermark_id[:12].upper()
+        signed = await _sign_pdf(ingested.path, original_filename)
+        if not signed:
+            return IssuedFile(ingested.path, watermark_id, watermark_code, ingested.sha256)
+        return IssuedFile(
+            signed["path"],
+            watermark_id,
+            watermark_code,
+            signed.get("sha256"),
+            signer_cert_thumbprint=signed.get("signer_cert_thumbprint"),
+            signed_at=signed.get("signed_at"),
+        )
+
+    # Embed watermark for images
+    watermarked_path, watermark_id, watermark_code = await worker_pool.run(
+        embed_watermark_ai, ingested.path, user_id, metadata
+    )
+    # Hash of the file we hand back. This allows `/verify` to map an unmodified
+    # download straight back to its DB row.
+    try:
+        sha256 = await worker_pool.run(sha256_path, watermarked_path)
+    except Exception:
+        sha256 = None
+    return IssuedFile(watermarked_path, watermark_id, watermark_code, sha256)
+
+
+INSERT_FILE_SQL = """
+    INSERT INTO watermarked_files (
+        id, user_id, original_filename,
+        stored_filename,
+        mime_type, original_file_hash,
+        watermark_id, watermark_code,
+        metadata, metadata_hash, source_created_at,
+        signed_at, signer_cert_thumbprint, signer_name,
+        issued_file_hash, processing_status
+    )
+    VALUES (
+        $1, $2, $3,
+        $4,
+        $5, $6,
+        $7, $8,
+        $9::jsonb, $10, $11,
+        $12, $13, $14,
+        $15, 'processing'
+    )
+"""
+
+
+def file_row(record_id: str, user_id: str, original_filename: str, mime_type: Optional[str], ingested: IngestedFile, issued: IssuedFile, *, is_pdf: bool, metadata: dict) -> tuple:
+    """Parameters of INSERT_FILE_SQL for one issued upload."""
+    # For PDFs, store the hash of the final produced file (signed/sanitized).
+    file_hash = (issued.sha256 or ingested.sha256) if is_pdf else ingested.sha256
+    return (
+        record_id,
+        user_id,
+        original_filename,
+        os.path.basename(issued.path),
+        mime_type,
+        file_hash,
+        issued.watermark_id,
+        issued.watermark_code,
+        json.dumps(metadata),
+        canonical_metadata_hash(metadata),
+        datetime.fromisoformat(metadata["createdDate"]).date(),
+        issued.signed_at,
+        issued.signer_cert_thumbprint,
+        None,
+        issued.sha256,
+    )
+
+
+def fingerprint_job_payload(record_id: str, issued: IssuedFile, *, is_pdf: bool) -> dict:
+    return {"file_id": record_id, "stored_filename": os.path.basename(issued.path), "is_pdf": bool(is_pdf)}
+
+
 @router.post("/upload")
 async def upload_file(
     request: Request,
@@ -93,186 +273,129 @@ async def upload_file(
         # Save file to temp
         filename = f"{uuid4().hex}_{file.filename}"
         temp_path = os.path.join(UPLOAD_DIR, filename)
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        ingested = await ingest_upload(file, temp_path)
 
-        # Hash and metadata
-        file_hash = compute_sha256(temp_path)
         metadata = {
             "title": title,
             "author": author,
             "createdDate": createdDate,
             "organization": organization
         }
-        metadata_hash = canonical_metadata_hash(metadata)
-
-        # Generate watermark id/code for tracking (used for images and documents)
-        watermark_id = uuid4().hex
-        watermark_code = "WMK-" + watermark_id[:12].upper()
-
-        is_pdf = file.filename.lower().endswith(".pdf") or file.content_type == "application/pdf"
-        watermarked_path = temp_path
-
-        if is_pdf:
-            # For PDFs we do NOT embed an image watermark. Optionally sign if PKCS#12 configured.
-            p12_path, p12_pass = _resolve_pdf_signing_config()
-            try:
-                if p12_path:
-                    signed_path = os.path.join(UPLOAD_DIR, f"SIGNED_{uuid4().hex}_{file.filename}")
-                    try:
-                        res = await sign_pdf_with_pkcs12_async(p12_path, p12_pass, temp_path, signed_path)
-                    except Exception as e:
-                        err = str(e) or ""
-                        # If the error looks like hybrid xref issues, try to sanitize using PyMuPDF
-                        if fitz is not None and "hybrid" in err.lower():
-                            try:
-                                sanitized = os.path.join(UPLOAD_DIR, f"SAN_{uuid4().hex}_{file.filename}")
-                                doc = fitz.open(temp_path)
-                                doc.save(sanitized, incremental=False)
-                                doc.close()
-                                res = await sign_pdf_with_pkcs12_async(p12_path, p12_pass, sanitized, signed_path)
-                                temp_path = sanitized
-                            except Exception as e2:
-                                print(f"PDF signing failed after sanitization for {file.filename}: {e2}")
-                                raise
-                        else:
-                            print(f"PDF signing failed for {file.filename}: {e}")
-                            raise
-
-                    watermarked_path = signed_path
-                    signer_cert_thumbprint = res.get("signer_cert_thumbprint")
-                    signed_at = res.get("signed_at")
-                    # Defensive: older signer implementations returned ISO strings.
-                    if isinstance(signed_at, str):
-                        try:
-                            signed_at = datetime.fromisoformat(signed_at)
-                        except Exception:
-                            signed_at = None
-                else:
-                    signer_cert_thumbprint = None
-                    signed_at = None
-            except Exception:
-                # Don't silently swallow signing failures: it makes PAdES "randomly" fail.
-                # We continue without a signature, but log so it's diagnosable.
-                signer_cert_thumbprint = None
-                signed_at = None
-
-            # compute per-page hashes for scanned PDFs (store as JSONB)
-            try:
-                per_page_hashes = rasterize_pages_and_hashes(watermarked_path, dpi=150, max_pages=10)
-            except Exception:
-                per_page_hashes = None
-
-            # Compute a lightweight text fingerprint for the PDF content.
-            # Prefer embedded text (cheap); fallback to OCR (slower) if needed.
-            pdf_text_simhash = None
-            try:
-                text = ""
-                if fitz is not None:
-                    try:
-                        doc = fitz.open(watermarked_path)
-                        parts = []
-                        for i in range(min(3, doc.page_count)):
-                            try:
-                                parts.append(doc.load_page(i).get_text("text") or "")
-                            except Exception:
-                                continue
-                        doc.close()
-                        text = "\n".join(parts)
-                    except Exception:
-                        text = ""
-
-                if not (text or "").strip():
-                    try:
-                        ocr_pages = extract_text_from_pdf(watermarked_path, dpi=150, max_pages=3)
-                        text = "\n".join([t for t in ocr_pages if t])
-                    except Exception:
-                        text = ""
-
-                pdf_text_simhash = simhash64_hex(text)
-            except Exception:
-                pdf_text_simhash = None
 
+        # Trust magic bytes over the client's filename/Content-Type when they are recognised.
+        if ingested.mime_type:
+            is_pdf = ingested.is_pdf
         else:
-            # Embed watermark for images
-            watermarked_path, watermark_id, watermark_code = embed_watermark_ai(
-                temp_path, str(user["id"]), metadata
+            is_pdf = file.filename.lower().endswith(".pdf") or file.content_type == "application/pdf"
+
+        issued = await issue_file(ingested, file.filename, is_pdf=is_pdf, user_id=str(user["id"]), metadata=metadata)
+
+        # Save in DB. Fingerprints (page dHashes, text simhash, image dHash) are
+        # computed by a background job; the row is 'processing' until it finishes.
+        record_id = str(uuid4())
+        async with db.transaction() as conn:
+            await conn.execute(
+                INSERT_FILE_SQL,
+                *file_row(
+                    record_id,
+                    str(user["id"]),
+                    file.filename,
+                    ingested.mime_type or file.content_type,
+                    ingested,
+                    issued,
+                    is_pdf=is_pdf,
+                    metadata=metadata,
+                ),
             )
-            signer_cert_thumbprint = None
-            signed_at = None
-            per_page_hashes = None
-            pdf_text_simhash = None
-
-        perceptual_hash = None
-        try:
-            perceptual_hash = dhash_path(watermarked_path) if not is_pdf else None
-        except Exception:
-            perceptual_hash = None
-
-        stored_filename = os.path.basename(watermarked_path) if watermarked_path else None
-
-        # For PDFs, store the hash of the final produced file (signed/sanitized).
-        # This allows `/verify` to map a downloaded signed PDF back to its DB row.
-        if is_pdf:
-            try:
-                file_hash = compute_sha256(watermarked_path)
-            except Exception:
-                pass
-
-        # Save in DB
-        await db.execute(
-            """
-            INSERT INTO watermarked_files (
-                id, user_id, original_filename,
-                stored_filename,
-                mime_type, original_file_hash,
-                watermark_id, watermark_code,
-                perceptual_hash,
-                pdf_text_simhash,
-                metadata, metadata_hash, source_created_at,
-                signed_at, signer_cert_thumbprint, signer_name, per_page_hashes
-            )
-            VALUES (
-                $1, $2, $3,
-                $4,
-                $5, $6,
-                $7, $8,
-                $9,
-                $10,
-                $11::jsonb, $12, $13,
-                $14, $15, $16, $17
+            job_id = await enqueue_job(
+                FINGERPRINT_JOB,
+                fingerprint_job_payload(record_id, issued, is_pdf=is_pdf),
+                user_id=str(user["id"]),
+                file_id=record_id,
+                conn=conn,
             )
-            """,
-            *(
-                str(uuid4()),
-                str(user["id"]),
-                file.filename,
-                stored_filename,
-                file.content_type,
-                file_hash,
-                watermark_id,
-                watermark_code,
-                perceptual_hash,
-                pdf_text_simhash,
-                json.dumps(metadata),
-                metadata_hash,
-                datetime.fromisoformat(createdDate).date(),
-                signed_at,
-                signer_cert_thumbprint,
-                None,
-                json.dumps(per_page_hashes) if per_page_hashes is not None else None,
-            ),
-        )
+        job_runner.notify()
 
+        # A new record can turn cached "no match"/perceptual results stale.
+        await verify_cache.drop_volatile()
 
         return JSONResponse({
             "message": "File successfully watermarked.",
-            "watermark_id": watermark_id,
-            "watermark_code": watermark_code,
+            "watermark_id": issued.watermark_id,
+            "watermark_code": issued.watermark_code,
             "original_filename": file.filename,
-            "stored_filename": stored_filename,
-            "download_url": str(request.base_url) + f"files/{os.path.basename(watermarked_path)}"
+            "stored_filename": os.path.basename(issued.path),
+            "download_url": str(request.base_url) + f"files/{os.path.basename(issued.path)}",
+            "processing_status": "processing",
+            "job_id": job_id,
+            "status_url": str(request.base_url) + f"jobs/{job_id}",
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@job_handler(FINGERPRINT_JOB)
+async def fingerprint_upload(job: JobContext) -> dict:
+    """Compute and store the matching fingerprints of an uploaded file.
+
+    PDFs: per-page dHashes (watermarked_file_pages) and the text simhash, from one
+    pass over the issued PDF (embedded text first, OCR for scanned pages). Images:
+    the dHash of the watermarked image. Safe to re-run: page rows are replaced.
+    """
+    file_id = job.payload["file_id"]
+    path = os.path.join(UPLOAD_DIR, job.payload["stored_filename"])
+    try:
+        per_page_hashes = None
+        text_simhash = None
+        perceptual_hash = None
+        if job.payload.get("is_pdf"):
+            await job.progress(0.1, "analyzing pages")
+            analysis = await analyze_pdf_parallel(path, dpi=150, hash_pages=10, text_pages=3)
+            per_page_hashes = analysis.page_hashes
+            text_simhash = analysis.text_simhash
+        else:
+            await job.progress(0.1, "hashing image")
+            perceptual_hash = await worker_pool.run(dhash_path, path)
+
+        await job.progress(0.8, "storing fingerprints")
+        async with db.transaction() as conn:
+            await conn.execute(
+                """
+                UPDATE watermarked_files
+                SET perceptual_hash=$2, perceptual_hash_i64=$3,
+                    pdf_text_simhash=$4, pdf_text_simhash_i64=$5,
+                    processing_status='ready'
+                WHERE id=$1
+                """,
+                file_id,
+                perceptual_hash,
+                hex64_to_int64(perceptual_hash) if perceptual_hash else None,
+                text_simhash,
+                hex64_to_int64(text_simhash) if text_simhash else None,
+            )
+            await conn.execute("DELETE FROM watermarked_file_pages WHERE file_id=$1", file_id)
+            if per_page_hashes:
+                await conn.execute(
+                    """
+                    INSERT INTO watermarked_file_pages (file_id, page_no, dhash)
+                    SELECT $1, p.page_no - 1, p.dhash
+                    FROM unnest($2::bigint[]) WITH ORDINALITY AS p(dhash, page_no)
+                    """,
+                    file_id,
+                    [hex64_to_int64(h) for h in per_page_hashes],
+                )
+    except Exception:
+        if job.final_attempt:
+            await db.execute("UPDATE watermarked_files SET processing_status='failed' WHERE id=$1", file_id)
+        raise
+
+    # New fingerprints can change perceptual/no-match results.
+    await verify_cache.drop_volatile()
+    return {
+        "pages": len(per_page_hashes or []),
+        "text_simhash": text_simhash is not None,
+        "perceptual_hash": perceptual_hash is not None,
+    }
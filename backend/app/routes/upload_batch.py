@@ -0,0 +1,309 @@
+# app/routes/upload_batch.py
+import asyncio
+import json
+import mimetypes
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.auth.jwt import get_current_user
+from app.config import BATCH_INSERT_SIZE, BATCH_MAX_FILES, BATCH_PIPELINE_DEPTH, MAX_UPLOAD_BYTES, WORKER_POOL_SIZE
+from app.database import db
+from app.ingest import ingest_stream, sniff_mime
+from app.jobs import enqueue_jobs, job_runner
+from app.routes.upload import (
+    FINGERPRINT_JOB,
+    INSERT_FILE_SQL,
+    UPLOAD_DIR,
+    file_row,
+    fingerprint_job_payload,
+    issue_file,
+)
+from app.verify_cache import verify_cache
+
+router = APIRouter()
+
+BATCH_DONE = object()
+
+
+def _safe_name(name: Optional[str]) -> str:
+    # Zip members and client filenames may carry directories ("../x.png"); keep the base name.
+    return os.path.basename((name or "").replace("\\", "/")).strip() or "upload"
+
+
+def _peek(src) -> bytes:
+    head = src.read(8)
+    src.seek(0)
+    return head
+
+
+def _ingest_entry(index: int, name: str, src) -> dict:
+    dst = os.path.join(UPLOAD_DIR, f"{uuid4().hex}_{name}")
+    try:
+        ingested = ingest_stream(src, dst, max_bytes=MAX_UPLOAD_BYTES)
+    except Exception as e:
+        return {"index": index, "filename": name, "error": f"could not read file: {e}"}
+    if ingested is None:
+        return {"index": index, "filename": name, "error": f"File too large (limit {MAX_UPLOAD_BYTES} bytes)"}
+    return {"index": index, "filename": name, "ingested": ingested}
+
+
+def _ingest_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, index: int) -> dict:
+    name = _safe_name(info.filename)
+    if info.file_size > MAX_UPLOAD_BYTES:
+        return {"index": index, "filename": name, "error": f"File too large (limit {MAX_UPLOAD_BYTES} bytes)"}
+    with archive.open(info) as src:
+        return _ingest_entry(index, name, src)
+
+
+def _archive_members(archive: zipfile.ZipFile) -> list:
+    return [
+        info
+        for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not _safe_name(info.filename).startswith(".")
+    ]
+
+
+async def read_batch_files(files: List[UploadFile], out: asyncio.Queue, consumers: int) -> None:
+    """Read stage: parts and zip members, one at a time, to disk (hash + MIME sniff).
+
+    Ends with one `BATCH_DONE` per consumer. Also used by /verify/batch.
+    """
+    index = 0
+    skipped = False
+    for upload in files:
+        if index >= BATCH_MAX_FILES:
+            skipped = True
+            break
+        name = _safe_name(upload.filename)
+        head = await run_in_threadpool(_peek, upload.file)
+        if sniff_mime(head) == "application/zip" or name.lower().endswith(".zip"):
+            try:
+                archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+            except zipfile.BadZipFile:
+                await out.put({"index": index, "filename": name, "error": "not a valid zip archive"})
+                index += 1
+                continue
+            with archive:
+                for info in await run_in_threadpool(_archive_members, archive):
+                    if index >= BATCH_MAX_FILES:
+                        skipped = True
+                        break
+                    await out.put(await run_in_threadpool(_ingest_member, archive, info, index))
+                    index += 1
+        else:
+            await out.put(await run_in_threadpool(_ingest_entry, index, name, upload.file))
+            index += 1
+        if skipped:
+            break
+    if skipped:
+        await out.put({"index": index, "filename": None, "error": f"batch limit of {BATCH_MAX_FILES} files reached; rest skipped"})
+    for _ in range(consumers):
+        await out.put(BATCH_DONE)
+
+
+def _remove_quietly(path: Optional[str]) -> None:
+    try:
+        if path:
+            os.remove(path)
+    except Exception:
+        pass
+
+
+def _discard(item) -> None:
+    """Remove the files of an item that will not be stored (failed, unsupported or never reached)."""
+    if not isinstance(item, dict) or "issued" in item:
+        return
+    ingested = item.get("ingested")
+    if ingested is not None:
+        _remove_quietly(ingested.path)
+
+
+async def _issue_stage(src: asyncio.Queue, out: asyncio.Queue, *, user_id: str, metadata: dict, title: Optional[str]) -> None:
+    """Embed/sign + hash stage; several run concurrently, each feeding the worker pool."""
+    while True:
+        item = await src.get()
+        if item is BATCH_DONE:
+            return
+        ingested = item.get("ingested")
+        if ingested is not None:
+            name = item["filename"]
+            if ingested.mime_type:
+                is_pdf = ingested.is_pdf
+                supported = is_pdf or ingested.mime_type.startswith("image/")
+            else:
+                is_pdf = name.lower().endswith(".pdf")
+                supported = is_pdf or (mimetypes.guess_type(name)[0] or "").startswith("image/")
+            if not supported:
+                item = {**item, "error": f"unsupported file type {ingested.mime_type or os.path.splitext(name)[1]}"}
+            else:
+                file_metadata = {**metadata, "title": title or os.path.splitext(name)[0]}
+                try:
+                    issued = await issue_file(ingested, name, is_pdf=is_pdf, user_id=user_id, metadata=file_metadata)
+                    item = {**item, "issued": issued, "is_pdf": is_pdf, "metadata": file_metadata}
+                except Exception as e:
+                    item = {**item, "error": str(e) or type(e).__name__}
+        await out.put(item)
+
+
+async def _store(items: list, *, user_id: str) -> list:
+    """Insert the issued files of one chunk (one transaction, executemany) and queue their fingerprint jobs."""
+    ok = [item for item in items if "issued" in item]
+    if ok:
+        record_ids = [str(uuid4()) for _ in ok]
+        rows = [
+            file_row(
+                record_id,
+                user_id,
+                item["filename"],
+                item["ingested"].mime_type,
+                item["ingested"],
+                item["issued"],
+                is_pdf=item["is_pdf"],
+                metadata=item["metadata"],
+            )
+            for record_id, item in zip(record_ids, ok)
+        ]
+        try:
+            async with db.transaction() as conn:
+                await conn.executemany(INSERT_FILE_SQL, rows)
+                job_ids = await enqueue_jobs(
+                    FINGERPRINT_JOB,
+                    [
+                        (fingerprint_job_payload(record_id, item["issued"], is_pdf=item["is_pdf"]), user_id, record_id)
+                        for record_id, item in zip(record_ids, ok)
+                    ],
+                    conn=conn,
+                )
+        except Exception as e:
+            for item in ok:
+                issued = item.pop("issued")
+                if issued.path != item["ingested"].path:
+                    _remove_quietly(issued.path)
+                item["error"] = f"could not store record: {e}"
+        else:
+            job_runner.notify()
+            for job_id, item in zip(job_ids, ok):
+                item["job_id"] = job_id
+    return items
+
+
+def _result_line(item: dict, base_url: str) -> bytes:
+    if "issued" in item:
+        issued = item["issued"]
+        stored = os.path.basename(issued.path)
+        out = {
+            "index": item["index"],
+            "filename": item["filename"],
+            "ok": True,
+            "watermark_id": issued.watermark_id,
+            "watermark_code": issued.watermark_code,
+            "stored_filename": stored,
+            "download_url": base_url + f"files/{stored}",
+            "processing_status": "processing",
+            "job_id": item["job_id"],
+        }
+    else:
+        out = {"index": item["index"], "filename": item["filename"], "ok": False, "error": item.get("error")}
+    return (json.dumps(out) + "\n").encode("utf-8")
+
+
+@router.post("/upload/batch")
+async def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    author: str = Form(...),
+    createdDate: str = Form(...),
+    organization: str = Form(""),
+    title: Optional[str] = Form(None),
+    user=Depends(get_current_user),
+):
+    """Watermark/sign many files in one request; results stream back as NDJSON.
+
+    Parts may be images, PDFs or zip archives of them. Metadata is shared; `title`
+    defaults to each file's name. Files flow through a bounded pipeline
+    (read -> embed/sign + hash -> insert): reading stays at most
+    BATCH_PIPELINE_DEPTH files ahead, embedding runs WORKER_POOL_SIZE files at a
+    time, and rows are inserted up to BATCH_INSERT_SIZE per transaction. Each line is
+    one file's result (in completion order, with its `index`); the last line is a
+    summary. Fingerprints are computed by background jobs, as for /upload.
+    """
+    try:
+        datetime.fromisoformat(createdDate)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="createdDate must be an ISO date")
+
+    user_id = str(user["id"])
+    metadata = {"author": author, "createdDate": createdDate, "organization": organization}
+    base_url = str(request.base_url)
+    consumers = max(1, WORKER_POOL_SIZE)
+
+    async def results():
+        started = time.perf_counter()
+        to_issue: asyncio.Queue = asyncio.Queue(maxsize=max(1, BATCH_PIPELINE_DEPTH))
+        issued: asyncio.Queue = asyncio.Queue(maxsize=max(1, BATCH_PIPELINE_DEPTH))
+        reader = asyncio.create_task(read_batch_files(files, to_issue, consumers))
+        issuers = [
+            asyncio.create_task(_issue_stage(to_issue, issued, user_id=user_id, metadata=metadata, title=title))
+            for _ in range(consumers)
+        ]
+
+        async def close_issued():
+            await asyncio.gather(*issuers)
+            await issued.put(BATCH_DONE)
+
+        closer = asyncio.create_task(close_issued())
+        counts = {"files": 0, "ok": 0, "failed": 0}
+        try:
+            done = False
+            while not done:
+                chunk = [await issued.get()]
+                while len(chunk) < BATCH_INSERT_SIZE and not issued.empty():
+                    chunk.append(issued.get_nowait())
+                if chunk[-1] is BATCH_DONE:
+                    chunk.pop()
+                    done = True
+                for item in await _store(chunk, user_id=user_id):
+                    _discard(item)
+                    counts["files"] += 1
+                    counts["ok" if "issued" in item else "failed"] += 1
+                    yield _result_line(item, base_url)
+            await reader
+            if counts["ok"]:
+                # New records can turn cached "no match"/perceptual results stale.
+                await verify_cache.drop_volatile()
+            elapsed = time.perf_counter() - started
+            yield (
+                json.dumps(
+                    {
+                        "summary": {
+                            **counts,
+                            "elapsed_s": round(elapsed, 3),
+                            "files_per_s": round(counts["files"] / elapsed, 2) if elapsed > 0 else None,
+                        }
+                    }
+                )
+                + "\n"
+            ).encode("utf-8")
+        finally:
+            for task in (reader, *issuers, closer):
+                task.cancel()
+            await asyncio.gather(reader, *issuers, closer, return_exceptions=True)
+            # Files still queued when the client went away.
+            for queue in (to_issue, issued):
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    if isinstance(item, dict) and "issued" in item:
+                        _remove_quietly(item.pop("issued").path)
+                    _discard(item)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
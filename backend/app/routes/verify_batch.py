@@ -0,0 +1,226 @@
+# app/routes/verify_batch.py
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.ai.embed import extract_watermark_ai
+from app.ai.fingerprint import dhash_path
+from app.config import BATCH_INSERT_SIZE, BATCH_PIPELINE_DEPTH, WORKER_POOL_SIZE
+from app.pades import signing_material
+from app.perceptual_index import PdfCandidateIndex
+from app.routes.upload_batch import BATCH_DONE, read_batch_files
+from app.routes.verify import (
+    PDF_CANDIDATE_WINDOW,
+    VERIFY_ALGO_VERSION,
+    exact_hash_result,
+    find_issued_files,
+    find_watermarked_files,
+    image_result,
+    verify_pdf,
+)
+from app.verify_cache import verify_cache
+from app.workers import worker_pool
+
+router = APIRouter()
+
+
+def _error_text(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return str(e) or type(e).__name__
+
+
+def _discard(item) -> None:
+    ingested = item.get("ingested") if isinstance(item, dict) else None
+    if ingested is not None:
+        try:
+            os.remove(ingested.path)
+        except Exception:
+            pass
+
+
+async def _take_chunk(src: asyncio.Queue) -> tuple:
+    """Up to BATCH_INSERT_SIZE items already waiting (at least one); True once BATCH_DONE is seen."""
+    chunk = [await src.get()]
+    while len(chunk) < BATCH_INSERT_SIZE and not src.empty():
+        chunk.append(src.get_nowait())
+    if chunk[-1] is BATCH_DONE:
+        chunk.pop()
+        return chunk, True
+    return chunk, False
+
+
+async def _triage_stage(src: asyncio.Queue, probe: asyncio.Queue, out: asyncio.Queue, *, consumers: int, full: bool) -> None:
+    """Exact-hash (one query per chunk) and result-cache lookups; the rest go on to extraction."""
+    done = False
+    while not done:
+        chunk, done = await _take_chunk(src)
+        files = [item for item in chunk if "ingested" in item]
+        issued = {}
+        if files and not full:
+            try:
+                issued = await find_issued_files([item["ingested"].sha256 for item in files])
+            except Exception:
+                issued = {}
+        for item in chunk:
+            ingested = item.get("ingested")
+            if ingested is None:
+                await out.put(item)
+                continue
+            is_pdf = ingested.is_pdf if ingested.mime_type else item["filename"].lower().endswith(".pdf")
+            record = issued.get(ingested.sha256)
+            if record is not None:
+                await out.put({**item, "result": exact_hash_result(record, sha256=ingested.sha256, is_pdf=is_pdf)})
+                continue
+            trust = signing_material.trust_fingerprint() if is_pdf else None
+            cache_key = verify_cache.key(ingested.sha256, algo_version=VERIFY_ALGO_VERSION, full=full, trust=trust)
+            cached = await verify_cache.get(cache_key)
+            if cached is not None:
+                await out.put({**item, "result": cached})
+                continue
+            await probe.put({**item, "is_pdf": is_pdf, "cache_key": cache_key})
+    for _ in range(consumers):
+        await probe.put(BATCH_DONE)
+
+
+async def _probe_stage(src: asyncio.Queue, out: asyncio.Queue, *, candidates: PdfCandidateIndex) -> None:
+    """Watermark/dHash extraction for images, the full PDF flow for PDFs; several run concurrently."""
+    while True:
+        item = await src.get()
+        if item is BATCH_DONE:
+            return
+        path = item["ingested"].path
+        try:
+            if item["is_pdf"]:
+                response = await verify_pdf(
+                    path,
+                    sha256=item["ingested"].sha256,
+                    filename=item["filename"],
+                    debug=False,
+                    candidate_index=candidates,
+                )
+                result = json.loads(response.body)
+                if response.status_code == 200:
+                    await verify_cache.put(item["cache_key"], result)
+                item = {**item, "result": result}
+            else:
+                extracted = await worker_pool.run(extract_watermark_ai, path)
+                query_hash = None
+                if not extracted.get("valid"):
+                    try:
+                        query_hash = await worker_pool.run(dhash_path, path)
+                    except Exception:
+                        query_hash = None
+                item = {**item, "extracted": extracted, "query_hash": query_hash}
+        except Exception as e:
+            item = {**item, "error": _error_text(e)}
+        await out.put(item)
+
+
+async def _resolve(items: list) -> list:
+    """Finish the image results of one chunk: every decoded watermark id is looked up in one query."""
+    pending = [item for item in items if "extracted" in item]
+    wanted = {item["extracted"].get("watermark_id") for item in pending if item["extracted"].get("valid")}
+    wanted.discard(None)
+    records = {}
+    if wanted:
+        try:
+            records = await find_watermarked_files(list(wanted))
+        except Exception as e:
+            for item in pending:
+                item.pop("extracted")
+                item["error"] = f"could not look up watermarks: {_error_text(e)}"
+            return items
+    for item in pending:
+        extracted = item.pop("extracted")
+        record = records.get(extracted.get("watermark_id")) if extracted.get("valid") else None
+        try:
+            response = await image_result(item["ingested"].path, extracted, record, query_hash=item.pop("query_hash"))
+            item["result"] = json.loads(response.body)
+            if response.status_code == 200:
+                await verify_cache.put(item["cache_key"], item["result"])
+        except Exception as e:
+            item["error"] = _error_text(e)
+    return items
+
+
+def _result_line(item: dict) -> bytes:
+    if "result" in item:
+        out = {"index": item["index"], "filename": item["filename"], "ok": True, **item["result"]}
+    else:
+        out = {"index": item["index"], "filename": item["filename"], "ok": False, "error": item.get("error")}
+    return (json.dumps(out) + "\n").encode("utf-8")
+
+
+@router.post("/verify/batch")
+async def verify_batch(files: List[UploadFile] = File(...), full: bool = False):
+    """Verify many files in one request; results stream back as NDJSON.
+
+    Parts may be images, PDFs or zip archives of them. Each line is one file's
+    /verify response plus its `index`, `filename` and `ok` (false when the file
+    could not be checked, with `error`), in completion order; the last line is a
+    summary. Work is shared across the batch: exact-hash lookups run one query per
+    chunk of up to BATCH_INSERT_SIZE files, watermarks and fingerprints are
+    extracted WORKER_POOL_SIZE files at a time, decoded image watermark ids are
+    resolved with one query per chunk, and every PDF is scored against one
+    candidate index loaded once for the request.
+    """
+    consumers = max(1, WORKER_POOL_SIZE)
+
+    async def results():
+        started = time.perf_counter()
+        depth = max(1, BATCH_PIPELINE_DEPTH)
+        to_triage: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        to_probe: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        resolved: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        candidates = PdfCandidateIndex(window=PDF_CANDIDATE_WINDOW)
+        reader = asyncio.create_task(read_batch_files(files, to_triage, 1))
+        triage = asyncio.create_task(_triage_stage(to_triage, to_probe, resolved, consumers=consumers, full=full))
+        probers = [asyncio.create_task(_probe_stage(to_probe, resolved, candidates=candidates)) for _ in range(consumers)]
+
+        async def close_resolved():
+            await asyncio.gather(triage, *probers)
+            await resolved.put(BATCH_DONE)
+
+        closer = asyncio.create_task(close_resolved())
+        counts = {"files": 0, "ok": 0, "failed": 0, "valid": 0}
+        try:
+            done = False
+            while not done:
+                chunk, done = await _take_chunk(resolved)
+                for item in await _resolve(chunk):
+                    _discard(item)
+                    counts["files"] += 1
+                    counts["ok" if "result" in item else "failed"] += 1
+                    counts["valid"] += bool(item.get("result", {}).get("valid"))
+                    yield _result_line(item)
+            await reader
+            elapsed = time.perf_counter() - started
+            yield (
+                json.dumps(
+                    {
+                        "summary": {
+                            **counts,
+                            "elapsed_s": round(elapsed, 3),
+                            "files_per_s": round(counts["files"] / elapsed, 2) if elapsed > 0 else None,
+                        }
+                    }
+                )
+                + "\n"
+            ).encode("utf-8")
+        finally:
+            tasks = (reader, triage, *probers, closer)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Files still queued when the client went away.
+            for queue in (to_triage, to_probe, resolved):
+                while not queue.empty():
+                    _discard(queue.get_nowait())
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,267 @@
+# app/verify_cache.py
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.database import db
+
+
+class MemoryCacheBackend:
+    """Per-process LRU with per-entry expiry."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: dict, ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def delete_volatile(self) -> None:
+        for key in [k for k, (_, entry) in self._entries.items() if entry.get("volatile")]:
+            del self._entries[key]
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class PostgresCacheBackend:
+    """Shared across workers and instances: the UNLOGGED `verify_cache` table.
+
+    Any Postgres reachable through `app.database.db` works, so the local dev
+    database doubles as the stand-in for a dedicated cache server.
+    """
+
+    name = "postgres"
+    _PRUNE_EVERY = 64
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, int(max_entries))
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        row = await db.fetch_one(
+            """
+            UPDATE verify_cache SET last_used_at = now()
+            WHERE key=$1 AND expires_at > now()
+            RETURNING entry
+            """,
+            key,
+        )
+        if row is None:
+            return None
+        entry = row["entry"]
+        return json.loads(entry) if isinstance(entry, str) else entry
+
+    async def set(self, key: str, entry: dict, ttl: float) -> None:
+        await db.execute(
+            """
+            INSERT INTO verify_cache (key, entry, volatile, expires_at, last_used_at)
+            VALUES ($1, $2::jsonb, $3, now() + make_interval(secs => $4), now())
+            ON CONFLICT (key) DO UPDATE
+            SET entry = EXCLUDED.entry, volatile = EXCLUDED.volatile,
+                expires_at = EXCLUDED.expires_at, last_used_at = EXCLUDED.last_used_at
+            """,
+            key,
+            json.dumps(entry),
+            bool(entry.get("volatile")),
+            float(ttl),
+        )
+        self._writes += 1
+        if self._writes % self._PRUNE_EVERY == 0:
+            await self._prune()
+
+    async def _prune(self) -> None:
+        await db.execute("DELETE FROM verify_cache WHERE expires_at <= now()")
+        await db.execute(
+            """
+            DELETE FROM verify_cache WHERE key IN (
+                SELECT key FROM verify_cache ORDER BY last_used_at DESC OFFSET $1
+            )
+            """,
+            self.max_entries,
+        )
+
+    async def delete(self, key: str) -> None:
+        await db.execute("DELETE FROM verify_cache WHERE key=$1", key)
+
+    async def delete_volatile(self) -> None:
+        await db.execute("DELETE FROM verify_cache WHERE volatile")
+
+    async def size(self) -> int:
+        row = await db.fetch_one("SELECT count(*) AS n FROM verify_cache WHERE expires_at > now()")
+        return int(row["n"]) if row else 0
+
+
+def build_cache_backend(kind: str, max_entries: int):
+    """Backend for VERIFY_CACHE_BACKEND: "memory", "postgres", or "off"/"" (None)."""
+    kind = (kind or "").strip().lower()
+    if kind in ("", "off", "none"):
+        return None
+    if kind == "memory":
+        return MemoryCacheBackend(max_entries)
+    if kind == "postgres":
+        return PostgresCacheBackend(max_entries)
+    raise ValueError(f"unknown verify cache backend {kind!r}")
+
+
+class VerifyCache:
+    """`/verify` responses keyed by the uploaded file's SHA-256 and algorithm version.
+
+    Each entry remembers the `watermarked_files` rows it describes (by watermark_id)
+    together with the row and owner versions (`xmin`). A hit is only served while those
+    are unchanged, so updates and deletes invalidate entries in every process.
+    Results that are not authoritative (perceptual matches, no match) also depend on
+    rows that did not exist yet; they are kept `volatile`: a short TTL, and tagged with
+    the upload generation (the `verify_cache_generation` sequence, bumped by every
+    upload) read before they were computed. A volatile hit from an older generation is
+    dropped, so uploads handled by any process invalidate them everywhere.
+
+    A backend provides async `get`, `set(key, entry, ttl)`, `delete`,
+    `delete_volatile` and `size`; entries are plain JSON-able dicts.
+    """
+
+    _MAX_PENDING = 4096
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 3600.0
+        self.volatile_ttl = 60.0
+        self._counts = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "errors": 0}
+        # Generation seen at each recent miss, so put() tags results with the state
+        # they were computed from rather than the (possibly newer) one at store time.
+        self._miss_generations: dict[str, Optional[int]] = {}
+
+    def configure(self, backend, *, ttl: float, volatile_ttl: float) -> None:
+        self.backend = backend
+        self.ttl = float(ttl)
+        self.volatile_ttl = float(volatile_ttl)
+
+    @staticmethod
+    def key(sha256: str, *, algo_version: int, trust: Optional[str] = None, **flags) -> str:
+        """Cache key of one verify request. PDF results depend on the PAdES trust roots:
+        pass `trust` (`signing_material.trust_fingerprint()`) so a new keystore misses."""
+        extra = ",".join(f"{k}={int(bool(v))}" for k, v in sorted(flags.items()))
+        key = f"verify:v{algo_version}:{sha256}:{extra}"
+        return f"{key}:trust={trust}" if trust else key
+
+    @staticmethod
+    def _referenced_ids(response: dict) -> list[str]:
+        ids = [response.get("watermark_id")]
+        ids.extend((c or {}).get("watermark_id") for c in response.get("candidates") or [])
+        return sorted({i for i in ids if i})
+
+    @staticmethod
+    async def _row_versions(watermark_ids: list[str]) -> dict[str, str]:
+        if not watermark_ids:
+            return {}
+        rows = await db.fetch_all(
+            """
+            SELECT wf.watermark_id, wf.xmin::text || ':' || u.xmin::text AS version
+            FROM watermarked_files wf
+            JOIN users u ON u.id = wf.user_id
+            WHERE wf.watermark_id = ANY($1::text[])
+            """,
+            watermark_ids,
+        )
+        return {row["watermark_id"]: row["version"] for row in rows}
+
+    @staticmethod
+    async def _generation() -> int:
+        row = await db.fetch_one(
+            "SELECT CASE WHEN is_called THEN last_value ELSE 0 END AS generation FROM verify_cache_generation"
+        )
+        return int(row["generation"])
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Cached response for `key`, or None (miss, expired, rows changed, or an
+        upload happened since a volatile result was stored)."""
+        if self.backend is None:
+            return None
+        generation = None
+        try:
+            generation = await self._generation()
+            entry = await self.backend.get(key)
+            if entry is not None:
+                versions = entry.get("versions") or {}
+                stale = entry.get("volatile") and entry.get("generation") != generation
+                if stale or (versions and await self._row_versions(sorted(versions)) != versions):
+                    await self.backend.delete(key)
+                    self._counts["invalidations"] += 1
+                    entry = None
+        except Exception:
+            self._counts["errors"] += 1
+            entry = None
+        if entry is None:
+            self._counts["misses"] += 1
+            if len(self._miss_generations) >= self._MAX_PENDING:
+                del self._miss_generations[next(iter(self._miss_generations))]
+            self._miss_generations[key] = generation
+            return None
+        self._counts["hits"] += 1
+        return entry["response"]
+
+    async def put(self, key: str, response: dict) -> None:
+        if self.backend is None:
+            return
+        try:
+            volatile = response.get("valid") is not True
+            entry = {
+                "response": response,
+                "versions": await self._row_versions(self._referenced_ids(response)),
+                "volatile": volatile,
+            }
+            if volatile:
+                # Unknown (no prior miss, or the lookup failed) never matches a generation.
+                entry["generation"] = self._miss_generations.pop(key, None)
+            await self.backend.set(key, entry, self.volatile_ttl if volatile else self.ttl)
+            self._counts["stores"] += 1
+        except Exception:
+            self._counts["errors"] += 1
+
+    async def drop_volatile(self) -> None:
+        """Forget results that a newly uploaded file could change, in every process."""
+        if self.backend is None:
+            return
+        try:
+            await db.fetch_one("SELECT nextval('verify_cache_generation')")
+            await self.backend.delete_volatile()
+        except Exception:
+            self._counts["errors"] += 1
+
+    async def stats(self) -> dict:
+        size = None
+        if self.backend is not None:
+            try:
+                size = await self.backend.size()
+            except Exception:
+                size = None
+        lookups = self._counts["hits"] + self._counts["misses"]
+        return {
+            "backend": self.backend.name if self.backend is not None else None,
+            **self._counts,
+            "hit_rate": self._counts["hits"] / lookups if lookups else None,
+            "size": size,
+        }
+
+
+verify_cache = VerifyCache()
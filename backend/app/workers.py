@@ -0,0 +1,115 @@
+# app/workers.py
+import asyncio
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict) -> tuple[Any, float, float]:
+    """Runs inside the worker process; returns (result, started_at, finished_at)."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started, time.time()
+
+
+class WorkerPool:
+    """Process pool for CPU-bound `app.ai` work (watermarking, hashing, OCR).
+
+    Route handlers are `async def`; calling heavy numpy/OpenCV/Tesseract code directly
+    would block the event loop for every other request on the worker. `run()` ships the
+    call to a child process instead.
+
+    At most `size + queue_depth` calls are handed to the executor at once; further
+    callers wait on the event loop. Queue wait (call -> start in worker) and run time
+    are recorded per function and exposed via `stats()`.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.size = 0
+        self.queue_depth = 0
+        self._waiting = 0
+        self._in_flight = 0
+        self._stats: dict[str, dict] = {}
+
+    def start(self, size: int, queue_depth: int) -> None:
+        self.size = max(1, int(size))
+        self.queue_depth = max(0, int(queue_depth))
+        self._executor = ProcessPoolExecutor(max_workers=self.size)
+        self._slots = asyncio.Semaphore(self.size + self.queue_depth)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self._slots = None
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` in the pool and return its result.
+
+        `fn` and its arguments must be picklable (module-level functions, plain data).
+        If the pool was not started (scripts, local tooling), runs in a thread instead.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(_timed_call, fn, args, kwargs)
+        submitted = time.time()
+
+        slots = self._slots
+        self._waiting += 1
+        try:
+            if slots is not None:
+                await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            result, started, finished = await loop.run_in_executor(self._executor, call)
+        except Exception:
+            self._record(fn, None, None, error=True)
+            raise
+        finally:
+            self._in_flight -= 1
+            if slots is not None:
+                slots.release()
+
+        self._record(fn, max(0.0, started - submitted), max(0.0, finished - started))
+        return result
+
+    def _record(self, fn: Callable, queue_wait: Optional[float], run_time: Optional[float], *, error: bool = False) -> None:
+        name = f"{getattr(fn, '__module__', '?')}.{getattr(fn, '__qualname__', repr(fn))}"
+        s = self._stats.setdefault(
+            name,
+            {"calls": 0, "errors": 0, "queue_wait_s_total": 0.0, "queue_wait_s_max": 0.0, "run_s_total": 0.0, "run_s_max": 0.0},
+        )
+        if error:
+            s["errors"] += 1
+            return
+        s["calls"] += 1
+        s["queue_wait_s_total"] += queue_wait
+        s["queue_wait_s_max"] = max(s["queue_wait_s_max"], queue_wait)
+        s["run_s_total"] += run_time
+        s["run_s_max"] = max(s["run_s_max"], run_time)
+
+    def stats(self) -> dict:
+        functions = {}
+        for name, s in self._stats.items():
+            calls = max(1, s["calls"])
+            functions[name] = {
+                **s,
+                "queue_wait_s_avg": s["queue_wait_s_total"] / calls,
+                "run_s_avg": s["run_s_total"] / calls,
+            }
+        return {
+            "running": self._executor is not None,
+            "size": self.size,
+            "queue_depth": self.queue_depth,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "functions": functions,
+        }
+
+
+worker_pool = WorkerPool()
@@ -0,0 +1,134 @@
+"""Benchmark the NumPy page-overlap scorer against the per-page Python loop.
+
+Usage (from backend/):
+    python scripts/bench_pdf_page_scorer.py [--sizes 500,10000,100000] [--query-pages 10] [--loop-max 10000]
+
+Candidates get 1..10 random page dHashes; a few are perturbed copies of the query so
+scores are not all zero. Reports scoring time for `score_page_overlap` and for the
+previous hex-string loop (sizes up to --loop-max), and checks that both agree.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ai.fingerprint import hamming_distance_hex64, hex64_to_int64, score_page_overlap  # noqa: E402
+
+PAGE_DHASH_THRESHOLD = 16
+
+
+def _score_loop(page_hashes, candidates, query_text, candidate_texts):
+    # Previous implementation: nested loops over hex strings.
+    out = []
+    for per, cand_text in zip(candidates, candidate_texts):
+        matches = 0
+        min_distances = []
+        for qh in page_hashes:
+            best_d = None
+            for ch in per:
+                d = hamming_distance_hex64(qh, ch)
+                if best_d is None or d < best_d:
+                    best_d = d
+            min_distances.append(int(best_d))
+            if best_d <= PAGE_DHASH_THRESHOLD:
+                matches += 1
+        text_dist = hamming_distance_hex64(query_text, cand_text) if cand_text else -1
+        out.append((matches, float(sum(min_distances)) / len(min_distances), text_dist))
+    return out
+
+
+def _perturb(rng: random.Random, value: int, bits: int) -> int:
+    for b in rng.sample(range(64), bits):
+        value ^= 1 << b
+    return value
+
+
+def _dataset(n: int, query_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    query = [rng.getrandbits(64) for _ in range(query_pages)]
+    query_text = rng.getrandbits(64)
+    candidates, texts = [], []
+    for i in range(n):
+        if i % 50 == 0:
+            per = [_perturb(rng, q, rng.randint(0, 20)) for q in query]
+            text = _perturb(rng, query_text, rng.randint(0, 20))
+        else:
+            per = [rng.getrandbits(64) for _ in range(rng.randint(1, 10))]
+            text = rng.getrandbits(64)
+        candidates.append([f"{h:016x}" for h in per])
+        texts.append(f"{text:016x}" if i % 7 else None)
+    return [f"{h:016x}" for h in query], candidates, f"{query_text:016x}", texts
+
+
+def _to_arrays(page_hashes, candidates, query_text, texts):
+    # Same layout fetch_pdf_page_candidates builds from the DB (signed BIGINTs).
+    offsets = np.zeros(len(candidates) + 1, dtype=np.int64)
+    np.cumsum([len(per) for per in candidates], out=offsets[1:])
+    pages = np.array([hex64_to_int64(h) for per in candidates for h in per], dtype=np.int64)
+    text_known = np.array([t is not None for t in texts], dtype=bool)
+    text = np.array([hex64_to_int64(t) if t else 0 for t in texts], dtype=np.int64)
+    query = [hex64_to_int64(h) for h in page_hashes]
+    return query, pages, offsets, hex64_to_int64(query_text), text, text_known
+
+
+def _best_of(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="500,10000,100000")
+    parser.add_argument("--query-pages", type=int, default=10)
+    parser.add_argument("--loop-max", type=int, default=10000, help="largest size to run the Python loop on")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"query pages: {args.query_pages}, page threshold: {PAGE_DHASH_THRESHOLD}")
+    print(f"{'candidates':>10} {'pages':>9} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}  agree")
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        page_hashes, candidates, query_text, texts = _dataset(n, args.query_pages)
+        query, pages, offsets, qtext, text, text_known = _to_arrays(page_hashes, candidates, query_text, texts)
+
+        def run_numpy():
+            return score_page_overlap(
+                query,
+                pages,
+                offsets,
+                page_threshold=PAGE_DHASH_THRESHOLD,
+                query_text=qtext,
+                candidate_text=text,
+                candidate_text_known=text_known,
+            )
+
+        t_numpy = _best_of(run_numpy, args.runs)
+        scores = run_numpy()
+
+        t_loop = None
+        agree = "-"
+        if n <= args.loop_max:
+            t_loop = _best_of(lambda: _score_loop(page_hashes, candidates, query_text, texts), 1)
+            ref = _score_loop(page_hashes, candidates, query_text, texts)
+            agree = str(
+                all(
+                    int(scores.matches[i]) == m and float(scores.avg_distance[i]) == d and int(scores.text_dist[i]) == t
+                    for i, (m, d, t) in enumerate(ref)
+                )
+            )
+
+        loop_ms = f"{t_loop * 1e3:10.1f}" if t_loop is not None else f"{'skipped':>10}"
+        speedup = f"{t_loop / t_numpy:7.0f}x" if t_loop is not None else f"{'':>8}"
+        print(f"{n:>10} {pages.size:>9} {loop_ms} {t_numpy * 1e3:10.2f} {speedup}  {agree}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark page-parallel PDF rasterization/OCR against the sequential analysis.
+
+Usage (from backend/):
+    python scripts/bench_pdf_pages.py [--pages 10] [--dpi 150] [--workers 1,2,4,8] [--runs 3]
+
+Builds an image-only ("scanned") PDF, then times `analyze_pdf` in one process and
+`analyze_pdf_parallel` on a WorkerPool of each size, OCR'ing every page when
+Tesseract is installed (dHash only otherwise), and checks that the results match.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ai.pdf_utils import analyze_pdf, analyze_pdf_parallel  # noqa: E402
+from app.workers import WorkerPool  # noqa: E402
+
+_LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud "
+    "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat."
+)
+
+
+def _scanned_pdf(path: str, pages: int) -> None:
+    # Typeset text pages, then keep only a raster image of each (no text layer).
+    src = fitz.open()
+    for i in range(pages):
+        page = src.new_page()
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), f"Page {i + 1}\n\n" + (_LOREM + " ") * 12, fontsize=11)
+    out = fitz.open()
+    for page in src:
+        pix = page.get_pixmap(dpi=200)
+        scanned = out.new_page(width=page.rect.width, height=page.rect.height)
+        scanned.insert_image(scanned.rect, pixmap=pix)
+    out.save(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8) if w <= (os.cpu_count() or 1)) or "1")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    ocr = shutil.which("tesseract") is not None
+    ocr_pages = args.pages if ocr else 0
+    print(f"cpus: {os.cpu_count()}, pages: {args.pages}, dpi: {args.dpi}, OCR: {'yes' if ocr else 'no (tesseract not found; dHash only)'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scanned.pdf")
+        _scanned_pdf(path, args.pages)
+        kwargs = dict(dpi=args.dpi, hash_pages=args.pages, text_pages=0, ocr_pages=ocr_pages)
+
+        best = float("inf")
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            ref = analyze_pdf(path, **kwargs)
+            best = min(best, time.perf_counter() - t0)
+        t_seq = best
+        print(f"{'sequential':>12}: {t_seq * 1e3:8.1f} ms")
+
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+            pool = WorkerPool()
+
+            async def run_all():
+                pool.start(workers, queue_depth=args.pages)
+                try:
+                    # Warm the worker processes (imports) before timing.
+                    await asyncio.gather(*(pool.run(os.getpid) for _ in range(workers)))
+                    times = []
+                    for _ in range(args.runs):
+                        t0 = time.perf_counter()
+                        res = await analyze_pdf_parallel(path, concurrency=max(2, workers), page_timeout=None, run=pool.run, **kwargs)
+                        times.append(time.perf_counter() - t0)
+                    return min(times), res
+                finally:
+                    pool.shutdown()
+
+            t_par, res = asyncio.run(run_all())
+            same = res.page_hashes == ref.page_hashes and res.ocr_text == ref.ocr_text
+            print(f"{workers:>4} workers: {t_par * 1e3:8.1f} ms  ({t_seq / t_par:4.2f}x)  same result: {same}")
+
+
+if __name__ == "__main__":
+    main()
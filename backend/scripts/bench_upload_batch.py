@@ -0,0 +1,106 @@
+"""Benchmark upload throughput: one /upload POST per image vs /upload/batch.
+
+Usage (from backend/, with DATABASE_URL pointing at a scratch database):
+    python scripts/bench_upload_batch.py [--images 200] [--size 800x600] [--workers 2]
+
+Runs the app in-process (FastAPI TestClient, so no network), registers a throwaway
+user, and uploads the same number of freshly generated images three ways: sequential
+/upload requests, one multipart /upload/batch request, and one /upload/batch request
+carrying a zip archive. Reports files per second for each. Rows created here stay in
+the database.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import uuid
+import zipfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _images(n: int, width: int, height: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        low = rng.integers(0, 256, (6, 8, 3)).astype(np.uint8)
+        img = cv2.resize(low, (width, height), interpolation=cv2.INTER_CUBIC)
+        ok, buf = cv2.imencode(".png", img)
+        out.append((f"img{seed}_{i}.png", buf.tobytes()))
+    return out
+
+
+def _ndjson(resp) -> tuple:
+    lines = [json.loads(line) for line in resp.iter_lines() if line]
+    summary = lines[-1].get("summary", {}) if lines else {}
+    return sum(1 for line in lines if line.get("ok")), summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", default="800x600")
+    parser.add_argument("--workers", type=int, default=None, help="WORKER_POOL_SIZE for the app")
+    args = parser.parse_args()
+    if args.workers:
+        os.environ["WORKER_POOL_SIZE"] = str(args.workers)
+    width, height = (int(v) for v in args.size.split("x"))
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    form = {"title": "bench", "author": "bench", "createdDate": "2024-01-01", "organization": "bench"}
+    with TestClient(app) as client:
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        token = client.post("/auth/register", json={"name": "Bench", "email": email, "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        print(f"images: {args.images} ({args.size} PNG), worker pool: {os.environ.get('WORKER_POOL_SIZE') or os.cpu_count()}")
+
+        images = _images(args.images, width, height, seed=1)
+        t0 = time.perf_counter()
+        ok = 0
+        for name, data in images:
+            r = client.post("/upload", headers=headers, data=form, files={"file": (name, data, "image/png")})
+            ok += r.status_code == 200
+        t_single = time.perf_counter() - t0
+        print(f"{'/upload x N':>22}: {args.images / t_single:7.1f} files/s  ({ok} ok, {t_single:.1f}s)")
+
+        images = _images(args.images, width, height, seed=2)
+        t0 = time.perf_counter()
+        with client.stream(
+            "POST",
+            "/upload/batch",
+            headers=headers,
+            data=form,
+            files=[("files", (name, data, "image/png")) for name, data in images],
+        ) as r:
+            ok, summary = _ndjson(r)
+        t_batch = time.perf_counter() - t0
+        print(f"{'/upload/batch':>22}: {args.images / t_batch:7.1f} files/s  ({ok} ok, {t_batch:.1f}s; server {summary.get('files_per_s')} files/s)")
+
+        images = _images(args.images, width, height, seed=3)
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as archive:
+            for name, data in images:
+                archive.writestr(name, data)
+        t0 = time.perf_counter()
+        with client.stream(
+            "POST",
+            "/upload/batch",
+            headers=headers,
+            data=form,
+            files={"files": ("images.zip", buf.getvalue(), "application/zip")},
+        ) as r:
+            ok, summary = _ndjson(r)
+        t_zip = time.perf_counter() - t0
+        print(f"{'/upload/batch (zip)':>22}: {args.images / t_zip:7.1f} files/s  ({ok} ok, {t_zip:.1f}s; server {summary.get('files_per_s')} files/s)")
+
+
+if __name__ == "__main__":
+    main()
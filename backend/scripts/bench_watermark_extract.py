@@ -0,0 +1,151 @@
+"""Decode rate vs latency of `extract_image_watermark` schedules on a damaged-image corpus.
+
+Usage (from backend/):
+    python scripts/bench_watermark_extract.py [--images 12] [--size 800x600] [--floors 0.1,0.2]
+                                              [--budgets 0.25,1.0] [--skip-slow]
+
+Embeds a watermark into synthetic photos, derives recompressed (JPEG), cropped
+(fixed and random trims from every side) and crop+JPEG variants plus unmarked
+originals, and runs every schedule over the
+corpus: fast mode with no floor (every candidate decoded, best score first), fast
+mode with each --floors value, and the full search (fast=False) with the first
+floor under each --budgets value. Reports decodes per variant, mean / p95
+latency, and mean candidates scored / RS decodes per image. The "score" columns
+show the vote-margin score of decoded candidates and the best score seen on
+unmarked images, for choosing WATERMARK_SCORE_FLOOR.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ai.image_watermark import embed_image_watermark, extract_image_watermark  # noqa: E402
+
+SECRET = "bench-secret"
+WM_ID = "0123456789abcdef0123456789abcdef"
+
+
+def _photo(width: int, height: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    low = rng.integers(0, 256, (6, 8, 3)).astype(np.uint8)
+    img = cv2.resize(low, (width, height), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    img += (20 * np.sin(xx / rng.uniform(9, 40)) * np.cos(yy / rng.uniform(9, 40)))[..., None]
+    img += rng.normal(0, 6, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def _jpeg(img: np.ndarray, quality: int) -> np.ndarray:
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def _crop(img: np.ndarray, seed: int) -> np.ndarray:
+    # Trim up to ~8% from every side, at offsets that are not multiples of 8.
+    rng = np.random.default_rng(seed)
+    h, w = img.shape[:2]
+    top, bottom = (int(v) for v in rng.integers(1, max(2, h // 12), 2))
+    left, right = (int(v) for v in rng.integers(1, max(2, w // 12), 2))
+    return img[top : h - bottom, left : w - right]
+
+
+VARIANTS = {
+    "png": lambda im, i: im,
+    "jpeg90": lambda im, i: _jpeg(im, 90),
+    "jpeg75": lambda im, i: _jpeg(im, 75),
+    "jpeg60": lambda im, i: _jpeg(im, 60),
+    "crop13x21": lambda im, i: im[13:, 21:],
+    "crop5%+jpeg85": lambda im, i: _jpeg(im[im.shape[0] // 20 :, im.shape[1] // 20 :], 85),
+    "crop-random": lambda im, i: _crop(im, seed=i),
+    "crop-random+jpeg85": lambda im, i: _jpeg(_crop(im, seed=1000 + i), 85),
+}
+
+
+def _corpus(tmp: str, images: int, width: int, height: int) -> dict:
+    """variant -> list of PNG paths (lossy variants are decoded back to pixels first)."""
+    out = {name: [] for name in [*VARIANTS, "unmarked"]}
+    for i in range(images):
+        src = os.path.join(tmp, f"src{i}.png")
+        marked = os.path.join(tmp, f"marked{i}.png")
+        cv2.imwrite(src, _photo(width, height, seed=i))
+        embed_image_watermark(src, marked, WM_ID, SECRET)
+        out["unmarked"].append(src)
+        img = cv2.imread(marked)
+        for name, fn in VARIANTS.items():
+            path = os.path.join(tmp, f"{name}_{i}.png")
+            cv2.imwrite(path, fn(img, i))
+            out[name].append(path)
+    return out
+
+
+def _run(corpus: dict, **kwargs) -> dict:
+    rows = {}
+    for name, paths in corpus.items():
+        times, ok, scored, attempts, scores = [], 0, 0, 0, []
+        for path in paths:
+            t0 = time.perf_counter()
+            res = extract_image_watermark(path, SECRET, **kwargs)
+            times.append(time.perf_counter() - t0)
+            ok += bool(res.ok and res.watermark_id_hex == WM_ID)
+            scored += res.candidates_scored
+            attempts += res.decode_attempts
+            if res.ok or name == "unmarked":
+                scores.append(res.score)
+        n = max(1, len(paths))
+        rows[name] = {
+            "ok": ok,
+            "n": len(paths),
+            "mean_ms": 1e3 * float(np.mean(times)),
+            "p95_ms": 1e3 * float(np.percentile(times, 95)),
+            "scored": scored / n,
+            "decodes": attempts / n,
+            "score": (min(scores), max(scores)) if scores else None,
+        }
+    return rows
+
+
+def _print(label: str, rows: dict) -> None:
+    print(f"\n{label}")
+    print(f"  {'variant':<15}{'decoded':>9}{'mean ms':>10}{'p95 ms':>9}{'scored':>9}{'RS decodes':>12}   score (min..max)")
+    for name, r in rows.items():
+        score = f"{r['score'][0]:.2f}..{r['score'][1]:.2f}" if r["score"] else "-"
+        print(
+            f"  {name:<15}{r['ok']:>4}/{r['n']:<4}{r['mean_ms']:>10.1f}{r['p95_ms']:>9.1f}"
+            f"{r['scored']:>9.1f}{r['decodes']:>12.1f}   {score}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--size", default="800x600")
+    parser.add_argument("--floors", default="0.1,0.2", help="comma-separated score floors")
+    parser.add_argument("--budgets", default="0.25,1.0", help="comma-separated time budgets (s) for the full search")
+    parser.add_argument("--skip-slow", action="store_true", help="only run fast-mode schedules")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    floors = [float(v) for v in args.floors.split(",") if v]
+    budgets = [float(v) for v in args.budgets.split(",") if v]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = _corpus(tmp, args.images, width, height)
+        print(f"corpus: {args.images} images x {len(corpus)} variants ({args.size})")
+        _print("fast, no floor (every candidate decoded, best score first)", _run(corpus, fast=True))
+        for floor in floors:
+            _print(f"fast, floor {floor}", _run(corpus, fast=True, score_floor=floor))
+        if not args.skip_slow:
+            for budget in budgets:
+                _print(
+                    f"full search, floor {floors[0] if floors else None}, budget {budget}s",
+                    _run(corpus, fast=False, score_floor=floors[0] if floors else None, time_budget_s=budget),
+                )
+
+
+if __name__ == "__main__":
+    main()
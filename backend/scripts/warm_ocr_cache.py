@@ -0,0 +1,69 @@
+"""Warm the persistent OCR cache from PDFs already stored by the backend.
+
+Usage (from backend/):
+    python scripts/warm_ocr_cache.py [paths ...] [--pages 5] [--dpi 150] [--workers 2]
+
+Paths may be PDF files or directories (default: the upload directory). The first
+--pages pages of each PDF are rendered and OCR'd the way /upload and /verify do, so
+later requests for the same files hit the cache (OCR_CACHE_PATH). Prints the cache
+counters before and after.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ai.ocr_cache import ocr_cache  # noqa: E402
+from app.ai.pdf_utils import analyze_pdf  # noqa: E402
+
+UPLOAD_DIR = "/tmp/snappy_uploads"
+
+
+def _pdf_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(".pdf"):
+                    yield os.path.join(path, name)
+        elif path.lower().endswith(".pdf"):
+            yield path
+
+
+def _warm(path: str, pages: int, dpi: int) -> int:
+    return len(analyze_pdf(path, dpi=dpi, hash_pages=0, text_pages=0, ocr_pages=pages).ocr_text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[UPLOAD_DIR])
+    parser.add_argument("--pages", type=int, default=5, help="pages per PDF (verify OCRs up to 5)")
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if ocr_cache is None:
+        sys.exit("OCR cache is disabled (OCR_CACHE_PATH is empty)")
+    print("before:", ocr_cache.stats())
+
+    pdfs = list(_pdf_paths(args.paths))
+    t0 = time.perf_counter()
+    done = failed = pages = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {path: pool.submit(_warm, path, args.pages, args.dpi) for path in pdfs}
+        for path, fut in futures.items():
+            try:
+                pages += fut.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"skip {path}: {e}")
+
+    print(f"warmed {done} PDFs ({pages} pages, {failed} failed) in {time.perf_counter() - t0:.1f}s")
+    print("after: ", ocr_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,16 @@ const UploadSummary = ({ result, onReupload }) => {
       {result.watermarkCode && (
         <Typography variant="body2">Watermark Code: <b>{result.watermarkCode}</b></Typography>
       )}
+      {result.processingStatus && (
+        <Typography variant="body2">
+          Matching fingerprints:{' '}
+          <b>
+            {result.processingStatus === 'processing'
+              ? `processing${result.processingStage ? ` (${result.processingStage})` : ''}…`
+              : result.processingStatus}
+          </b>
+        </Typography>
+      )}
       <Typography variant="body2" sx={{ mb: 2 }}>{result.message}</Typography>
 
       <Box display="flex" gap={2}>
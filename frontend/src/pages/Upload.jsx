@@ -48,6 +48,23 @@ const Upload = () => {
     return true;
   };
 
+  // Fingerprints used for perceptual matching are computed by a background job.
+  const pollJob = async (jobId) => {
+    for (let i = 0; i < 120; i += 1) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      try {
+        const res = await api.get(`/jobs/${jobId}`, {
+          headers: token ? { Authorization: `Bearer ${token}` } : {}
+        });
+        const { status, stage, processing_status: processingStatus } = res.data;
+        setResult((prev) => (prev ? { ...prev, processingStatus, processingStage: stage } : prev));
+        if (status === 'done' || status === 'failed') return;
+      } catch {
+        return;
+      }
+    }
+  };
+
   const handleStartEmbedding = async () => {
     setError('');
     if (!file) return;
@@ -81,8 +98,10 @@ const Upload = () => {
         watermarkCode: res.data.watermark_code,
         message: res.data.message,
         filename: res.data.original_filename,
-        downloadUrl: res.data.download_url
+        downloadUrl: res.data.download_url,
+        processingStatus: res.data.processing_status
       });
+      if (res.data.job_id) pollJob(res.data.job_id);
     } catch (err) {
       setProgress(0);
       const msg = err.response?.data?.detail || 'Upload failed. Please try again.';
@@ -317,13 +317,27 @@ const Verification = () => {
                 Ownership Verified
               </Typography>
               <ScoreGauge
-                label={result.method === 'pades' ? 'Authoritative Signature Confidence' : 'Watermark Confidence'}
+                label={
+                  result.method === 'pades'
+                    ? 'Authoritative Signature Confidence'
+                    : result.method === 'exact_hash'
+                      ? 'Exact File Match'
+                      : 'Watermark Confidence'
+                }
                 score={typeof result.confidence === 'number' ? result.confidence : 1}
-                subtitle={result.method === 'pades' ? 'PAdES validated' : 'Watermark extracted'}
+                subtitle={
+                  result.method === 'pades'
+                    ? 'PAdES validated'
+                    : result.method === 'exact_hash'
+                      ? 'SHA-256 matches issued file'
+                      : 'Watermark extracted'
+                }
                 helperText={
                   result.method === 'pades'
                     ? 'Cryptographic signature validation. This is the authoritative path.'
-                    : 'Confidence of watermark extraction from the uploaded file.'
+                    : result.method === 'exact_hash'
+                      ? 'The uploaded file is byte-identical to the copy issued by this system.'
+                      : 'Confidence of watermark extraction from the uploaded file.'
                 }
               />
 